@@ -156,7 +156,10 @@ export default function ImportPage() {
 
       toast({
         title: "Success",
-        description: `Deleted ${result.deleted} records for "${filename}"`,
+        description:
+          typeof result.deleted === "number"
+            ? `Deleted ${result.deleted} records for "${filename}"`
+            : `Deleted records for "${filename}"`,
       });
 
       // Reload file list
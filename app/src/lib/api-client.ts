@@ -136,6 +136,8 @@ class ApiClient {
       model?: string;
       where?: Record<string, any>;
       include?: string[];
+      allow_embeddings?: boolean;
+      semantic_cache?: boolean;
     }
   ) {
     return this.request(`/collections/${collectionName}/query`, {
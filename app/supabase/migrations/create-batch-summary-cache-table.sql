@@ -0,0 +1,18 @@
+-- Create batch_summary_cache table for memoizing per-batch summaries
+-- Keyed by sha256(model | prompt version | batch text), so re-summarizing identical
+-- content (re-uploads, re-chunking, overlapping documents) skips the LLM call
+
+CREATE TABLE IF NOT EXISTS public.batch_summary_cache (
+    key bytea PRIMARY KEY,
+    summary text NOT NULL,
+    model text,
+    created_at timestamp with time zone NOT NULL DEFAULT timezone('utc'::text, now())
+);
+
+-- Enable RLS (but allow all for local app)
+ALTER TABLE public.batch_summary_cache ENABLE ROW LEVEL SECURITY;
+
+-- Allow all operations for local app
+DROP POLICY IF EXISTS "Allow all for local app" ON public.batch_summary_cache;
+CREATE POLICY "Allow all for local app" ON public.batch_summary_cache
+    FOR ALL USING (true) WITH CHECK (true);
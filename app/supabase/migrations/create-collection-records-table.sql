@@ -0,0 +1,23 @@
+-- Create collection_records table: a side-index of which file each Chroma record belongs to,
+-- so listing a collection's files is a GROUP BY here instead of a full scan of Chroma metadata
+
+CREATE TABLE IF NOT EXISTS public.collection_records (
+    collection_name text NOT NULL,
+    id text NOT NULL,
+    filename text,
+    file_type text,
+    uploaded_at text,
+    chunk_index integer,
+    PRIMARY KEY (collection_name, id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_collection_records_filename
+    ON public.collection_records (collection_name, filename);
+
+-- Enable RLS (but allow all for local app)
+ALTER TABLE public.collection_records ENABLE ROW LEVEL SECURITY;
+
+-- Allow all operations for local app
+DROP POLICY IF EXISTS "Allow all for local app" ON public.collection_records;
+CREATE POLICY "Allow all for local app" ON public.collection_records
+    FOR ALL USING (true) WITH CHECK (true);
@@ -0,0 +1,17 @@
+-- Create embeddings_cache table so identical chunks are never embedded twice
+-- Keyed by sha256(model | text); vec holds the embedding as raw float32 bytes
+
+CREATE TABLE IF NOT EXISTS public.embeddings_cache (
+    key bytea PRIMARY KEY,
+    model text NOT NULL,
+    vec bytea NOT NULL,
+    created_at timestamp with time zone NOT NULL DEFAULT timezone('utc'::text, now())
+);
+
+-- Enable RLS (but allow all for local app)
+ALTER TABLE public.embeddings_cache ENABLE ROW LEVEL SECURITY;
+
+-- Allow all operations for local app
+DROP POLICY IF EXISTS "Allow all for local app" ON public.embeddings_cache;
+CREATE POLICY "Allow all for local app" ON public.embeddings_cache
+    FOR ALL USING (true) WITH CHECK (true);
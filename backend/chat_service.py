@@ -1,15 +1,142 @@
 import os
+import asyncio
+import hashlib
+import json
 import logging
-from typing import List, Optional, Dict, Any
-from openai import OpenAI
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator
+from openai import AsyncOpenAI, DefaultAioHttpClient
 import httpx
+import numpy as np
 
-from chroma_client import get_chroma_client, MissingEnvironmentVariableError
-from embeddings import embed_texts
+from chroma_client import get_async_collection, invalidate_async_collection, async_query_batcher, MissingEnvironmentVariableError
+from embeddings import embedding_batcher
+from retrieval_cache import retrieval_cache, answer_cache
 from system_prompt import SYSTEM_PROMPT
+from tokenizer import get_encoding, count_tokens
+from rate_limit import OPENAI_RETRYABLE, estimate_tokens, openai_limiter, retry_async
 
 logger = logging.getLogger(__name__)
 
+# Query embedding cache: repeat questions skip the embedding round-trip entirely
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+QUERY_EMBEDDING_CACHE_TTL = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600"))
+
+_query_embedding_cache: "OrderedDict[bytes, Tuple[float, Tuple[float, ...]]]" = OrderedDict()
+_query_embedding_cache_lock = threading.Lock()
+
+
+async def _embed_query_cached(text: str, model: str) -> Tuple[float, ...]:
+    """
+    Embed a single query, reusing the result for identical (model, text) pairs.
+    
+    LRU with a TTL. Misses go through the embedding micro-batcher so concurrent
+    chats share one embeddings request. Returns a tuple so cached vectors can't
+    be mutated by callers.
+    """
+    # Keyed blake2b: the model is the hash key, so no separator/domain mixing is needed
+    key = hashlib.blake2b(text.encode("utf-8"), key=model.encode("utf-8")[:64], digest_size=16).digest()
+    now = time.monotonic()
+    
+    with _query_embedding_cache_lock:
+        entry = _query_embedding_cache.get(key)
+        if entry is not None and now - entry[0] < QUERY_EMBEDDING_CACHE_TTL:
+            _query_embedding_cache.move_to_end(key)
+            return entry[1]
+    
+    embedding = tuple((await embedding_batcher.submit(model, text)).tolist())
+    
+    with _query_embedding_cache_lock:
+        _query_embedding_cache[key] = (now, embedding)
+        _query_embedding_cache.move_to_end(key)
+        while len(_query_embedding_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+            _query_embedding_cache.popitem(last=False)
+    
+    return embedding
+
+
+# Collection embedding models (handles are cached by get_async_collection), so a RAG turn
+# doesn't pay a get_collection round-trip to Chroma before every query
+_collection_embedding_models: Dict[str, str] = {}
+
+
+def invalidate_collection(name: Optional[str] = None) -> None:
+    """Forget cached collection handles/metadata (call after a collection's metadata changes)."""
+    invalidate_async_collection(name)
+    if name is None:
+        _collection_embedding_models.clear()
+    else:
+        _collection_embedding_models.pop(name, None)
+
+def _build_http_client() -> httpx.AsyncClient:
+    """
+    Build the HTTP client used for OpenAI calls.
+    
+    Defaults to the aiohttp transport. Set OPENAI_HTTP_TRANSPORT=httpx to stay on httpx,
+    in which case HTTP/2 is enabled so concurrent chats multiplex over one connection,
+    with pool limits raised to avoid PoolTimeout under load.
+    """
+    transport = (os.getenv("OPENAI_HTTP_TRANSPORT") or "aiohttp").strip().lower()
+    if transport == "httpx":
+        return httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(60.0),
+            limits=httpx.Limits(
+                max_connections=2000,
+                max_keepalive_connections=1000,
+                keepalive_expiry=60.0
+            )
+        )
+    return DefaultAioHttpClient(timeout=60.0)
+
+
+# Concurrency cap for outbound OpenAI calls (retry policy and rate limits live in rate_limit)
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "64"))
+
+_CHROMA_RETRYABLE = (httpx.TransportError, ConnectionError)
+
+# asyncio primitives are bound to one event loop, so keep one semaphore per loop
+# (FastAPI's loop and the MCP server's background loop each get their own)
+_openai_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _openai_semaphore() -> asyncio.Semaphore:
+    """Get the OpenAI concurrency semaphore for the running event loop."""
+    loop = asyncio.get_running_loop()
+    sem = _openai_semaphores.get(loop)
+    if sem is None:
+        sem = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+        _openai_semaphores[loop] = sem
+    return sem
+
+
+# One shared OpenAI client per event loop, reused across ChatService instances so
+# connections (and TLS sessions) stay warm between requests. Async HTTP clients are
+# bound to the loop they were created on, hence per loop rather than one global.
+_openai_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+
+def _get_openai_client() -> AsyncOpenAI:
+    """Get (or create) the shared AsyncOpenAI client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _openai_clients.get(loop)
+    if client is None:
+        api_key = (os.getenv("OPENAI_API_KEY") or "").strip()
+        # Retries are handled by retry_async (with jitter), so disable the SDK's own retries
+        client = AsyncOpenAI(api_key=api_key, http_client=_build_http_client(), max_retries=0)
+        _openai_clients[loop] = client
+    return client
+
+
+async def close_openai_client() -> None:
+    """Close the running loop's shared OpenAI client (call once on shutdown)."""
+    client = _openai_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
 
 class ChatService:
     def __init__(self, model: Optional[str] = None):
@@ -17,13 +144,31 @@ class ChatService:
         if not api_key:
             raise RuntimeError("OPENAI_API_KEY must be set")
         
-        http_client = httpx.Client(timeout=httpx.Timeout(60.0))
-        self.client = OpenAI(api_key=api_key, http_client=http_client)
         # Use provided model, or env var, or default
         self.model = model or os.getenv("CHAT_MODEL", "gpt-4o-mini")
         self.max_context_messages = int(os.getenv("MAX_CONTEXT_MESSAGES", "20"))
+        self._enc = get_encoding(self.model)
+        self._answer_cache = answer_cache
+        # The base system prompt is static, so build it once per service
+        self._base_system_prompt = self.build_system_prompt(None)
+    
+    @property
+    def client(self) -> AsyncOpenAI:
+        """Shared OpenAI client for the current event loop."""
+        return _get_openai_client()
     
-    def generate_title(self, user_message: str) -> str:
+    async def _create_completion(self, **kwargs):
+        """Create a chat completion under the concurrency cap and rate limits, retrying transient failures."""
+        estimated_tokens = estimate_tokens([m.get("content") or "" for m in kwargs.get("messages", [])])
+        estimated_tokens += kwargs.get("max_tokens") or 0
+        
+        async def attempt():
+            await openai_limiter.acquire(estimated_tokens)
+            async with _openai_semaphore():
+                return await self.client.chat.completions.create(**kwargs)
+        return await retry_async(attempt, OPENAI_RETRYABLE)
+    
+    async def generate_title(self, user_message: str) -> str:
         """Generate a chat title based on the user's prompt."""
         try:
             prompt = f"""Generate a concise, descriptive title (max 60 characters) for a chat conversation based on this user prompt:
@@ -32,7 +177,7 @@ User prompt: {user_message}
 
 Title:"""
             
-            response = self.client.chat.completions.create(
+            response = await self._create_completion(
                 model="gpt-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=20,
@@ -48,7 +193,7 @@ Title:"""
             logger.error(f"Error generating title: {str(e)}")
             return user_message[:50] if user_message else "New chat"
     
-    def get_rag_context(
+    async def get_rag_context(
         self, 
         collection_name: str, 
         query: str, 
@@ -69,143 +214,199 @@ Title:"""
         Returns:
             Formatted context string, filtered by similarity and token limit
         """
+        context, _, _ = await self._retrieve_rag_context(
+            collection_name,
+            query,
+            n_results=n_results,
+            similarity_threshold=similarity_threshold,
+            max_context_tokens=max_context_tokens
+        )
+        return context
+    
+    async def _retrieve_rag_context(
+        self,
+        collection_name: str,
+        query: str,
+        n_results: int = 3,
+        similarity_threshold: float = 0.0,
+        max_context_tokens: int = 2000
+    ) -> Tuple[str, Optional[Tuple[float, ...]], List[str]]:
+        """
+        Same as get_rag_context, but also returns the query embedding and the IDs of
+        the chunks that made it into the context (the evidence for the answer cache).
+        """
+        query_embedding = None
         try:
-            client = get_chroma_client()
-            collection = client.get_collection(name=collection_name)
-            
-            # Get embedding model from collection metadata
-            collection_metadata = collection.metadata or {}
-            embedding_model = collection_metadata.get("embedding_model")
-            
-            # If no model in metadata, use default (for backward compatibility with old collections)
-            if not embedding_model:
-                embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
-            
-            # Embed query using the same model as the collection
-            query_embeddings = embed_texts([query], model=embedding_model)
-            
-            if not query_embeddings or len(query_embeddings) == 0:
-                return ""
+            embedding_model = _collection_embedding_models.get(collection_name)
+            if embedding_model is not None:
+                collection = await get_async_collection(collection_name)
+                # Embed query using the same model as the collection (cached for repeat queries)
+                query_embedding = await _embed_query_cached(query, embedding_model)
+            else:
+                # First query against this collection: fetch its metadata while embedding with
+                # the default model (what collections without metadata use anyway), and only
+                # re-embed if the collection turns out to use a different model
+                default_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+                collection, query_embedding = await asyncio.gather(
+                    get_async_collection(collection_name),
+                    _embed_query_cached(query, default_model)
+                )
+                collection_metadata = collection.metadata or {}
+                embedding_model = collection_metadata.get("embedding_model") or default_model
+                _collection_embedding_models[collection_name] = embedding_model
+                if embedding_model != default_model:
+                    query_embedding = await _embed_query_cached(query, embedding_model)
+            query_embeddings = [list(query_embedding)]
             
             # Query ChromaDB with the correctly embedded query
             # Note: ChromaDB returns distances (lower is better), so we need to convert to similarity
-            results = collection.query(
-                query_embeddings=query_embeddings,
-                n_results=n_results,
-                include=["documents", "metadatas", "distances"]
-            )
+            results = retrieval_cache.get(collection_name, n_results, query_embeddings[0])
+            if results is None:
+                # Concurrent chats (and unfiltered /query calls) against the same collection
+                # share one query call
+                results = await retry_async(
+                    lambda: async_query_batcher.submit(
+                        (collection_name, n_results, ("metadatas", "documents", "distances"), "null"),
+                        (collection, query_embeddings[0], None)
+                    ),
+                    _CHROMA_RETRYABLE
+                )
+                retrieval_cache.put(collection_name, n_results, query_embeddings[0], results)
             
             if not results or not results.get("documents") or not results["documents"][0]:
-                return ""
+                return "", query_embedding, []
             
-            # Format context from retrieved documents, filtering by similarity threshold
-            context_parts = []
+            # Format context from retrieved documents, filtering by similarity threshold.
+            # Pieces go straight into one buffer (no per-document f-string) and are joined once.
+            buf: List[str] = []
+            included_ids = []
             documents = results["documents"][0]
+            ids = results.get("ids", [[]])[0] if results.get("ids") else []
             metadatas = results.get("metadatas", [[]])[0] if results.get("metadatas") else []
             distances = results.get("distances", [[]])[0] if results.get("distances") else []
             
-            # Log RAG query results
-            logger.info(f"🔍 RAG Query Results (n_results={n_results}, threshold={similarity_threshold}):")
-            logger.info(f"   Retrieved {len(documents)} documents from collection '{collection_name}'")
+            # Convert distances to similarity in one shot (assuming cosine distance,
+            # 0 = perfect match, 2 = opposite): similarity = 1 - distance / 2, clamped to [0, 1]
+            dists = np.ones(len(documents), dtype=np.float32)
+            dists[:min(len(distances), len(documents))] = distances[:len(documents)]
+            sims = np.clip(1.0 - dists * 0.5, 0.0, 1.0)
+            keep = np.flatnonzero(sims >= similarity_threshold)
             
-            # Rough token estimation: ~1 token per 4 characters (conservative estimate)
+            # Count tokens for all kept documents in one batched tokenizer call
+            kept_docs = [documents[i] for i in keep]
+            token_counts = count_tokens(kept_docs, self._enc)
             current_tokens = 0
             included_count = 0
             
-            for i, doc in enumerate(documents):
-                # Convert distance to similarity (assuming cosine distance, 0 = perfect match, 2 = opposite)
-                # Similarity = 1 - (distance / 2) for cosine distance
-                distance = distances[i] if i < len(distances) else 1.0
-                similarity = 1.0 - (distance / 2.0)  # Approximate conversion
-                similarity = max(0.0, min(1.0, similarity))  # Clamp to [0, 1]
-                
+            for i, doc_tokens in zip(keep, token_counts):
+                doc = documents[i]
                 metadata = metadatas[i] if i < len(metadatas) else {}
                 filename = metadata.get("filename", "Unknown")
                 
-                # Log each retrieved document
-                logger.info(f"   [{i+1}] {filename} (similarity: {similarity:.3f}, distance: {distance:.3f})")
-                logger.info(f"       Preview: {doc[:100]}..." if len(doc) > 100 else f"       Content: {doc}")
-                
-                # Filter by similarity threshold
-                if similarity < similarity_threshold:
-                    logger.info(f"       ⚠️  Filtered out (similarity {similarity:.3f} < threshold {similarity_threshold})")
-                    continue
-                
-                # Estimate tokens for this document
-                doc_tokens = len(doc) // 4  # Rough estimate
-                
                 # Check if adding this would exceed token limit
                 if current_tokens + doc_tokens > max_context_tokens:
-                    logger.info(f"       ⚠️  Skipped (would exceed token limit: {current_tokens + doc_tokens} > {max_context_tokens})")
                     break
                 
-                context_parts.append(f"[Source: {filename}]\n{doc}")
+                if buf:
+                    buf.append("\n\n")
+                buf.append("[Source: ")
+                buf.append(filename)
+                buf.append("]\n")
+                buf.append(doc)
+                if i < len(ids):
+                    included_ids.append(ids[i])
                 current_tokens += doc_tokens
                 included_count += 1
             
-            logger.info(f"   ✅ Included {included_count} documents in context ({current_tokens} estimated tokens)")
+            # One aggregated line per query; per-document detail only at DEBUG
+            logger.info(
+                "rag_query collection=%s n=%d kept=%d tokens=%d threshold=%.2f",
+                collection_name, len(documents), included_count, current_tokens, similarity_threshold
+            )
+            if logger.isEnabledFor(logging.DEBUG):
+                included = set(included_ids)
+                logger.debug("rag_query_docs %s", json.dumps([
+                    {
+                        "id": ids[i] if i < len(ids) else None,
+                        "filename": (metadatas[i] if i < len(metadatas) else {}).get("filename", "Unknown"),
+                        "similarity": round(float(sims[i]), 3),
+                        "distance": round(float(dists[i]), 3),
+                        "included": i < len(ids) and ids[i] in included,
+                    }
+                    for i in range(len(documents))
+                ]))
             
-            return "\n\n".join(context_parts)
+            return "".join(buf), query_embedding, included_ids
         except MissingEnvironmentVariableError:
-            return ""
+            return "", query_embedding, []
         except Exception:
-            return ""
+            return "", query_embedding, []
     
     def build_system_prompt(self, collection_name: Optional[str] = None) -> str:
         """Build system prompt for the AI assistant."""
         return SYSTEM_PROMPT
     
-    def format_messages_for_openai(
+    async def format_messages_for_openai(
         self, 
         messages: List[Dict[str, Any]], 
         collection_name: Optional[str] = None,
         user_query: Optional[str] = None,
         rag_n_results: int = 3,
         rag_similarity_threshold: float = 0.0,
-        rag_max_context_tokens: int = 2000
+        rag_max_context_tokens: int = 2000,
+        rag_context: Optional[str] = None,
+        has_assistant_messages: Optional[bool] = None
     ) -> List[Dict[str, str]]:
         """
         Format messages for OpenAI API with the structure:
         1) System prompt (only in first message)
         2) User prompt (with retrieved documents if applicable)
         3) Conversation history (assistant messages)
+        
+        Pass rag_context to reuse context the caller already retrieved, and
+        has_assistant_messages if the caller has already scanned the messages.
         """
         formatted = []
         
         # Check if this is the first message (no assistant responses yet)
-        has_assistant_messages = any(msg.get("role") == "assistant" for msg in messages)
+        if has_assistant_messages is None:
+            has_assistant_messages = any(msg.get("role") == "assistant" for msg in messages)
         is_first_message = not has_assistant_messages
         
         # 1) Add system prompt only for the first message
         if is_first_message:
-            system_prompt = self.build_system_prompt(collection_name)
+            if collection_name is None:
+                system_prompt = self._base_system_prompt
+            else:
+                system_prompt = self.build_system_prompt(collection_name)
             formatted.append({"role": "system", "content": system_prompt})
         
-        # 2) Get RAG context if applicable
-        rag_context = ""
-        if collection_name and user_query:
-            rag_context = self.get_rag_context(
-                collection_name, 
+        # 2) Get RAG context if applicable (unless the caller already retrieved it)
+        if rag_context is None and collection_name and user_query:
+            rag_context = await self.get_rag_context(
+                collection_name,
                 user_query,
                 n_results=rag_n_results,
                 similarity_threshold=rag_similarity_threshold,
                 max_context_tokens=rag_max_context_tokens
             )
-            if not rag_context:
-                logger.info("⚠️  No RAG context retrieved")
+        if collection_name and user_query and not rag_context:
+            logger.info("⚠️  No RAG context retrieved")
+        rag_context = rag_context or ""
         
         # 3) Format messages - combine user query with retrieved documents
         # Limit context window to last N messages
-        recent_messages = messages[-self.max_context_messages:] if len(messages) > self.max_context_messages else messages
+        recent_messages = messages[-self.max_context_messages:]
         
         # Process messages to format them correctly
-        for msg in recent_messages:
+        last_idx = len(recent_messages) - 1
+        for i, msg in enumerate(recent_messages):
             role = msg.get("role", "user")
             content = msg.get("content", "")
             
             if role == "user":
                 # For the last user message, append RAG context if available
-                if msg == recent_messages[-1] and rag_context:
+                if i == last_idx and rag_context:
                     # This is the most recent user message - add retrieved documents
                     user_content = content
                     if rag_context:
@@ -217,36 +418,37 @@ Title:"""
             elif role == "assistant":
                 formatted.append({"role": "assistant", "content": content})
         
-        # Log what's being sent to OpenAI API
-        logger.info("=" * 80)
-        logger.info("📤 Sending to OpenAI API:")
-        if is_first_message:
-            logger.info("   (First message - system prompt included)")
-        else:
-            logger.info("   (Continuing conversation - system prompt omitted)")
-        logger.info("-" * 80)
-        for msg in formatted:
-            role = msg.get("role", "unknown")
-            content = msg.get("content", "")
-            if role == "system":
-                logger.info(f"1) SYSTEM PROMPT ({len(content)} chars):\n{content[:500]}..." if len(content) > 500 else f"1) SYSTEM PROMPT ({len(content)} chars):\n{content}")
-            elif role == "user":
-                # Show structure for user messages
-                if "\n\n========================\nRETRIEVED DOCUMENTS:" in content:
-                    parts = content.split("\n\n========================\nRETRIEVED DOCUMENTS:")
-                    user_part = parts[0]
-                    docs_part = parts[1] if len(parts) > 1 else ""
-                    logger.info(f"{'2' if is_first_message else '1'}) USER PROMPT:\n{user_part}")
-                    logger.info(f"{'3' if is_first_message else '2'}) RETRIEVED DOCUMENTS:\n{docs_part[:500]}..." if len(docs_part) > 500 else f"{'3' if is_first_message else '2'}) RETRIEVED DOCUMENTS:\n{docs_part}")
-                else:
-                    logger.info(f"{'2' if is_first_message else '1'}) USER PROMPT:\n{content[:200]}..." if len(content) > 200 else f"{'2' if is_first_message else '1'}) USER PROMPT:\n{content}")
+        # Log what's being sent to OpenAI API (skip the slicing/formatting when INFO is off)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("=" * 80)
+            logger.info("📤 Sending to OpenAI API:")
+            if is_first_message:
+                logger.info("   (First message - system prompt included)")
             else:
-                logger.info(f"{role.upper()}: {content[:200]}..." if len(content) > 200 else f"{role.upper()}: {content}")
-        logger.info("=" * 80)
+                logger.info("   (Continuing conversation - system prompt omitted)")
+            logger.info("-" * 80)
+            for msg in formatted:
+                role = msg.get("role", "unknown")
+                content = msg.get("content", "")
+                if role == "system":
+                    logger.info(f"1) SYSTEM PROMPT ({len(content)} chars):\n{content[:500]}..." if len(content) > 500 else f"1) SYSTEM PROMPT ({len(content)} chars):\n{content}")
+                elif role == "user":
+                    # Show structure for user messages
+                    if "\n\n========================\nRETRIEVED DOCUMENTS:" in content:
+                        parts = content.split("\n\n========================\nRETRIEVED DOCUMENTS:")
+                        user_part = parts[0]
+                        docs_part = parts[1] if len(parts) > 1 else ""
+                        logger.info(f"{'2' if is_first_message else '1'}) USER PROMPT:\n{user_part}")
+                        logger.info(f"{'3' if is_first_message else '2'}) RETRIEVED DOCUMENTS:\n{docs_part[:500]}..." if len(docs_part) > 500 else f"{'3' if is_first_message else '2'}) RETRIEVED DOCUMENTS:\n{docs_part}")
+                    else:
+                        logger.info(f"{'2' if is_first_message else '1'}) USER PROMPT:\n{content[:200]}..." if len(content) > 200 else f"{'2' if is_first_message else '1'}) USER PROMPT:\n{content}")
+                else:
+                    logger.info(f"{role.upper()}: {content[:200]}..." if len(content) > 200 else f"{role.upper()}: {content}")
+            logger.info("=" * 80)
         
         return formatted
     
-    def chat(
+    async def chat(
         self,
         messages: List[Dict[str, Any]],
         collection_name: Optional[str] = None,
@@ -261,41 +463,93 @@ Title:"""
         Args:
             messages: List of previous messages with 'role' and 'content'
             collection_name: Optional ChromaDB collection for RAG
-            stream: Whether to stream the response
+            stream: Whether to stream the response (see Returns)
             rag_n_results: Number of RAG results to retrieve (default: 3)
             rag_similarity_threshold: Minimum similarity for RAG results (default: 0.0)
             rag_max_context_tokens: Maximum tokens for RAG context (default: 2000)
         
         Returns:
-            Dict with 'content', 'tokens_used', and 'model'
+            Dict with 'content', 'tokens_used', and 'model'. When streaming, 'content' is
+            None and 'stream' is an async iterator of content deltas; 'tokens_used' is
+            filled in once the stream has been fully consumed.
         """
         if not messages:
             raise ValueError("Messages list cannot be empty")
         
-        # Get the last user message for RAG context
+        # One pass: last user message (for RAG context) and whether the assistant has replied yet
         last_user_message = None
-        for msg in reversed(messages):
-            if msg.get("role") == "user":
+        has_assistant_messages = False
+        for msg in messages:
+            role = msg.get("role")
+            if role == "user":
                 last_user_message = msg.get("content")
-                break
+            elif role == "assistant":
+                has_assistant_messages = True
+        
+        # Retrieve RAG context up front so the answer cache can check the evidence
+        rag_context = None
+        query_embedding = None
+        chunk_ids: List[str] = []
+        if collection_name and last_user_message:
+            rag_context, query_embedding, chunk_ids = await self._retrieve_rag_context(
+                collection_name,
+                last_user_message,
+                n_results=rag_n_results,
+                similarity_threshold=rag_similarity_threshold,
+                max_context_tokens=rag_max_context_tokens
+            )
+        
+        # Answers are only cached for single-turn chats: later turns depend on history
+        cache_scope = None
+        if len(messages) == 1 and query_embedding is not None and chunk_ids:
+            cache_scope = (collection_name, self.model)
+            cached_answer = self._answer_cache.get(cache_scope, query_embedding, chunk_ids)
+            if cached_answer is not None:
+                logger.info("Answer cache hit, skipping OpenAI call")
+                if stream:
+                    return {
+                        "content": None,
+                        "stream": self._iter_cached(cached_answer),
+                        "tokens_used": 0,
+                        "model": self.model
+                    }
+                return {
+                    "content": cached_answer,
+                    "tokens_used": 0,
+                    "model": self.model
+                }
         
         # Format messages with RAG context
-        formatted_messages = self.format_messages_for_openai(
+        formatted_messages = await self.format_messages_for_openai(
             messages, 
             collection_name=collection_name,
             user_query=last_user_message,
             rag_n_results=rag_n_results,
             rag_similarity_threshold=rag_similarity_threshold,
-            rag_max_context_tokens=rag_max_context_tokens
+            rag_max_context_tokens=rag_max_context_tokens,
+            rag_context=rag_context,
+            has_assistant_messages=has_assistant_messages
         )
         
         try:
             if stream:
-                # For streaming, we'll return an iterator
-                # For now, we'll implement non-streaming
-                raise NotImplementedError("Streaming not yet implemented")
+                response = await self._create_completion(
+                    model=self.model,
+                    messages=formatted_messages,
+                    temperature=0.7,
+                    max_tokens=2000,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                result = {
+                    "content": None,
+                    "tokens_used": None,
+                    "model": self.model
+                }
+                result["stream"] = self._iter_stream(response, result, cache_scope, query_embedding, chunk_ids)
+                return result
             
-            response = self.client.chat.completions.create(
+            response = await self._create_completion(
                 model=self.model,
                 messages=formatted_messages,
                 temperature=0.7,
@@ -305,6 +559,9 @@ Title:"""
             content = response.choices[0].message.content
             tokens_used = response.usage.total_tokens if response.usage else None
             
+            if cache_scope is not None:
+                self._answer_cache.put(cache_scope, query_embedding, chunk_ids, content)
+            
             return {
                 "content": content,
                 "tokens_used": tokens_used,
@@ -314,8 +571,38 @@ Title:"""
             logger.error(f"Error calling OpenAI API: {str(e)}")
             raise
     
-    def close(self):
-        """Clean up resources."""
-        if hasattr(self, "client") and hasattr(self.client, "_client"):
-            self.client._client.close()
+    async def _iter_stream(
+        self,
+        response,
+        result: Dict[str, Any],
+        cache_scope: Optional[Tuple[str, str]],
+        query_embedding: Optional[Tuple[float, ...]],
+        chunk_ids: List[str]
+    ) -> AsyncIterator[str]:
+        """Yield content deltas from a streamed completion, recording usage in result."""
+        parts = []
+        try:
+            async for chunk in response:
+                if chunk.usage is not None:
+                    # Sent on the final chunk (stream_options include_usage)
+                    result["tokens_used"] = chunk.usage.total_tokens
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except Exception as e:
+            logger.error(f"Error streaming from OpenAI API: {str(e)}")
+            raise
+        finally:
+            await response.close()
+        
+        if cache_scope is not None:
+            self._answer_cache.put(cache_scope, query_embedding, chunk_ids, "".join(parts))
+    
+    @staticmethod
+    async def _iter_cached(content: str) -> AsyncIterator[str]:
+        """Serve a cached answer through the streaming interface."""
+        yield content
 
@@ -1,9 +1,16 @@
 import os
+import asyncio
+import weakref
 from functools import lru_cache
 from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from dotenv import load_dotenv
 import chromadb
+import numpy as np
+
+from micro_batcher import MicroBatcher
 
 
 # Load .env from the backend directory (alongside this file) if present
@@ -15,6 +22,24 @@ class MissingEnvironmentVariableError(RuntimeError):
     """Raised when a required environment variable is not set."""
 
 
+@lru_cache(maxsize=1)
+def chroma_env() -> SimpleNamespace:
+    """
+    Chroma connection settings from the environment, read once (they don't change after startup).
+    Cloud mode applies when both api_key and tenant are set.
+    """
+    api_key = (os.getenv("CHROMA_API_KEY") or "").strip()
+    tenant = (os.getenv("CHROMA_TENANT") or "").strip()
+    return SimpleNamespace(
+        host=(os.getenv("CHROMA_HOST") or "localhost").strip(),
+        port=(os.getenv("CHROMA_PORT") or "8001").strip(),
+        database=(os.getenv("CHROMA_DATABASE") or "Lola").strip(),
+        api_key=api_key,
+        tenant=tenant,
+        cloud=bool(api_key and tenant),
+    )
+
+
 @lru_cache(maxsize=1)
 def get_chroma_client() -> chromadb.ClientAPI:
     """
@@ -23,26 +48,139 @@ def get_chroma_client() -> chromadb.ClientAPI:
     Self-hosted mode (default): Uses CHROMA_HOST and CHROMA_PORT
     Cloud mode (fallback): Uses CHROMA_API_KEY and CHROMA_TENANT if provided
     """
-    # Check for self-hosted configuration first
-    chroma_host = (os.getenv("CHROMA_HOST") or "localhost").strip()
-    chroma_port = int(os.getenv("CHROMA_PORT") or "8001")
-    database = (os.getenv("CHROMA_DATABASE") or "Lola").strip()
+    env = chroma_env()
     
     # If cloud credentials are provided, use cloud client (backward compatibility)
-    api_key = (os.getenv("CHROMA_API_KEY") or "").strip()
-    tenant = (os.getenv("CHROMA_TENANT") or "").strip()
-    
-    if api_key and tenant:
+    if env.cloud:
         # Cloud mode (backward compatibility)
-        return chromadb.CloudClient(api_key=api_key, tenant=tenant, database=database)
+        return chromadb.CloudClient(api_key=env.api_key, tenant=env.tenant, database=env.database)
     
     # Self-hosted mode (default) - connect to local Docker instance
     # For self-hosted without auth, use empty settings
     return chromadb.HttpClient(
-        host=chroma_host,
-        port=chroma_port,
+        host=env.host,
+        port=int(env.port),
         settings=chromadb.Settings(
             anonymized_telemetry=False,
             allow_reset=True
         )
     )
+
+
+# Async clients hold an httpx.AsyncClient bound to the loop they were created on, so keep one per loop
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, chromadb.AsyncClientAPI]" = weakref.WeakKeyDictionary()
+
+
+async def get_async_chroma_client() -> chromadb.AsyncClientAPI:
+    """
+    Get the shared async ChromaDB client for the running event loop.
+    Same configuration as get_chroma_client (self-hosted, or cloud if credentials are set).
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is not None:
+        return client
+    
+    env = chroma_env()
+    
+    if env.cloud:
+        # Cloud mode: same endpoint and token header the sync CloudClient uses
+        client = await chromadb.AsyncHttpClient(
+            host="api.trychroma.com",
+            port=443,
+            ssl=True,
+            headers={"x-chroma-token": env.api_key},
+            tenant=env.tenant,
+            database=env.database
+        )
+    else:
+        client = await chromadb.AsyncHttpClient(
+            host=env.host,
+            port=int(env.port),
+            settings=chromadb.Settings(anonymized_telemetry=False)
+        )
+    _async_clients[loop] = client
+    return client
+
+
+# Collection handles per loop (they hold that loop's async client), so hot endpoints skip the
+# name -> collection round-trip to Chroma. Entries expire after CHROMA_COLLECTION_CACHE_TTL
+# seconds; call invalidate_async_collection after changing a collection's metadata.
+CHROMA_COLLECTION_CACHE_TTL = float(os.getenv("CHROMA_COLLECTION_CACHE_TTL", "30"))
+_async_collections: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Tuple[Any, float]]]" = weakref.WeakKeyDictionary()
+
+
+async def get_async_collection(name: str, create: bool = False) -> Any:
+    """
+    Get an async collection handle by name, cached for CHROMA_COLLECTION_CACHE_TTL seconds.
+    
+    Args:
+        name: Collection name
+        create: Create the collection if it doesn't exist (get_or_create_collection)
+    """
+    loop = asyncio.get_running_loop()
+    cache = _async_collections.setdefault(loop, {})
+    entry = cache.get(name)
+    now = loop.time()
+    if entry is not None and entry[1] > now:
+        return entry[0]
+    
+    client = await get_async_chroma_client()
+    if create:
+        collection = await client.get_or_create_collection(name=name)
+    else:
+        collection = await client.get_collection(name=name)
+    cache[name] = (collection, now + CHROMA_COLLECTION_CACHE_TTL)
+    return collection
+
+
+def invalidate_async_collection(name: Optional[str] = None) -> None:
+    """Forget cached async collection handles for a name (or all of them) on every loop."""
+    for cache in list(_async_collections.values()):
+        if name is None:
+            cache.clear()
+        else:
+            cache.pop(name, None)
+
+
+_QUERY_RESULT_KEYS = ("ids", "embeddings", "documents", "uris", "data", "metadatas", "distances")
+
+
+def _split_query_results(results: Dict[str, Any], n: int) -> List[Dict[str, Any]]:
+    """Split a multi-embedding query result into n single-query results (same shape as a normal one)."""
+    rows = []
+    for i in range(n):
+        row = {k: ([results[k][i]] if results.get(k) is not None else None) for k in _QUERY_RESULT_KEYS}
+        row["included"] = results.get("included")
+        rows.append(row)
+    return rows
+
+
+async def _query_batch_async(
+    key: Tuple[str, int, Tuple[str, ...], str],
+    items: List[Tuple[Any, Sequence[float], Optional[dict]]]
+) -> List[Dict[str, Any]]:
+    """
+    Run several single-embedding queries against one collection as one Chroma query,
+    then split the result back into per-query results (each shaped like a normal
+    single-query result). The key is (collection name, n_results, include, canonical
+    JSON of the where filter), so every item in a group shares the same filter.
+    """
+    _, n_results, include, _ = key
+    collection, _, where = items[0]
+    results = await collection.query(
+        query_embeddings=np.asarray([embedding for _, embedding, _ in items], dtype=np.float32),
+        n_results=n_results,
+        where=where,
+        include=list(include)
+    )
+    return _split_query_results(results, len(items))
+
+
+# Coalesces concurrent queries (chat retrieval and /query) against the same collection into one round-trip
+async_query_batcher = MicroBatcher(
+    _query_batch_async,
+    max_batch=int(os.getenv("CHROMA_QUERY_BATCH_MAX_SIZE", "32")),
+    max_wait=float(os.getenv("CHROMA_QUERY_BATCH_WAIT_MS", "5")) / 1000.0,
+    name="chroma async query",
+)
@@ -0,0 +1,155 @@
+"""
+Collection file index
+
+A PostgreSQL side-index of which file each Chroma record belongs to (one row per
+record id), kept up to date by the upsert/delete endpoints. It lets the file
+listing for a collection be a single GROUP BY instead of pulling every
+metadata blob out of Chroma and aggregating it in Python.
+
+Records written through other paths (scrapers, MCP tools) aren't indexed, so
+callers should compare the record count from file_stats() with the collection's
+count() and fall back to a Chroma scan (then rebuild()) when they differ.
+"""
+import os
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+from db import get_db_connection, release_db_connection
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_INDEX_ENABLED = os.getenv("COLLECTION_INDEX_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+
+_UPSERT_SQL = """
+    INSERT INTO collection_records (collection_name, id, filename, file_type, uploaded_at, chunk_index)
+    VALUES %s
+    ON CONFLICT (collection_name, id) DO UPDATE SET
+        filename = EXCLUDED.filename,
+        file_type = EXCLUDED.file_type,
+        uploaded_at = EXCLUDED.uploaded_at,
+        chunk_index = EXCLUDED.chunk_index
+"""
+
+
+def index_rows(collection_name: str, ids: Sequence[str], metadatas: Optional[Sequence[Optional[dict]]]) -> List[Tuple]:
+    """Rows to index for these records (only the fields the file listing needs)."""
+    rows = []
+    for i, record_id in enumerate(ids):
+        meta = (metadatas[i] if metadatas else None) or {}
+        chunk_index = meta.get("chunk_index")
+        if not isinstance(chunk_index, int) or isinstance(chunk_index, bool):
+            chunk_index = None
+        file_type = meta.get("file_type")
+        uploaded_at = meta.get("uploaded_at")
+        rows.append((
+            collection_name,
+            record_id,
+            meta.get("filename") or None,
+            str(file_type) if file_type is not None else None,
+            str(uploaded_at) if uploaded_at is not None else None,
+            chunk_index,
+        ))
+    return rows
+
+
+def _execute(fn) -> bool:
+    """Run fn(cursor) in a transaction; False (and nothing committed) on any failure."""
+    if not COLLECTION_INDEX_ENABLED:
+        return False
+    conn = get_db_connection()
+    if not conn:
+        return False
+
+    try:
+        with conn.cursor() as cur:
+            fn(cur)
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.debug(f"Collection index write failed: {e}")
+        conn.rollback()
+        return False
+    finally:
+        release_db_connection(conn)
+
+
+def record_upsert(collection_name: str, ids: Sequence[str], metadatas: Optional[Sequence[Optional[dict]]]) -> None:
+    """Index upserted records (re-upserting an id replaces its row)."""
+    if not ids:
+        return
+    rows = index_rows(collection_name, ids, metadatas)
+    _execute(lambda cur: execute_values(cur, _UPSERT_SQL, rows, page_size=1000))
+
+
+def forget_files(collection_name: str, filenames: Sequence[str]) -> None:
+    """Drop the rows of deleted files."""
+    _execute(lambda cur: cur.execute(
+        "DELETE FROM collection_records WHERE collection_name = %s AND filename = ANY(%s)",
+        [collection_name, list(filenames)]
+    ))
+
+
+def forget_collection(collection_name: str) -> None:
+    """Drop a collection's rows (e.g. after a delete whose filter can't be mirrored here)."""
+    _execute(lambda cur: cur.execute("DELETE FROM collection_records WHERE collection_name = %s", [collection_name]))
+
+
+def rebuild(collection_name: str, rows: List[Tuple]) -> None:
+    """Replace a collection's rows with index_rows() gathered from a full scan of its records."""
+
+    def _replace(cur) -> None:
+        cur.execute("DELETE FROM collection_records WHERE collection_name = %s", [collection_name])
+        execute_values(cur, _UPSERT_SQL, rows, page_size=1000)
+
+    if _execute(_replace):
+        logger.info(f"Rebuilt file index for collection '{collection_name}' ({len(rows)} records)")
+
+
+def file_stats(collection_name: str) -> Optional[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Per-file statistics for a collection from the index.
+
+    Returns:
+        (indexed record count, files sorted by filename), or None if the index is unavailable
+    """
+    if not COLLECTION_INDEX_ENABLED:
+        return None
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM collection_records WHERE collection_name = %s", [collection_name])
+            total_records = cur.fetchone()[0]
+            cur.execute(
+                """
+                SELECT filename, min(file_type), count(*), min(uploaded_at), min(chunk_index), max(chunk_index)
+                FROM collection_records
+                WHERE collection_name = %s AND filename IS NOT NULL
+                GROUP BY filename
+                ORDER BY filename
+                """,
+                [collection_name]
+            )
+            files = [
+                {
+                    "filename": filename,
+                    "file_type": file_type,
+                    "record_count": record_count,
+                    "uploaded_at": uploaded_at,
+                    "first_chunk_index": first_chunk_index,
+                    "last_chunk_index": last_chunk_index,
+                }
+                for filename, file_type, record_count, uploaded_at, first_chunk_index, last_chunk_index in cur.fetchall()
+            ]
+        conn.commit()
+        return total_records, files
+    except Exception as e:
+        logger.debug(f"Collection index read failed: {e}")
+        conn.rollback()
+        return None
+    finally:
+        release_db_connection(conn)
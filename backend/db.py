@@ -0,0 +1,103 @@
+"""
+PostgreSQL connection pool
+
+Shared by rag_config and document_summarizer so each query reuses an open
+connection instead of paying connect/auth on every call.
+"""
+import os
+import logging
+import threading
+import time
+import weakref
+from functools import lru_cache
+from pathlib import Path
+from typing import Set
+
+from dotenv import load_dotenv
+from psycopg2.pool import ThreadedConnectionPool
+
+# Load .env from the backend directory (alongside this file) if present
+_ENV_PATH = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=_ENV_PATH if _ENV_PATH.exists() else None)
+
+logger = logging.getLogger(__name__)
+
+POSTGRES_POOL_MIN = int(os.getenv("POSTGRES_POOL_MIN", "1"))
+POSTGRES_POOL_MAX = int(os.getenv("POSTGRES_POOL_MAX", "10"))
+POSTGRES_CONNECT_TIMEOUT = int(os.getenv("POSTGRES_CONNECT_TIMEOUT", "5"))
+# After a failed connect, callers get None for this many seconds instead of reconnecting each time
+POSTGRES_RETRY_AFTER = float(os.getenv("POSTGRES_RETRY_AFTER", "30"))
+
+# ThreadedConnectionPool raises when exhausted; this makes callers wait for a free slot instead
+_pool_slots = threading.BoundedSemaphore(POSTGRES_POOL_MAX)
+
+# Server-side prepared statements already created on each pooled connection
+_prepared: "weakref.WeakKeyDictionary[object, Set[str]]" = weakref.WeakKeyDictionary()
+
+# time.monotonic() of the last failed connect (0.0 while the database is reachable)
+_failed_at = 0.0
+
+
+@lru_cache(maxsize=1)
+def _get_pool() -> ThreadedConnectionPool:
+    return ThreadedConnectionPool(
+        minconn=POSTGRES_POOL_MIN,
+        maxconn=POSTGRES_POOL_MAX,
+        host=os.getenv("POSTGRES_HOST", "localhost"),
+        port=int(os.getenv("POSTGRES_PORT", "5433")),
+        database=os.getenv("POSTGRES_DB", "lola_db"),
+        user=os.getenv("POSTGRES_USER", "lola"),
+        password=os.getenv("POSTGRES_PASSWORD", "lola_dev_password"),
+        connect_timeout=POSTGRES_CONNECT_TIMEOUT,
+    )
+
+
+def get_db_connection():
+    """
+    Borrow a PostgreSQL connection from the pool (None if the database is unavailable).
+    Every connection returned must be handed back with release_db_connection().
+    After a failed connect, returns None without retrying for POSTGRES_RETRY_AFTER seconds.
+    """
+    global _failed_at
+    if _failed_at and time.monotonic() - _failed_at < POSTGRES_RETRY_AFTER:
+        return None
+    
+    _pool_slots.acquire()
+    try:
+        pool = _get_pool()
+        conn = pool.getconn()
+        if conn.closed:
+            # Dropped since it was pooled; discard it and open a fresh one
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        _failed_at = 0.0
+        return conn
+    except Exception as e:
+        _pool_slots.release()
+        if not _failed_at:
+            logger.error(f"Failed to connect to PostgreSQL (retrying in {POSTGRES_RETRY_AFTER:g}s): {str(e)}")
+        _failed_at = time.monotonic()
+        return None
+
+
+def release_db_connection(conn) -> None:
+    """Return a connection to the pool (broken connections are closed instead of reused)."""
+    try:
+        _get_pool().putconn(conn, close=bool(conn.closed))
+    except Exception as e:
+        logger.warning(f"Failed to return PostgreSQL connection to pool: {str(e)}")
+    finally:
+        _pool_slots.release()
+
+
+def prepare_statement(conn, name: str, sql: str) -> None:
+    """
+    PREPARE `sql` (with $1, $2, ... placeholders) as `name` on this connection, once.
+    Prepared statements last for the session, so pooled connections parse and plan
+    it only on first use; run it with cur.execute(f"EXECUTE {name} (%s, ...)", params).
+    """
+    names = _prepared.setdefault(conn, set())
+    if name not in names:
+        with conn.cursor() as cur:
+            cur.execute(f"PREPARE {name} AS {sql}")
+        names.add(name)
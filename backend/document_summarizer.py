@@ -2,20 +2,28 @@
 Document Summarization Service
 
 Implements hierarchical summarization algorithm for cost-efficient document summarization.
-Process: 25 chunks per batch → batch summaries → final summary
+Process: chunks packed into ~8k-token batches → batch summaries → final summary
 Cost: ~22-23 LLM calls for 500 chunks
 """
 import os
+import asyncio
+import hashlib
+import json
 import logging
-from typing import Dict, Any, List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any, AsyncIterator, Coroutine, List, Optional, Tuple
 from pathlib import Path
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from openai import OpenAI
+from psycopg2.extras import RealDictCursor, execute_values
+from openai import AsyncOpenAI
 import httpx
+import numpy as np
 
 from dotenv import load_dotenv
-from chroma_client import get_chroma_client
+from db import get_db_connection, release_db_connection, prepare_statement
+from tokenizer import get_encoding, count_tokens
+from rate_limit import OPENAI_RETRYABLE, estimate_tokens, openai_limiter, retry_async
+from chroma_client import get_async_chroma_client
 
 # Load environment variables
 _ENV_PATH = Path(__file__).parent / ".env"
@@ -23,63 +31,205 @@ load_dotenv(dotenv_path=_ENV_PATH if _ENV_PATH.exists() else None)
 
 logger = logging.getLogger(__name__)
 
+# Bump when the batch summary prompt changes so cached batch summaries are not reused
+BATCH_PROMPT_VERSION = "v1"
 
-def _get_db_connection():
-    """Get PostgreSQL database connection."""
+# Tokens for the "\n\n---\n\n" separator between chunks in a batch
+_SEPARATOR_TOKENS = 3
+
+# Prompt wording plus the final summary's max_tokens, reserved when checking the single-call budget
+_SINGLE_CALL_OVERHEAD_TOKENS = 1200
+
+# Final summaries are written to PostgreSQL here, off the response path
+# (pending writes are still flushed at interpreter exit)
+_summary_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary-writer")
+
+_UPSERT_SUMMARY_SQL = """INSERT INTO document_summaries
+       (collection_name, filename, summary, chunks_processed, llm_calls_made, model_used, created_at, updated_at)
+       VALUES ($1, $2, $3, $4, $5, $6, NOW(), NOW())
+       ON CONFLICT (collection_name, filename)
+       DO UPDATE SET
+           summary = EXCLUDED.summary,
+           chunks_processed = EXCLUDED.chunks_processed,
+           llm_calls_made = EXCLUDED.llm_calls_made,
+           model_used = EXCLUDED.model_used,
+           updated_at = NOW()"""
+
+
+def _log_failed_write(name: str, write: Future) -> None:
+    """Done-callback for background summary writes, so a failed write is not lost with its future."""
+    if write.cancelled():
+        logger.error(f"Summary write for {name} was cancelled; the summary was not stored")
+    elif write.exception() is not None:
+        logger.error(f"Summary write for {name} failed: {write.exception()}")
+    elif not write.result():
+        logger.error(f"Summary for {name} was not stored")
+
+
+def _batch_cache_key(model: str, batch_text: str) -> bytes:
+    """Exact-match cache key for a batch summary."""
+    return hashlib.sha256(f"{model}|{BATCH_PROMPT_VERSION}|{batch_text}".encode("utf-8")).digest()
+
+
+def _get_cached_batch_summary(key: bytes) -> Optional[str]:
+    """Look up a previously generated batch summary (None on miss or if the cache is unavailable)."""
+    conn = get_db_connection()
+    if not conn:
+        return None
+    
     try:
-        conn = psycopg2.connect(
-            host=os.getenv("POSTGRES_HOST", "localhost"),
-            port=int(os.getenv("POSTGRES_PORT", "5433")),
-            database=os.getenv("POSTGRES_DB", "lola_db"),
-            user=os.getenv("POSTGRES_USER", "lola"),
-            password=os.getenv("POSTGRES_PASSWORD", "lola_dev_password"),
-        )
-        return conn
+        with conn.cursor() as cur:
+            cur.execute("SELECT summary FROM batch_summary_cache WHERE key = %s", [key])
+            row = cur.fetchone()
+            return row[0] if row else None
     except Exception as e:
-        logger.error(f"Failed to connect to PostgreSQL: {str(e)}")
+        logger.debug(f"Batch summary cache lookup failed: {e}")
         return None
+    finally:
+        release_db_connection(conn)
+
+
+def _store_cached_batch_summaries(rows: List[Tuple[bytes, str]], model: str) -> None:
+    """Remember (key, summary) pairs for identical batches in later runs, in one round-trip."""
+    if not rows:
+        return
+    conn = get_db_connection()
+    if not conn:
+        return
+    
+    try:
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                """INSERT INTO batch_summary_cache (key, summary, model, created_at)
+                   VALUES %s
+                   ON CONFLICT (key) DO NOTHING""",
+                [(key, summary, model) for key, summary in rows],
+                template="(%s, %s, %s, NOW())",
+                page_size=500
+            )
+            conn.commit()
+    except Exception as e:
+        logger.debug(f"Batch summary cache write failed: {e}")
+        conn.rollback()
+    finally:
+        release_db_connection(conn)
+
+
+def _pack_by_tokens(token_counts: np.ndarray, budget: int) -> List[Tuple[int, int]]:
+    """
+    Greedily split chunks into (start, end) ranges of at most `budget` tokens each
+    (separators included). A chunk larger than the budget gets a batch of its own.
+    """
+    bounds = []
+    start = 0
+    used = 0
+    for i, tokens in enumerate((token_counts + _SEPARATOR_TOKENS).tolist()):
+        if i > start and used + tokens > budget:
+            bounds.append((start, i))
+            start, used = i, 0
+        used += tokens
+    if start < len(token_counts):
+        bounds.append((start, len(token_counts)))
+    return bounds
+
+
+async def _single_page(batch_texts: List[str]) -> AsyncIterator[List[str]]:
+    """Page iterator over batch texts that were already fetched."""
+    yield batch_texts
+
+
+def _run_sync(coro: Coroutine) -> Any:
+    """
+    Run a coroutine to completion from synchronous code.
+    
+    Uses asyncio.run normally; if this thread already has a running event loop
+    (e.g. a sync MCP tool called from the server's loop), the coroutine gets its
+    own loop on a worker thread instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
 
 
 class DocumentSummarizer:
     """Hierarchical document summarization service."""
     
-    def __init__(self, model: Optional[str] = None):
-        """Initialize summarizer with OpenAI client."""
+    def __init__(self, model: Optional[str] = None, use_batch_api: Optional[bool] = None):
+        """
+        Initialize summarizer settings (the OpenAI client is created per run).
+        
+        Args:
+            model: Chat model for summaries (default: CHAT_MODEL env var or gpt-4o-mini)
+            use_batch_api: Run the batch-summary (map) step through the OpenAI Batch API,
+                at half the price but with hours of latency; for background jobs only
+                (default: SUMMARY_USE_BATCH_API env var)
+        """
         api_key = (os.getenv("OPENAI_API_KEY") or "").strip()
         if not api_key:
             raise RuntimeError("OPENAI_API_KEY must be set")
         
-        http_client = httpx.Client(timeout=httpx.Timeout(120.0))  # Longer timeout for summarization
-        self.client = OpenAI(api_key=api_key, http_client=http_client)
+        self.api_key = api_key
         self.model = model or os.getenv("CHAT_MODEL", "gpt-4o-mini")
         self.chunks_per_batch = 25  # Process 25 chunks at a time
+        # Batches are packed up to this many tokens (0 = fixed chunks_per_batch instead)
+        self.batch_token_budget = int(os.getenv("SUMMARY_BATCH_TOKEN_BUDGET", "8000"))
+        # Max batch summaries in flight at once (keeps bursts under the RPM limit)
+        self.max_concurrency = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "20"))
+        if use_batch_api is None:
+            use_batch_api = os.getenv("SUMMARY_USE_BATCH_API", "false").strip().lower() in ("1", "true", "yes")
+        self.use_batch_api = use_batch_api
+        self.batch_poll_interval = float(os.getenv("SUMMARY_BATCH_POLL_SECONDS", "30"))
+        # Batches marshaled into one chat completion (JSON list of summaries); 1 = one request per batch
+        self.batches_per_request = max(1, int(os.getenv("SUMMARY_BATCHES_PER_REQUEST", "1")))
+        # Max summaries combined per reduce step (and in the final summary prompt)
+        self.reduce_fanout = max(2, int(os.getenv("SUMMARY_REDUCE_FANOUT", "10")))
+        # Chunks are fetched from ChromaDB this many requests' worth of batches at a time
+        self.page_batches = max(1, int(os.getenv("SUMMARY_PAGE_BATCHES", "4")))
+        # Documents whose text fits in this fraction of the model context get a single summary call
+        self.context_tokens = int(os.getenv("SUMMARY_CONTEXT_TOKENS", "128000"))
+        self.single_call_fraction = float(os.getenv("SUMMARY_SINGLE_CALL_FRACTION", "0.6"))
     
     def summarize_document(
         self,
         collection_name: str,
         filename: str,
         chunks_per_batch: int = 25
+    ) -> Dict[str, Any]:
+        """Synchronous wrapper around summarize_document_async for existing callers."""
+        return _run_sync(self.summarize_document_async(collection_name, filename, chunks_per_batch))
+    
+    async def summarize_document_async(
+        self,
+        collection_name: str,
+        filename: str,
+        chunks_per_batch: int = 25
     ) -> Dict[str, Any]:
         """
         Generate hierarchical summary of a document.
         
         Algorithm:
-        1. Retrieve all chunks for the document from ChromaDB
-        2. Process in batches of 25 chunks → generate batch summaries
+        1. Page the document's chunks in from ChromaDB
+        2. Pack chunks into batches by token budget → generate batch summaries (concurrently)
+           (a document that fits in one prompt skips straight to a single summary call)
         3. Final summarization: combine all batch summaries → final summary
-        4. Store summary in PostgreSQL
+        4. Store summary in PostgreSQL (in the background)
         
         Args:
             collection_name: Name of the ChromaDB collection
             filename: Name of the file to summarize
-            chunks_per_batch: Number of chunks per batch (default: 25)
+            chunks_per_batch: Number of chunks per batch (default: 25); with a token budget
+                (SUMMARY_BATCH_TOKEN_BUDGET) it only sizes the pages fetched from ChromaDB
         
         Returns:
             Dictionary with summary, metadata, and processing stats
         """
         try:
             # Check if summary already exists
-            existing_summary = self.get_summary(collection_name, filename)
+            existing_summary = await asyncio.to_thread(self.get_summary, collection_name, filename)
             if existing_summary:
                 logger.info(f"Summary already exists for '{filename}', returning cached summary")
                 return {
@@ -92,80 +242,60 @@ class DocumentSummarizer:
                     "updated_at": existing_summary.get("updated_at")
                 }
             
-            # Get all chunks for this document
-            client = get_chroma_client()
-            collection = client.get_collection(collection_name)
+            chroma = await get_async_chroma_client()
+            collection = await chroma.get_collection(collection_name)
             
-            # Query all chunks for this filename
-            results = collection.get(
-                where={"filename": filename},
-                include=["documents", "metadatas"]
-            )
+            # Count the chunks for this filename (ids only); documents are paged in below
+            total_chunks = len((await collection.get(where={"filename": filename}, include=[]))["ids"])
             
-            if not results["ids"]:
+            if not total_chunks:
                 return {
                     "error": f"No chunks found for file '{filename}' in collection '{collection_name}'"
                 }
             
-            chunks = results["documents"]
-            total_chunks = len(chunks)
-            
             logger.info(f"Summarizing document '{filename}': {total_chunks} chunks")
             
-            # Step 1: Process chunks in batches
-            batch_summaries = []
-            llm_calls = 0
+            # Page size is a whole number of requests' worth of batches, so pages split cleanly
+            page_size = chunks_per_batch * self.batches_per_request * self.page_batches
+            pages = self._iter_batch_pages(collection, filename, total_chunks, page_size, chunks_per_batch)
             
-            for i in range(0, total_chunks, chunks_per_batch):
-                batch = chunks[i:i + chunks_per_batch]
-                batch_num = (i // chunks_per_batch) + 1
-                total_batches = (total_chunks + chunks_per_batch - 1) // chunks_per_batch
+            # Retries are handled by retry_async (with jitter), so disable the SDK's own retries
+            async with AsyncOpenAI(
+                api_key=self.api_key,
+                http_client=httpx.AsyncClient(timeout=httpx.Timeout(120.0)),  # Longer timeout for summarization
+                max_retries=0
+            ) as client:
+                # Known up front only for fixed-size batches; token-packed batches are counted as pages arrive
+                total_batches = None if self.batch_token_budget else (total_chunks + chunks_per_batch - 1) // chunks_per_batch
                 
-                logger.info(f"Processing batch {batch_num}/{total_batches} ({len(batch)} chunks)")
+                # Small documents (one page) that fit comfortably in the context are summarized
+                # in a single call instead of map + final (at least two calls)
+                single_text = None
+                if total_chunks <= page_size:
+                    batch_texts = [text async for page_texts in pages for text in page_texts]
+                    if self._fits_single_call(batch_texts):
+                        single_text = "\n\n---\n\n".join(batch_texts)
+                    else:
+                        pages = _single_page(batch_texts)
                 
-                # Create batch summary
-                batch_text = "\n\n---\n\n".join(batch)
-                batch_summary = self._summarize_batch(batch_text, batch_num, total_batches)
-                llm_calls += 1
-                
-                if batch_summary:
-                    batch_summaries.append(batch_summary)
+                if single_text is not None:
+                    logger.info(f"Document '{filename}' fits in one request, summarizing in a single call")
+                    final_summary = await self._create_final_summary(client, single_text, filename, from_chunks=True)
+                    if not final_summary:
+                        return {"error": "Failed to generate summary"}
+                    llm_calls, batches_processed = 1, 0
                 else:
-                    logger.warning(f"Failed to generate summary for batch {batch_num}")
-            
-            if not batch_summaries:
-                return {
-                    "error": "Failed to generate any batch summaries"
-                }
+                    # Map batch summaries, then reduce them to the final summary
+                    result = await self._map_reduce(client, pages, total_batches, filename)
+                    if result is None:
+                        return {
+                            "error": "Failed to generate any batch summaries"
+                        }
+                    final_summary, llm_calls, batches_processed = result
             
-            # Step 2: Final summarization
-            logger.info(f"Generating final summary from {len(batch_summaries)} batch summaries")
-            
-            # If we have many batch summaries, may need to summarize in stages
-            if len(batch_summaries) > 10:
-                # Two-stage final summarization
-                # Stage 1: Summarize first half
-                first_half = "\n\n---\n\n".join(batch_summaries[:len(batch_summaries)//2])
-                first_summary = self._summarize_batch(first_half, 1, 2)
-                llm_calls += 1
-                
-                # Stage 2: Summarize second half
-                second_half = "\n\n---\n\n".join(batch_summaries[len(batch_summaries)//2:])
-                second_summary = self._summarize_batch(second_half, 2, 2)
-                llm_calls += 1
-                
-                # Stage 3: Final summary
-                combined = f"{first_summary}\n\n---\n\n{second_summary}"
-                final_summary = self._create_final_summary(combined, filename)
-                llm_calls += 1
-            else:
-                # Single-stage final summarization
-                combined = "\n\n---\n\n".join(batch_summaries)
-                final_summary = self._create_final_summary(combined, filename)
-                llm_calls += 1
-            
-            # Step 3: Store in PostgreSQL
-            stored = self._store_summary(
+            # Step 3: Store in PostgreSQL in the background; the caller already has the summary
+            write = _summary_writer.submit(
+                self._store_summary,
                 collection_name=collection_name,
                 filename=filename,
                 summary=final_summary,
@@ -173,23 +303,289 @@ class DocumentSummarizer:
                 llm_calls_made=llm_calls,
                 model_used=self.model
             )
+            write.add_done_callback(partial(_log_failed_write, f"{collection_name}/{filename}"))
             
             return {
                 "summary": final_summary,
                 "chunks_processed": total_chunks,
-                "batches_processed": len(batch_summaries),
+                "batches_processed": batches_processed,
                 "llm_calls_made": llm_calls,
                 "model_used": self.model,
-                "stored": stored
+                # Not known yet: the write finishes after this returns (failures are logged)
+                "stored": None,
+                "store_pending": True
             }
             
         except Exception as e:
             logger.error(f"Error summarizing document: {e}", exc_info=True)
             return {"error": str(e)}
     
-    def _summarize_batch(self, batch_text: str, batch_num: int, total_batches: int) -> str:
-        """Summarize a batch of chunks."""
-        prompt = f"""Summarize the following content from a document. This is batch {batch_num} of {total_batches}.
+    async def _map_reduce(
+        self,
+        client: AsyncOpenAI,
+        pages: AsyncIterator[List[str]],
+        total_batches: Optional[int],
+        filename: str
+    ) -> Optional[Tuple[str, int, int]]:
+        """
+        Summarize every batch, reduce the batch summaries, and create the final summary.
+        
+        Returns:
+            (final summary, LLM calls made, batches summarized), or None if no batch summary succeeded
+        """
+        sem = asyncio.Semaphore(self.max_concurrency)
+        
+        # Summarize all batches (concurrently, or as one Batch API job)
+        if self.use_batch_api:
+            batch_texts = [text async for page_texts in pages for text in page_texts]
+            logger.info(f"Submitting {len(batch_texts)} batches to the OpenAI Batch API")
+            results_per_batch = await self._summarize_batches_via_batch_api(client, batch_texts)
+            llm_calls = len(batch_texts)
+        else:
+            logger.info(f"Processing batches concurrently (max {self.max_concurrency} in flight)")
+            # Batches start as soon as their page arrives, overlapping Chroma reads with LLM calls
+            m = self.batches_per_request
+            tasks = []
+            batch_num = 1
+            try:
+                async for page_texts in pages:
+                    for i in range(0, len(page_texts), m):
+                        if m > 1:
+                            coro = self._summarize_batch_group(client, sem, page_texts[i:i + m], batch_num + i, total_batches)
+                        else:
+                            coro = self._summarize_batch(client, sem, page_texts[i], batch_num + i, total_batches)
+                        tasks.append(asyncio.create_task(coro))
+                    batch_num += len(page_texts)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+            logger.info(f"Queued {batch_num - 1} batches in {len(tasks)} requests")
+            results = await asyncio.gather(*tasks)
+            results_per_batch = [summary for group in results for summary in group] if m > 1 else results
+            llm_calls = len(tasks)
+        
+        batch_summaries = []
+        for batch_num, batch_summary in enumerate(results_per_batch, start=1):
+            if batch_summary:
+                batch_summaries.append(batch_summary)
+            else:
+                logger.warning(f"Failed to generate summary for batch {batch_num}")
+        
+        if not batch_summaries:
+            return None
+        
+        # Combine the batch summaries
+        logger.info(f"Generating final summary from {len(batch_summaries)} batch summaries")
+        
+        # Reduce tree: while there are more summaries than fit in one final prompt,
+        # summarize groups of `reduce_fanout` concurrently (logarithmic depth)
+        level = batch_summaries
+        fanout = self.reduce_fanout
+        while len(level) > fanout:
+            total_groups = (len(level) + fanout - 1) // fanout
+            logger.info(f"Reducing {len(level)} summaries in {total_groups} groups")
+            reduced = await asyncio.gather(*[
+                self._summarize_batch(client, sem, "\n\n---\n\n".join(level[i:i + fanout]), n, total_groups)
+                for n, i in enumerate(range(0, len(level), fanout), start=1)
+            ])
+            llm_calls += total_groups
+            # A group whose reduce call failed carries its inputs up unreduced, so nothing is dropped
+            next_level = []
+            for n, (i, summary) in enumerate(zip(range(0, len(level), fanout), reduced), start=1):
+                if summary:
+                    next_level.append(summary)
+                else:
+                    logger.warning(f"Failed to reduce group {n}/{total_groups}; keeping its {len(level[i:i + fanout])} summaries")
+                    next_level.extend(level[i:i + fanout])
+            if len(next_level) >= len(level):
+                # Nothing could be reduced further; the final call combines everything left
+                level = next_level
+                break
+            level = next_level
+        
+        combined = "\n\n---\n\n".join(level)
+        final_summary = await self._create_final_summary(client, combined, filename)
+        llm_calls += 1
+        return final_summary, llm_calls, len(batch_summaries)
+    
+    def _fits_single_call(self, batch_texts: List[str]) -> bool:
+        """Whether the whole document fits in one final-summary prompt (within SUMMARY_SINGLE_CALL_FRACTION of the context)."""
+        total_tokens = sum(count_tokens(batch_texts, get_encoding(self.model)))
+        return total_tokens + _SINGLE_CALL_OVERHEAD_TOKENS <= self.context_tokens * self.single_call_fraction
+    
+    async def _iter_batch_pages(
+        self,
+        collection: Any,
+        filename: str,
+        total_chunks: int,
+        page_size: int,
+        chunks_per_batch: int
+    ) -> AsyncIterator[List[str]]:
+        """
+        Yield the document's batch texts a page at a time, so memory stays bounded by the page size.
+        Each page's raw chunks are released once joined, so they are never held alongside the batch texts.
+        
+        Chunks are packed into batches of up to `batch_token_budget` tokens (or, with a budget
+        of 0, `chunks_per_batch` chunks each). Repeated chunks (headers, footers, boilerplate)
+        are summarized only at their first occurrence.
+        """
+        seen = set()
+        for offset in range(0, total_chunks, page_size):
+            chunks = (await collection.get(
+                where={"filename": filename},
+                include=["documents"],
+                limit=page_size,
+                offset=offset
+            ))["documents"]
+            if not chunks:
+                return
+            unique_chunks = []
+            for chunk in chunks:
+                digest = hashlib.blake2b(chunk.encode("utf-8"), digest_size=16).digest()
+                if digest not in seen:
+                    seen.add(digest)
+                    unique_chunks.append(chunk)
+            if len(unique_chunks) < len(chunks):
+                logger.info(f"Skipping {len(chunks) - len(unique_chunks)} duplicate chunks")
+            chunks = unique_chunks
+            if not chunks:
+                continue
+            if self.batch_token_budget:
+                counts = np.asarray(count_tokens(chunks, get_encoding(self.model)), dtype=np.int32)
+                bounds = _pack_by_tokens(counts, self.batch_token_budget)
+            else:
+                bounds = [(i, i + chunks_per_batch) for i in range(0, len(chunks), chunks_per_batch)]
+            batch_texts = ["\n\n---\n\n".join(chunks[start:end]) for start, end in bounds]
+            del chunks
+            yield batch_texts
+    
+    async def _complete(self, client: AsyncOpenAI, **kwargs):
+        """Create a chat completion under the shared OpenAI rate limits, retrying transient failures."""
+        estimated_tokens = estimate_tokens([m["content"] for m in kwargs["messages"]]) + kwargs.get("max_tokens", 0)
+        
+        async def attempt():
+            await openai_limiter.acquire(estimated_tokens)
+            return await client.chat.completions.create(**kwargs)
+        return await retry_async(attempt, OPENAI_RETRYABLE)
+    
+    async def _summarize_batch(
+        self,
+        client: AsyncOpenAI,
+        sem: asyncio.Semaphore,
+        batch_text: str,
+        batch_num: int,
+        total_batches: Optional[int]
+    ) -> str:
+        """Summarize a batch of chunks (identical batches are served from batch_summary_cache)."""
+        cache_key = _batch_cache_key(self.model, batch_text)
+        cached = await asyncio.to_thread(_get_cached_batch_summary, cache_key)
+        if cached:
+            # Per-batch logs use lazy %-formatting, so nothing is formatted when INFO is off
+            logger.info("Batch %d/%s served from summary cache", batch_num, total_batches or "?")
+            return cached
+        
+        prompt = self._batch_prompt(batch_text, batch_num, total_batches)
+        
+        try:
+            async with sem:
+                response = await self._complete(
+                    client,
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=500,
+                    temperature=0.3
+                )
+            logger.info("Summarized batch %d/%s", batch_num, total_batches or "?")
+            summary = response.choices[0].message.content.strip()
+            if summary:
+                await asyncio.to_thread(_store_cached_batch_summaries, [(cache_key, summary)], self.model)
+            return summary
+        except Exception as e:
+            logger.error(f"Error summarizing batch {batch_num}: {e}")
+            return ""
+    
+    async def _summarize_batch_group(
+        self,
+        client: AsyncOpenAI,
+        sem: asyncio.Semaphore,
+        batch_texts: List[str],
+        first_batch_num: int,
+        total_batches: Optional[int]
+    ) -> List[str]:
+        """
+        Summarize several batches with one chat completion ("row-marshaling").
+        
+        Asks for a JSON object {"summaries": [...]} with one entry per batch. Cached batches
+        are skipped; if the response can't be parsed into the right number of summaries,
+        the uncached batches fall back to one request each.
+        """
+        cache_keys = [_batch_cache_key(self.model, text) for text in batch_texts]
+        cached = await asyncio.gather(*[asyncio.to_thread(_get_cached_batch_summary, key) for key in cache_keys])
+        summaries = [hit or "" for hit in cached]
+        misses = [i for i, hit in enumerate(cached) if not hit]
+        if not misses:
+            return summaries
+        if len(misses) == 1:
+            i = misses[0]
+            summaries[i] = await self._summarize_batch(client, sem, batch_texts[i], first_batch_num + i, total_batches)
+            return summaries
+        
+        sections = "\n\n".join(
+            f"BATCH {n}:\n{batch_texts[i]}" for n, i in enumerate(misses, start=1)
+        )
+        prompt = f"""Summarize each of the following {len(misses)} batches of content from a document separately.
+
+For each batch, focus on:
+- Key concepts and main ideas
+- Important details and facts
+- Technical information if present
+- Structure and organization
+
+Return JSON of the form {{"summaries": ["<summary of batch 1>", "<summary of batch 2>", ...]}} with exactly {len(misses)} summaries, in batch order.
+
+{sections}"""
+        
+        parsed = None
+        try:
+            async with sem:
+                response = await self._complete(
+                    client,
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=500 * len(misses),
+                    temperature=0.3,
+                    response_format={"type": "json_object"}
+                )
+            parsed = json.loads(response.choices[0].message.content)["summaries"]
+        except Exception as e:
+            logger.error(f"Error summarizing batches {first_batch_num}-{first_batch_num + len(batch_texts) - 1}: {e}")
+        
+        if not isinstance(parsed, list) or len(parsed) != len(misses):
+            logger.warning(f"Marshaled summary for batches starting at {first_batch_num} unusable, retrying individually")
+            results = await asyncio.gather(*[
+                self._summarize_batch(client, sem, batch_texts[i], first_batch_num + i, total_batches)
+                for i in misses
+            ])
+            for i, summary in zip(misses, results):
+                summaries[i] = summary
+            return summaries
+        
+        new_rows = []
+        for i, summary in zip(misses, parsed):
+            summary = str(summary).strip()
+            summaries[i] = summary
+            if summary:
+                new_rows.append((cache_keys[i], summary))
+        await asyncio.to_thread(_store_cached_batch_summaries, new_rows, self.model)
+        logger.info("Summarized batches %d-%d/%s in one request", first_batch_num, first_batch_num + len(batch_texts) - 1, total_batches or "?")
+        return summaries
+    
+    @staticmethod
+    def _batch_prompt(batch_text: str, batch_num: int, total_batches: Optional[int]) -> str:
+        """Prompt for summarizing one batch of chunks."""
+        position = f"batch {batch_num} of {total_batches}" if total_batches else f"batch {batch_num}"
+        return f"""Summarize the following content from a document. This is {position}.
 
 Focus on:
 - Key concepts and main ideas
@@ -201,36 +597,106 @@ Content:
 {batch_text}
 
 Summary:"""
+    
+    async def _summarize_batches_via_batch_api(self, client: AsyncOpenAI, batch_texts: List[str]) -> List[str]:
+        """
+        Summarize batches through the OpenAI Batch API (50% cheaper, completes within 24h).
+        
+        Cached batches are resolved first; the rest go into one JSONL job that is polled
+        until it finishes. Returns one summary per batch ("" for any that failed).
+        """
+        total_batches = len(batch_texts)
+        summaries = [""] * total_batches
+        cache_keys = [_batch_cache_key(self.model, text) for text in batch_texts]
+        
+        cached = await asyncio.gather(*[asyncio.to_thread(_get_cached_batch_summary, key) for key in cache_keys])
+        lines = []
+        for i, (batch_text, hit) in enumerate(zip(batch_texts, cached)):
+            if hit:
+                summaries[i] = hit
+                continue
+            lines.append(json.dumps({
+                "custom_id": f"batch_{i + 1}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "messages": [{"role": "user", "content": self._batch_prompt(batch_text, i + 1, total_batches)}],
+                    "max_tokens": 500,
+                    "temperature": 0.3
+                }
+            }))
+        if not lines:
+            logger.info("All batches served from summary cache")
+            return summaries
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=500,
-                temperature=0.3
+            input_file = await client.files.create(
+                file=("batch_summaries.jsonl", "\n".join(lines).encode("utf-8")),
+                purpose="batch"
             )
-            return response.choices[0].message.content.strip()
+            job = await client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+            logger.info(f"Created Batch API job {job.id} ({len(lines)} requests)")
+            
+            while job.status not in ("completed", "failed", "expired", "cancelled"):
+                await asyncio.sleep(self.batch_poll_interval)
+                job = await client.batches.retrieve(job.id)
+            
+            if not job.output_file_id:
+                logger.error(f"Batch API job {job.id} ended with status '{job.status}' and no output")
+                return summaries
+            
+            output = await client.files.content(job.output_file_id)
+            new_rows = []
+            for line in output.text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                i = int(record["custom_id"].split("_", 1)[1]) - 1
+                response = record.get("response") or {}
+                if response.get("status_code") != 200:
+                    logger.error(f"Batch API request {record['custom_id']} failed: {record.get('error')}")
+                    continue
+                summary = response["body"]["choices"][0]["message"]["content"].strip()
+                summaries[i] = summary
+                if summary:
+                    new_rows.append((cache_keys[i], summary))
+            await asyncio.to_thread(_store_cached_batch_summaries, new_rows, self.model)
+            logger.info(f"Batch API job {job.id} finished with status '{job.status}'")
         except Exception as e:
-            logger.error(f"Error summarizing batch {batch_num}: {e}")
-            return ""
+            logger.error(f"Error running Batch API summarization: {e}", exc_info=True)
+        
+        return summaries
     
-    def _create_final_summary(self, combined_summaries: str, filename: str) -> str:
-        """Create final comprehensive summary from batch summaries."""
-        prompt = f"""Create a comprehensive summary of the document "{filename}" based on these batch summaries.
+    async def _create_final_summary(
+        self,
+        client: AsyncOpenAI,
+        combined_summaries: str,
+        filename: str,
+        from_chunks: bool = False
+    ) -> str:
+        """Create final comprehensive summary from batch summaries (or, with from_chunks, from the raw chunks)."""
+        source = "content" if from_chunks else "batch summaries"
+        prompt = f"""Create a comprehensive summary of the document "{filename}" based on these {source}.
 
 The summary should:
-- Synthesize all key information from the batch summaries
+- Synthesize all key information from the {source}
 - Provide a coherent overview of the entire document
 - Highlight main themes, concepts, and important details
 - Be well-structured and easy to understand
 
-Batch Summaries:
+{"Content" if from_chunks else "Batch Summaries"}:
 {combined_summaries}
 
 Comprehensive Summary:"""
         
         try:
-            response = self.client.chat.completions.create(
+            response = await self._complete(
+                client,
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=1000,
@@ -251,25 +717,17 @@ Comprehensive Summary:"""
         model_used: str
     ) -> bool:
         """Store summary in PostgreSQL."""
-        conn = _get_db_connection()
+        conn = get_db_connection()
         if not conn:
             logger.warning("PostgreSQL connection not available")
             return False
         
         try:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                # Upsert: Update if exists, insert if new
+            # Upsert: Update if exists, insert if new (prepared once per pooled connection)
+            prepare_statement(conn, "upsert_summary", _UPSERT_SUMMARY_SQL)
+            with conn.cursor() as cur:
                 cur.execute(
-                    """INSERT INTO document_summaries 
-                       (collection_name, filename, summary, chunks_processed, llm_calls_made, model_used, created_at, updated_at)
-                       VALUES (%s, %s, %s, %s, %s, %s, NOW(), NOW())
-                       ON CONFLICT (collection_name, filename)
-                       DO UPDATE SET
-                           summary = EXCLUDED.summary,
-                           chunks_processed = EXCLUDED.chunks_processed,
-                           llm_calls_made = EXCLUDED.llm_calls_made,
-                           model_used = EXCLUDED.model_used,
-                           updated_at = NOW()""",
+                    "EXECUTE upsert_summary (%s, %s, %s, %s, %s, %s)",
                     [collection_name, filename, summary, chunks_processed, llm_calls_made, model_used]
                 )
                 conn.commit()
@@ -280,11 +738,11 @@ Comprehensive Summary:"""
             conn.rollback()
             return False
         finally:
-            conn.close()
+            release_db_connection(conn)
     
     def get_summary(self, collection_name: str, filename: str) -> Optional[Dict[str, Any]]:
         """Retrieve stored summary from PostgreSQL."""
-        conn = _get_db_connection()
+        conn = get_db_connection()
         if not conn:
             return None
         
@@ -312,5 +770,5 @@ Comprehensive Summary:"""
             logger.error(f"Error retrieving summary: {e}")
             return None
         finally:
-            conn.close()
+            release_db_connection(conn)
 
@@ -1,14 +1,37 @@
 import os
+import asyncio
+import atexit
+import base64
+import hashlib
 import logging
 import re
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 import httpx
+import numpy as np
 
 from openai import OpenAI
+from psycopg2.extras import execute_values
+
+import openai_fast
+from db import get_db_connection, release_db_connection
+from micro_batcher import MicroBatcher
+from rate_limit import estimate_tokens, openai_limiter, retry_async
 
 logger = logging.getLogger(__name__)
 
 
+# Control characters (except tab/newline/CR) and the U+FFFE/U+FFFF noncharacters become spaces
+_CTRL_TABLE = {c: 0x20 for c in range(32) if c not in (9, 10, 13)}
+_CTRL_TABLE[0xFFFE] = 0x20
+_CTRL_TABLE[0xFFFF] = 0x20
+_WS_RE = re.compile(r'[ \t]+')
+_NL_RE = re.compile(r'[ \t]*\n[ \t]*')
+# A Python str is valid Unicode; the only thing that can't be encoded as UTF-8 is a lone surrogate
+_SURROGATE_RE = re.compile('[\ud800-\udfff]')
+
+
 def clean_text_for_utf8(text: str) -> str:
     """
     Clean text to ensure it's valid UTF-8.
@@ -21,14 +44,13 @@ def clean_text_for_utf8(text: str) -> str:
         except (AttributeError, UnicodeDecodeError):
             return ""
     
-    # First, try to encode/decode to catch any issues
-    try:
-        # This will raise UnicodeEncodeError if there are invalid characters
-        text.encode('utf-8')
+    # ASCII text is always valid UTF-8
+    if text.isascii():
+        return text
+    
+    # Without lone surrogates the text encodes fine; no need to build a bytes copy to check
+    if not _SURROGATE_RE.search(text):
         return text
-    except UnicodeEncodeError:
-        # If encoding fails, we need to clean the text
-        pass
     
     # Remove or replace problematic characters
     # Method 1: Replace surrogates and invalid chars
@@ -41,74 +63,297 @@ def clean_text_for_utf8(text: str) -> str:
     
     # Remove any remaining control characters that might cause issues
     # Keep common whitespace (space, tab, newline, carriage return)
-    cleaned = ''.join(
-        char if (ord(char) >= 32 or char in '\n\r\t') and ord(char) != 0xFFFE and ord(char) != 0xFFFF
-        else ' '
-        for char in cleaned
-    )
+    cleaned = cleaned.translate(_CTRL_TABLE)
     
     # Normalize whitespace (replace multiple spaces with single space, but keep newlines)
-    cleaned = re.sub(r'[ \t]+', ' ', cleaned)  # Multiple spaces/tabs to single space
-    cleaned = re.sub(r'[ \t]*\n[ \t]*', '\n', cleaned)  # Clean up around newlines
+    cleaned = _WS_RE.sub(' ', cleaned)  # Multiple spaces/tabs to single space
+    cleaned = _NL_RE.sub('\n', cleaned)  # Clean up around newlines
     
     return cleaned
 
 
-def embed_texts(texts: List[str], model: Optional[str] = None) -> List[List[float]]:
-    """
-    Embed texts using OpenAI API, automatically batching if needed.
-    Text is automatically cleaned to ensure valid UTF-8 encoding.
-    """
+# Batch size: 600 chunks per request (safely under 300k token limit)
+EMBEDDING_BATCH_SIZE = 600
+# Embedding requests in flight at once for multi-batch inputs
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "8"))
+# Persistent (Postgres) cache of embeddings keyed by sha256(model | text); off by default since
+# it adds a database round-trip in front of every embedding call
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "false").strip().lower() in ("1", "true", "yes")
+
+
+def _require_api_key() -> str:
     api_key = (os.getenv("OPENAI_API_KEY") or "").strip()
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY must be set to embed texts or provide embeddings directly")
+    return api_key
 
-    # Clean all texts to ensure valid UTF-8 before embedding
+
+@lru_cache(maxsize=1)
+def _get_client() -> OpenAI:
+    """
+    Shared sync OpenAI client for embeddings, so connections stay alive across calls.
+    (The sync httpx client is thread-safe, so the batch thread pool shares it too.)
+    """
+    # Create httpx client with explicit settings to avoid proxy-related issues
+    # httpx 0.28.0+ removed proxies argument
+    http_client = httpx.Client(
+        timeout=httpx.Timeout(60.0),
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+    )
+    return OpenAI(api_key=_require_api_key(), http_client=http_client)
+
+
+def _close_client() -> None:
+    if _get_client.cache_info().currsize:
+        _get_client().close()
+        _get_client.cache_clear()
+
+
+atexit.register(_close_client)
+
+
+def _prepare_texts(texts: List[str]) -> List[str]:
+    """Clean all texts to ensure valid UTF-8 before embedding."""
     cleaned_texts = [clean_text_for_utf8(text) for text in texts]
     
     # Log if any texts were modified
     modified_count = sum(1 for orig, cleaned in zip(texts, cleaned_texts) if orig != cleaned)
     if modified_count > 0:
         logger.warning(f"Cleaned {modified_count} out of {len(texts)} texts to ensure valid UTF-8 encoding")
+    return cleaned_texts
 
-    # Create httpx client with explicit settings to avoid proxy-related issues
-    # httpx 0.28.0+ removed proxies argument
-    http_client = httpx.Client(
-        timeout=httpx.Timeout(60.0)
-    )
+
+def _embedding_cache_key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}|{text}".encode("utf-8")).digest()
+
+
+def _cache_lookup(keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+    """Fetch cached embeddings for the given keys ({} on any failure)."""
+    if not EMBEDDING_CACHE_ENABLED or not keys:
+        return {}
+    conn = get_db_connection()
+    if not conn:
+        return {}
     
     try:
-        client = OpenAI(
-            api_key=api_key,
-            http_client=http_client
-        )
-        model_name = model or os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
-
-        # Batch size: 600 chunks per request (safely under 300k token limit)
-        BATCH_SIZE = 600
-        
-        # If texts fit in one batch, process directly
-        if len(cleaned_texts) <= BATCH_SIZE:
-            resp = client.embeddings.create(model=model_name, input=cleaned_texts)
-            return [item.embedding for item in resp.data]
-        
-        # Otherwise, process in batches
-        all_embeddings = []
-        total_batches = (len(cleaned_texts) + BATCH_SIZE - 1) // BATCH_SIZE
+        with conn.cursor() as cur:
+            cur.execute("SELECT key, vec FROM embeddings_cache WHERE key = ANY(%s)", [list(set(keys))])
+            return {bytes(key): np.frombuffer(vec, dtype=np.float32) for key, vec in cur.fetchall()}
+    except Exception as e:
+        logger.debug(f"Embedding cache lookup failed: {e}")
+        return {}
+    finally:
+        release_db_connection(conn)
+
+
+def store_embeddings(model: str, keys: List[bytes], vectors: np.ndarray) -> None:
+    """
+    Persist new embeddings (float32 bytes) so identical text is never embedded twice.
+    For callers with their own embedding loop (e.g. the scrapers), paired with lookup_cached_embeddings.
+    
+    Args:
+        model: Embedding model the vectors came from
+        keys: Cache keys from lookup_cached_embeddings, one per vector
+        vectors: float32 array of shape (len(keys), dim)
+    """
+    if not EMBEDDING_CACHE_ENABLED or not keys:
+        return
+    conn = get_db_connection()
+    if not conn:
+        return
+    
+    try:
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                "INSERT INTO embeddings_cache (key, model, vec) VALUES %s ON CONFLICT (key) DO NOTHING",
+                [(key, model, vec.tobytes()) for key, vec in zip(keys, vectors)],
+                page_size=500
+            )
+            conn.commit()
+    except Exception as e:
+        logger.debug(f"Embedding cache write failed: {e}")
+        conn.rollback()
+    finally:
+        release_db_connection(conn)
+
+
+def lookup_cached_embeddings(model: str, cleaned_texts: List[str]) -> Tuple[List[bytes], Dict[bytes, np.ndarray], List[int]]:
+    """
+    Resolve what we can from the embedding cache.
+    Returns (keys, cached vectors by key, indices still to embed). Duplicate texts share a
+    key, so only the first occurrence of each uncached text is listed for embedding.
+    """
+    keys = [_embedding_cache_key(model, text) for text in cleaned_texts]
+    cached = _cache_lookup(keys)
+    misses = []
+    seen = set()
+    uncached = 0
+    for i, key in enumerate(keys):
+        if key in cached:
+            continue
+        uncached += 1
+        if key not in seen:
+            seen.add(key)
+            misses.append(i)
+    if cached:
+        logger.info(f"Embedding cache: {len(keys) - uncached}/{len(keys)} texts already embedded")
+    if uncached > len(misses):
+        logger.info(f"Skipping {uncached - len(misses)} duplicate texts (each distinct text is embedded once)")
+    return keys, cached, misses
+
+
+def _assemble(
+    keys: List[bytes],
+    cached: Dict[bytes, np.ndarray],
+    misses: List[int],
+    new_vectors: Optional[np.ndarray]
+) -> np.ndarray:
+    """
+    Write cached and freshly embedded vectors into one (n, dim) float32 matrix, in input order.
+    Each new vector is scattered to every position whose text has the same key.
+    """
+    dim = new_vectors.shape[1] if new_vectors is not None else next(iter(cached.values())).shape[0]
+    out = np.empty((len(keys), dim), dtype=np.float32)
+    if cached:
+        for i, key in enumerate(keys):
+            vec = cached.get(key)
+            if vec is not None:
+                out[i] = vec
+    if misses:
+        row_of = {keys[i]: row for row, i in enumerate(misses)}
+        positions = [i for i, key in enumerate(keys) if key in row_of]
+        out[positions] = new_vectors[[row_of[keys[i]] for i in positions]]
+    return out
+
+
+def _decode_embeddings(items) -> np.ndarray:
+    """Stack base64-encoded float32 embeddings from an embeddings response into a matrix."""
+    return np.stack([np.frombuffer(base64.b64decode(item.embedding), dtype=np.float32) for item in items])
+
+
+async def _embed_uncached_async(texts: List[str], model_name: str, max_concurrency: int) -> np.ndarray:
+    total_batches = (len(texts) + EMBEDDING_BATCH_SIZE - 1) // EMBEDDING_BATCH_SIZE
+    sem = asyncio.Semaphore(max_concurrency)
+    # Each batch fills its own slot, so order is preserved
+    parts: List[Optional[np.ndarray]] = [None] * total_batches
+    
+    async def _one(start: int) -> None:
+        batch = texts[start:start + EMBEDDING_BATCH_SIZE]
+        estimated_tokens = estimate_tokens(batch)
         
-        for i in range(0, len(cleaned_texts), BATCH_SIZE):
-            batch = cleaned_texts[i:i + BATCH_SIZE]
-            batch_num = (i // BATCH_SIZE) + 1
-            
-            resp = client.embeddings.create(model=model_name, input=batch)
-            batch_embeddings = [item.embedding for item in resp.data]
-            all_embeddings.extend(batch_embeddings)
-            
-            if total_batches > 1:
-                logger.info(f"Embedded batch {batch_num}/{total_batches} ({len(batch)} chunks)")
+        async def attempt():
+            await openai_limiter.acquire(estimated_tokens)
+            # Direct aiohttp POST (no SDK/httpx overhead) on a per-loop pooled session
+            return await openai_fast.embeddings_create(model=model_name, input=batch)
         
-        return all_embeddings
-    finally:
-        # Clean up the http client
-        http_client.close()
+        async with sem:
+            resp = await retry_async(attempt, openai_fast.RETRYABLE_ERRORS)
+        parts[start // EMBEDDING_BATCH_SIZE] = resp.embeddings
+        if total_batches > 1:
+            logger.info("Embedded batch %d/%d (%d chunks)", start // EMBEDDING_BATCH_SIZE + 1, total_batches, len(batch))
+    
+    await asyncio.gather(*[_one(i) for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)])
+    return parts[0] if total_batches == 1 else np.concatenate(parts)
+
+
+def _embed_uncached(texts: List[str], model_name: str) -> np.ndarray:
+    client = _get_client()
+    
+    # Vectors come back base64-encoded float32, decoded straight into numpy (no Python float lists)
+    # If texts fit in one batch, process directly
+    if len(texts) <= EMBEDDING_BATCH_SIZE:
+        openai_limiter.acquire_sync(estimate_tokens(texts))
+        resp = client.embeddings.create(model=model_name, input=texts, encoding_format="base64")
+        return _decode_embeddings(resp.data)
+    
+    # Otherwise, process batches concurrently, each filling its own slot
+    total_batches = (len(texts) + EMBEDDING_BATCH_SIZE - 1) // EMBEDDING_BATCH_SIZE
+    parts: List[Optional[np.ndarray]] = [None] * total_batches
+    
+    def _one(start: int) -> None:
+        batch = texts[start:start + EMBEDDING_BATCH_SIZE]
+        openai_limiter.acquire_sync(estimate_tokens(batch))
+        resp = client.embeddings.create(model=model_name, input=batch, encoding_format="base64")
+        parts[start // EMBEDDING_BATCH_SIZE] = _decode_embeddings(resp.data)
+        logger.info("Embedded batch %d/%d (%d chunks)", start // EMBEDDING_BATCH_SIZE + 1, total_batches, len(batch))
+    
+    with ThreadPoolExecutor(max_workers=min(EMBEDDING_MAX_CONCURRENCY, total_batches)) as executor:
+        # list() re-raises the first batch error, if any
+        list(executor.map(_one, range(0, len(texts), EMBEDDING_BATCH_SIZE)))
+    
+    return np.concatenate(parts)
+
+
+def _prepare_and_split(
+    model_name: str,
+    texts: List[str]
+) -> Tuple[List[str], List[bytes], Dict[bytes, np.ndarray], List[int]]:
+    """_prepare_texts followed by lookup_cached_embeddings (one worker-thread hop for embed_texts_async)."""
+    cleaned_texts = _prepare_texts(texts)
+    return (cleaned_texts, *lookup_cached_embeddings(model_name, cleaned_texts))
+
+
+async def embed_texts_async(
+    texts: List[str],
+    model: Optional[str] = None,
+    max_concurrency: int = EMBEDDING_MAX_CONCURRENCY
+) -> np.ndarray:
+    """
+    Async version of embed_texts: batches are sent concurrently (at most
+    max_concurrency in flight). Returns a float32 array of shape (len(texts), dim).
+    """
+    _require_api_key()
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    
+    model_name = model or os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    # UTF-8 cleaning is pure CPU over every text, so it runs in the same worker thread as the cache lookup
+    cleaned_texts, keys, cached, misses = await asyncio.to_thread(_prepare_and_split, model_name, texts)
+    new_vectors = None
+    if misses:
+        new_vectors = await _embed_uncached_async([cleaned_texts[i] for i in misses], model_name, max_concurrency)
+        await asyncio.to_thread(store_embeddings, model_name, [keys[i] for i in misses], new_vectors)
+    return _assemble(keys, cached, misses, new_vectors)
+
+
+def embed_texts(texts: List[str], model: Optional[str] = None) -> np.ndarray:
+    """
+    Embed texts using OpenAI API, automatically batching if needed.
+    Text is automatically cleaned to ensure valid UTF-8 encoding.
+    
+    Multiple batches are sent concurrently from a small thread pool. (This stays
+    thread-based rather than wrapping embed_texts_async in asyncio.run, since it is
+    also called from code that is already inside an event loop.)
+    Texts embedded before (same model and content) come from the embeddings_cache table.
+    
+    Returns:
+        float32 array of shape (len(texts), dim); ChromaDB accepts it as-is
+    """
+    _require_api_key()
+
+    # Clean all texts to ensure valid UTF-8 before embedding
+    cleaned_texts = _prepare_texts(texts)
+    if not cleaned_texts:
+        return np.empty((0, 0), dtype=np.float32)
+
+    model_name = model or os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    keys, cached, misses = lookup_cached_embeddings(model_name, cleaned_texts)
+    new_vectors = None
+    if misses:
+        new_vectors = _embed_uncached([cleaned_texts[i] for i in misses], model_name)
+        store_embeddings(model_name, [keys[i] for i in misses], new_vectors)
+    return _assemble(keys, cached, misses, new_vectors)
+
+
+def _embed_batch(model: Optional[str], texts: List[str]) -> List[np.ndarray]:
+    return list(embed_texts(texts, model=model))
+
 
+# Coalesces concurrent single-query embeddings (one request per model per flush)
+embedding_batcher = MicroBatcher(
+    _embed_batch,
+    max_batch=int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32")),
+    max_wait=float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "10")) / 1000.0,
+    name="embedding",
+)
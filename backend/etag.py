@@ -0,0 +1,90 @@
+"""
+ETag / conditional GET middleware
+
+For whitelisted GET routes, tags 200 responses with an ETag (blake2b of the body)
+and answers a matching If-None-Match with an empty 304, so clients polling
+unchanged data skip the payload. Because the tag is derived from the body, any
+change to the underlying data (including writes that bypass this backend, such as
+RAG settings saved directly by the frontend) produces a new tag.
+"""
+import hashlib
+import re
+from typing import List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Headers describing the body, which a 304 must not carry
+_BODY_HEADERS = {b"content-length", b"content-type", b"content-encoding"}
+
+
+def _etag(body: bytes) -> bytes:
+    return b'"' + hashlib.blake2b(body, digest_size=16).hexdigest().encode("ascii") + b'"'
+
+
+def _if_none_match(headers: List[Tuple[bytes, bytes]]) -> Optional[bytes]:
+    for key, value in headers:
+        if key == b"if-none-match":
+            return value
+    return None
+
+
+def _matches(if_none_match: bytes, etag: bytes) -> bool:
+    for candidate in if_none_match.split(b","):
+        candidate = candidate.strip()
+        if candidate.startswith(b"W/"):
+            candidate = candidate[2:]
+        if candidate == b"*" or candidate == etag:
+            return True
+    return False
+
+
+class ETagMiddleware:
+    """
+    ASGI middleware adding ETag/If-None-Match handling to GET requests whose path
+    fully matches path_pattern. Other requests pass straight through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, path_pattern: str):
+        self.app = app
+        self.path_re = re.compile(path_pattern)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD") or not self.path_re.fullmatch(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+
+        async def buffered_send(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            await self._respond(scope, start, b"".join(chunks), send)
+
+        await self.app(scope, receive, buffered_send)
+
+    async def _respond(self, scope: Scope, start: Message, body: bytes, send: Send) -> None:
+        if start["status"] != 200:
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        etag = _etag(body)
+        if_none_match = _if_none_match(scope["headers"])
+        if if_none_match is not None and _matches(if_none_match, etag):
+            headers = [(k, v) for k, v in start["headers"] if k.lower() not in _BODY_HEADERS]
+            headers.append((b"etag", etag))
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        await send({**start, "headers": [*start["headers"], (b"etag", etag)]})
+        await send({"type": "http.response.body", "body": body})
@@ -5,15 +5,25 @@ Simplified GitHub repository scraping that extracts code and documentation,
 chunks them with context, and stores in ChromaDB (similar to web scraping).
 """
 import os
+import io
+import asyncio
 import logging
 import subprocess
 import shutil
+import tarfile
 import tempfile
 import time
-from typing import List, Dict, Any, Optional
+import fnmatch
+import hashlib
+import mmap
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Iterator, List, Dict, Any, Optional, Tuple
 from pathlib import Path
+from urllib.parse import urlparse
 import re
 
+import httpx
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -22,31 +32,318 @@ load_dotenv(dotenv_path=_ENV_PATH if _ENV_PATH.exists() else None)
 
 logger = logging.getLogger(__name__)
 
+# Tree-sitter gives syntax-aware chunk boundaries for many languages; without it
+# chunk_code_with_context falls back to the regex / line splitters
+try:
+    from tree_sitter_languages import get_parser as _get_ts_parser
+    TREE_SITTER_AVAILABLE = True
+except ImportError:
+    TREE_SITTER_AVAILABLE = False
+
 # Code file extensions to process
-CODE_EXTENSIONS = {
+CODE_EXTENSIONS = frozenset({
     '.py', '.js', '.ts', '.jsx', '.tsx', '.java', '.cpp', '.c', '.h', '.hpp',
     '.go', '.rs', '.rb', '.php', '.swift', '.kt', '.scala', '.clj', '.sh',
     '.sql', '.r', '.m', '.mm', '.dart', '.lua', '.pl', '.pm', '.hs', '.elm'
-}
+})
 
 # Documentation file extensions
-DOC_EXTENSIONS = {
+DOC_EXTENSIONS = frozenset({
     '.md', '.txt', '.rst', '.adoc', '.org', '.wiki'
+})
+
+# Generated / bundled files (minified assets, protobuf and codegen output) are noise for retrieval
+GENERATED_SUFFIXES = (
+    '.min.js', '.min.css', '.bundle.js', '.bundle.css', '_pb2.py', '_pb2_grpc.py',
+    '.pb.go', '.g.dart', '.freezed.dart'
+)
+GENERATED_SUBSTRINGS = ('.generated.', '.auto.')
+
+# Extension -> (file type, language), so classifying a file is one lookup
+EXT_INFO = {
+    **{ext: ('code', ext[1:]) for ext in CODE_EXTENSIONS},
+    **{ext: ('doc', 'markdown' if ext == '.md' else 'text') for ext in DOC_EXTENSIONS},
 }
 
 # Directories to exclude
-EXCLUDE_DIRS = {
+EXCLUDE_DIRS = frozenset({
     'node_modules', '.git', 'venv', 'env', '__pycache__', '.pytest_cache',
     'build', 'dist', '.next', '.nuxt', 'target', 'bin', 'obj', '.idea',
     '.vscode', '.vs', 'coverage', '.coverage', 'htmlcov', '.mypy_cache',
     '.tox', '.cache', 'vendor', 'bower_components', '.gradle', '.mvn'
-}
+})
 
 # Files to exclude
-EXCLUDE_FILES = {
+EXCLUDE_FILES = frozenset({
     'package-lock.json', 'yarn.lock', 'poetry.lock', 'Pipfile.lock',
     'go.sum', 'composer.lock', '.DS_Store', 'Thumbs.db'
-}
+})
+
+# Binary / minified file detection: files with a NUL byte or mostly undecodable bytes in
+# the first SNIFF_BYTES, or a first line longer than MINIFIED_LINE_BYTES, are skipped
+SNIFF_BYTES = 4096
+MAX_UNDECODABLE_FRACTION = 0.3
+MINIFIED_LINE_BYTES = 10 * 1024
+
+# Cloned files at least this large are decoded from an mmap instead of read into a bytes buffer
+MMAP_MIN_BYTES = 16 * 1024
+
+# Threads reading files concurrently when scanning a cloned repository
+FILE_READ_WORKERS = int(os.getenv("GITHUB_FILE_READ_WORKERS", "32"))
+
+# Embedding sub-batches: bounded by a rough token count (len // 4) and item count,
+# with up to EMBED_CONCURRENCY batches in flight
+EMBED_BATCH_MAX_TOKENS = int(os.getenv("GITHUB_EMBED_BATCH_MAX_TOKENS", "200000"))
+EMBED_BATCH_MAX_ITEMS = int(os.getenv("GITHUB_EMBED_BATCH_MAX_ITEMS", "512"))
+EMBED_CONCURRENCY = int(os.getenv("GITHUB_EMBED_CONCURRENCY", "8"))
+
+# Chunks per ChromaDB upsert call
+UPSERT_BATCH_SIZE = int(os.getenv("GITHUB_UPSERT_BATCH_SIZE", "1000"))
+
+
+def _parse_github_repo(repo_url: str) -> Optional[Tuple[str, str]]:
+    """Return (owner, repo) for a github.com URL, or None for other hosts."""
+    parsed = urlparse(repo_url)
+    if parsed.hostname not in ('github.com', 'www.github.com'):
+        return None
+    parts = [p for p in parsed.path.split('/') if p]
+    if len(parts) < 2:
+        return None
+    owner, repo = parts[0], parts[1]
+    if repo.endswith('.git'):
+        repo = repo[:-4]
+    return owner, repo
+
+
+def _is_excluded_path(relative_path: str) -> bool:
+    """Whether any directory on the path, or the file itself, is excluded from scanning."""
+    *dirs, filename = relative_path.split('/')
+    if any(d in EXCLUDE_DIRS or d.startswith('.') for d in dirs):
+        return True
+    return filename in EXCLUDE_FILES or filename.startswith('.')
+
+
+@lru_cache(maxsize=128)
+def _compile_patterns(patterns: Tuple[str, ...]) -> Optional["re.Pattern"]:
+    """
+    Convert include/exclude glob patterns (e.g. "*.py", "tests/*") to one regex (None if no patterns).
+    Cached, so scrapes that reuse the same patterns don't recompile them.
+    """
+    if not patterns:
+        return None
+    return re.compile('|'.join(fnmatch.translate(pattern) for pattern in patterns))
+
+
+def _classify_file(
+    relative_path: str,
+    include_regex: Optional["re.Pattern"],
+    exclude_regex: Optional["re.Pattern"]
+) -> Optional[Tuple[str, str]]:
+    """
+    Apply the path filters to a repository file.
+    
+    Returns:
+        (file_type, language) for files to process, or None to skip the file
+    """
+    # Skip generated files by name before anything else
+    filename = relative_path.rsplit('/', 1)[-1].lower()
+    if filename.endswith(GENERATED_SUFFIXES) or any(s in filename for s in GENERATED_SUBSTRINGS):
+        return None
+    
+    # Check exclude patterns
+    if exclude_regex and exclude_regex.search(relative_path):
+        return None
+    
+    # Check include patterns (if provided)
+    if include_regex and not include_regex.search(relative_path):
+        return None
+    
+    # Check file extension (None for files we don't recognize)
+    return EXT_INFO.get(os.path.splitext(relative_path)[1].lower())
+
+
+def _remove_dir(path: str) -> None:
+    """Remove a directory tree, including read-only files (git marks pack files read-only)."""
+    if os.name == 'posix':
+        # One rm process unlinks the tree in C; read-only files in a writable directory need no chmod on POSIX
+        result = subprocess.run(['rm', '-rf', '--', path], capture_output=True, text=True, check=False)
+        if result.returncode == 0:
+            return
+        logger.warning(f"rm -rf {path} failed ({result.stderr.strip()}), falling back to shutil.rmtree")
+    
+    def handle_remove_readonly(func, path, exc):
+        try:
+            if os.path.exists(path):
+                os.chmod(path, 0o777)
+                func(path)
+        except PermissionError:
+            logger.warning(f"Could not remove {path} - file in use, skipping")
+    shutil.rmtree(path, onerror=handle_remove_readonly)
+
+
+def _looks_binary(prefix: bytes) -> bool:
+    """True if a file's first bytes contain a NUL byte or are mostly invalid UTF-8."""
+    if b'\x00' in prefix:
+        return True
+    if prefix and not prefix.isascii():
+        # Count replacement characters from invalid UTF-8 (a multi-byte char cut at the end costs at most one)
+        undecodable = prefix.decode('utf-8', 'replace').count('\ufffd')
+        return undecodable > len(prefix) * MAX_UNDECODABLE_FRACTION
+    return False
+
+
+def _decode_text(data, relative_path: str) -> Optional[str]:
+    """Decode a file's bytes (bytes or any buffer, e.g. an mmap) as UTF-8, or None if it looks minified."""
+    if len(data) > MINIFIED_LINE_BYTES and data.find(b'\n', 0, MINIFIED_LINE_BYTES) == -1:
+        logger.debug(f"Skipping minified file: {relative_path}")
+        return None
+    return str(data, 'utf-8', 'ignore')
+
+
+def _read_text(f, relative_path: str) -> Optional[str]:
+    """
+    Read a file object as UTF-8 text, sniffing its first bytes first so binary files aren't read in full.
+    
+    Returns:
+        The decoded text, or None for binary or minified files
+    """
+    prefix = f.read(SNIFF_BYTES)
+    if _looks_binary(prefix):
+        logger.debug(f"Skipping binary file: {relative_path}")
+        return None
+    return _decode_text(prefix + f.read(), relative_path)
+
+
+def _read_text_mmap(f, relative_path: str) -> Optional[str]:
+    """Like _read_text, but decodes straight from a read-only memory map of the file (no bytes copy)."""
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if _looks_binary(mm[:SNIFF_BYTES]):
+            logger.debug(f"Skipping binary file: {relative_path}")
+            return None
+        return _decode_text(mm, relative_path)
+
+
+class TarballUnavailableError(RuntimeError):
+    """Raised when a repository can't be streamed as a GitHub tarball (not a GitHub URL, HTTP error, or connection failure)."""
+
+
+class _StreamReader(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks (lets tarfile read an HTTP stream)."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def iter_tarball_files(
+    repo_url: str,
+    include_patterns: Optional[List[str]] = None,
+    exclude_patterns: Optional[List[str]] = None,
+    max_file_size_kb: int = 100
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream a GitHub repository's default branch as a tarball and yield the files to process.
+    
+    Files are read straight out of the tar stream (nothing is written to disk, no git
+    process or .git directory), and filters are applied to the tar headers so skipped
+    files are never decompressed into memory. Set GITHUB_TOKEN for private repositories.
+    
+    Yields:
+        Dictionaries with 'path', 'content', 'type' (code/doc), 'language', 'size_kb'
+        (same shape as get_repo_files)
+    
+    Raises:
+        TarballUnavailableError: before yielding anything, if the tarball can't be fetched
+    """
+    parsed = _parse_github_repo(repo_url)
+    if parsed is None:
+        raise TarballUnavailableError(f"Not a GitHub repository URL: {repo_url}")
+    owner, repo = parsed
+    
+    token = (os.getenv("GITHUB_TOKEN") or "").strip()
+    if token:
+        # The API tarball endpoint accepts tokens and redirects to codeload
+        url = f"https://api.github.com/repos/{owner}/{repo}/tarball"
+        headers = {"Authorization": f"token {token}"}
+    else:
+        url = f"https://codeload.github.com/{owner}/{repo}/tar.gz/HEAD"
+        headers = {}
+    
+    include_regex = _compile_patterns(tuple(include_patterns or ()))
+    exclude_regex = _compile_patterns(tuple(exclude_patterns or ()))
+    max_bytes = max_file_size_kb * 1024
+    found = 0
+    try:
+        with httpx.stream("GET", url, headers=headers, follow_redirects=True, timeout=httpx.Timeout(60.0)) as resp:
+            if not resp.is_success:
+                # 404 (no such repo), 401/403 (bad token, rate limit), 429, 5xx: let git clone try instead
+                raise TarballUnavailableError(f"Tarball not available for {owner}/{repo} (HTTP {resp.status_code})")
+            
+            with tarfile.open(fileobj=_StreamReader(resp.iter_raw()), mode='r|gz') as tar:
+                for member in tar:
+                    # Only regular files (no symlinks/devices); names are "<owner>-<repo>-<sha>/<path>"
+                    if not member.isfile() or '/' not in member.name:
+                        continue
+                    relative_path = member.name.split('/', 1)[1]
+                    if not relative_path or _is_excluded_path(relative_path):
+                        continue
+                    info = _classify_file(relative_path, include_regex, exclude_regex)
+                    if info is None:
+                        continue
+                    file_type, language = info
+                    
+                    # Check file size
+                    file_size_kb = member.size / 1024
+                    if member.size > max_bytes:
+                        logger.debug(f"Skipping large file: {relative_path} ({file_size_kb:.1f}KB)")
+                        continue
+                    
+                    with tar.extractfile(member) as f:
+                        content = _read_text(f, relative_path)
+                    if content is None:
+                        continue
+                    found += 1
+                    yield {
+                        'path': relative_path,
+                        'content': content,
+                        'type': file_type,
+                        'language': language,
+                        'size_kb': file_size_kb
+                    }
+    except httpx.TransportError as e:
+        # Connection problems only fall back to git clone while nothing has been yielded yet
+        if found:
+            raise
+        raise TarballUnavailableError(f"Tarball download failed for {owner}/{repo}: {e}") from e
+    
+    logger.info(f"   Streamed repository tarball: found {found} files to process")
+
+
+def _sparse_checkout_patterns() -> List[str]:
+    """Non-cone sparse-checkout patterns for every processed extension (both cases; git matches case-sensitively)."""
+    patterns = []
+    for ext in sorted(CODE_EXTENSIONS | DOC_EXTENSIONS):
+        patterns.append(f'*{ext}')
+        if ext.upper() != ext:
+            patterns.append(f'*{ext.upper()}')
+    # Never check out excluded or hidden directories
+    patterns.extend(f'!**/{d}/**' for d in sorted(EXCLUDE_DIRS))
+    patterns.append('!**/.*/**')
+    return patterns
 
 
 def clone_repo(repo_url: str, target_dir: str) -> str:
@@ -70,32 +367,65 @@ def clone_repo(repo_url: str, target_dir: str) -> str:
     if os.path.exists(target_dir):
         logger.info(f"Removing existing directory: {target_dir}")
         try:
-            def handle_remove_readonly(func, path, exc):
-                try:
-                    if os.path.exists(path):
-                        os.chmod(path, 0o777)
-                        func(path)
-                except PermissionError:
-                    logger.warning(f"Could not remove {path} - file in use, skipping")
-                    pass
-            shutil.rmtree(target_dir, onerror=handle_remove_readonly)
+            _remove_dir(target_dir)
         except Exception as e:
             logger.warning(f"Could not fully remove {target_dir}: {e}. Proceeding anyway...")
     
-    # Clone repository (shallow clone for speed)
+    # Shallow, blobless clone: only the tree is fetched up front, and git downloads file
+    # contents on demand for the paths the sparse checkout below selects
     logger.info(f"Running git clone from {repo_url}")
     try:
         subprocess.run(
-            ['git', 'clone', '--depth', '1', repo_url, target_dir],
+            ['git', 'clone', '--depth', '1', '--filter=blob:none', '--sparse', repo_url, target_dir],
             check=True,
             capture_output=True,
             text=True
         )
-        logger.info("Repository cloned successfully")
-        return target_dir
     except subprocess.CalledProcessError as e:
         logger.error(f"Failed to clone repository: {e.stderr}")
         raise
+    
+    # Check out only files with extensions we process, so other blobs are never downloaded
+    try:
+        subprocess.run(
+            ['git', '-C', target_dir, 'sparse-checkout', 'set', '--no-cone', *_sparse_checkout_patterns()],
+            check=True,
+            capture_output=True,
+            text=True
+        )
+    except subprocess.CalledProcessError as e:
+        logger.warning(f"Sparse checkout failed ({e.stderr.strip()}), checking out the full tree")
+        subprocess.run(
+            ['git', '-C', target_dir, 'sparse-checkout', 'disable'],
+            check=True,
+            capture_output=True,
+            text=True
+        )
+    logger.info("Repository cloned successfully")
+    return target_dir
+
+
+def _read_repo_file(candidate: Tuple[str, str, str, str, float]) -> Optional[Dict[str, Any]]:
+    """Read one file found by get_repo_files (None if it can't be read)."""
+    file_path, relative_path, file_type, language, file_size_kb = candidate
+    try:
+        with open(file_path, 'rb') as f:
+            if file_size_kb * 1024 >= MMAP_MIN_BYTES:
+                content = _read_text_mmap(f, relative_path)
+            else:
+                content = _read_text(f, relative_path)
+    except Exception as e:
+        logger.warning(f"Could not read {relative_path}: {e}")
+        return None
+    if content is None:
+        return None
+    return {
+        'path': relative_path,
+        'content': content,
+        'type': file_type,
+        'language': language,
+        'size_kb': file_size_kb
+    }
 
 
 def get_repo_files(repo_path: str, include_patterns: Optional[List[str]] = None, 
@@ -113,81 +443,61 @@ def get_repo_files(repo_path: str, include_patterns: Optional[List[str]] = None,
     Returns:
         List of dictionaries with 'path', 'content', 'type' (code/doc), 'language'
     """
-    repo_path_obj = Path(repo_path)
-    files = []
-    
     # Convert patterns to regex if provided
-    include_regex = None
-    if include_patterns:
-        include_regex = re.compile('|'.join(
-            pattern.replace('*', '.*').replace('.', r'\.') for pattern in include_patterns
-        ))
-    
-    exclude_regex = None
-    if exclude_patterns:
-        exclude_regex = re.compile('|'.join(
-            pattern.replace('*', '.*').replace('.', r'\.') for pattern in exclude_patterns
-        ))
-    
-    for root, dirs, filenames in os.walk(repo_path):
-        # Filter out excluded directories
-        dirs[:] = [d for d in dirs if d not in EXCLUDE_DIRS and not d.startswith('.')]
+    include_regex = _compile_patterns(tuple(include_patterns or ()))
+    exclude_regex = _compile_patterns(tuple(exclude_patterns or ()))
+    
+    # First pass: apply all filters (no file contents read yet). os.scandir entries carry
+    # the file type from the directory read and cache stat(), so each file costs one stat at most
+    candidates = []
+    stack = [repo_path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError as e:
+            logger.warning(f"Could not list {current}: {e}")
+            continue
         
-        for filename in filenames:
-            # Skip excluded files
-            if filename in EXCLUDE_FILES or filename.startswith('.'):
+        subdirs = []
+        for entry in entries:
+            name = entry.name
+            if entry.is_dir(follow_symlinks=False):
+                # Filter out excluded directories
+                if name not in EXCLUDE_DIRS and not name.startswith('.'):
+                    subdirs.append(entry.path)
                 continue
-            
-            file_path = Path(root) / filename
-            relative_path = str(file_path.relative_to(repo_path))
-            
-            # Check exclude patterns
-            if exclude_regex and exclude_regex.search(relative_path):
+            if not entry.is_file(follow_symlinks=False):
                 continue
             
-            # Check include patterns (if provided)
-            if include_regex and not include_regex.search(relative_path):
+            # Skip excluded files
+            if name in EXCLUDE_FILES or name.startswith('.'):
                 continue
             
-            # Check file extension
-            ext = file_path.suffix.lower()
-            file_type = None
-            language = None
-            
-            if ext in CODE_EXTENSIONS:
-                file_type = 'code'
-                language = ext[1:]  # Remove the dot
-            elif ext in DOC_EXTENSIONS:
-                file_type = 'doc'
-                language = 'markdown' if ext == '.md' else 'text'
-            else:
-                continue  # Skip files we don't recognize
+            relative_path = os.path.relpath(entry.path, repo_path).replace(os.sep, '/')
+            info = _classify_file(relative_path, include_regex, exclude_regex)
+            if info is None:
+                continue
+            file_type, language = info
             
             # Check file size
             try:
-                file_size_kb = file_path.stat().st_size / 1024
+                file_size_kb = entry.stat(follow_symlinks=False).st_size / 1024
                 if file_size_kb > max_file_size_kb:
                     logger.debug(f"Skipping large file: {relative_path} ({file_size_kb:.1f}KB)")
                     continue
-            except Exception as e:
+            except OSError as e:
                 logger.warning(f"Could not check size of {relative_path}: {e}")
                 continue
             
-            # Read file content
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                
-                files.append({
-                    'path': relative_path,
-                    'content': content,
-                    'type': file_type,
-                    'language': language,
-                    'size_kb': file_size_kb
-                })
-            except Exception as e:
-                logger.warning(f"Could not read {relative_path}: {e}")
-                continue
+            candidates.append((entry.path, relative_path, file_type, language, file_size_kb))
+        # Reversed so directories are visited in name order
+        stack.extend(reversed(subdirs))
+    
+    # Second pass: read the files concurrently (the GIL is released during file reads)
+    with ThreadPoolExecutor(max_workers=FILE_READ_WORKERS) as executor:
+        files = [f for f in executor.map(_read_repo_file, candidates) if f is not None]
     
     logger.info(f"   Scanned repository: found {len(files)} files to process")
     if files:
@@ -199,7 +509,177 @@ def get_repo_files(repo_path: str, include_patterns: Optional[List[str]] = None,
     return files
 
 
-def chunk_code_with_context(content: str, file_path: str, language: str, chunk_size: int = 5000) -> List[Dict[str, str]]:
+def iter_repo_files(
+    repo_url: str,
+    include_patterns: Optional[List[str]] = None,
+    exclude_patterns: Optional[List[str]] = None,
+    max_file_size_kb: int = 100
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield a repository's files to process: streamed from the GitHub tarball when possible,
+    otherwise from a temporary shallow git clone (removed once iteration finishes).
+    """
+    try:
+        yield from iter_tarball_files(repo_url, include_patterns, exclude_patterns, max_file_size_kb)
+        return
+    except TarballUnavailableError as e:
+        logger.info(f"{e}, falling back to git clone")
+    
+    temp_dir = tempfile.mkdtemp(prefix='github_repo_')
+    try:
+        repo_name = repo_url.rstrip('/').split('/')[-1].replace('.git', '')
+        clone_path = clone_repo(repo_url, os.path.join(temp_dir, repo_name))
+        yield from get_repo_files(
+            clone_path,
+            include_patterns=include_patterns,
+            exclude_patterns=exclude_patterns,
+            max_file_size_kb=max_file_size_kb
+        )
+    finally:
+        logger.info(f"Cleaning up temporary directory: {temp_dir}")
+        try:
+            _remove_dir(temp_dir)
+        except Exception as e:
+            logger.warning(f"Cleanup failed: {e}. Directory may remain at {temp_dir}")
+
+
+# Chunk boundaries for code files; every match must contain one of the keywords
+_PY_SPLIT_RE = re.compile(r'(?=^(?:class|def|async def)\s+\w+)', re.MULTILINE)
+_PY_SPLIT_KEYWORDS = ('def', 'class')
+_JS_SPLIT_RE = re.compile(
+    r'(?=^(?:class|function|const\s+\w+\s*=\s*(?:async\s+)?\(|export\s+(?:class|function|const)))',
+    re.MULTILINE
+)
+_JS_SPLIT_KEYWORDS = ('class', 'function', 'const', 'export')
+_JS_LANGUAGES = frozenset({'js', 'ts', 'jsx', 'tsx'})
+_LINE_END_RE = re.compile(r'\n')
+
+
+# Tree-sitter grammar per file extension (language is the extension without the dot)
+_TS_LANGUAGES = {
+    'py': 'python', 'js': 'javascript', 'jsx': 'javascript', 'ts': 'typescript', 'tsx': 'tsx',
+    'java': 'java', 'go': 'go', 'rs': 'rust', 'c': 'c', 'h': 'c', 'cpp': 'cpp', 'hpp': 'cpp',
+    'rb': 'ruby', 'php': 'php', 'kt': 'kotlin', 'scala': 'scala', 'lua': 'lua', 'sh': 'bash',
+}
+
+# Per grammar: (definition nodes that start a chunk, body nodes whose children are searched for
+# nested definitions such as methods, wrapper nodes whose inner definition is not a separate boundary)
+_TS_NODE_TYPES = {
+    'python': (
+        {'function_definition', 'class_definition', 'decorated_definition'},
+        {'block'},
+        {'decorated_definition'},
+    ),
+    'javascript': (
+        {'function_declaration', 'generator_function_declaration', 'class_declaration',
+         'lexical_declaration', 'export_statement', 'method_definition'},
+        {'class_body'},
+        {'export_statement'},
+    ),
+    'typescript': (
+        {'function_declaration', 'generator_function_declaration', 'class_declaration',
+         'abstract_class_declaration', 'interface_declaration', 'type_alias_declaration',
+         'enum_declaration', 'lexical_declaration', 'export_statement', 'method_definition'},
+        {'class_body'},
+        {'export_statement'},
+    ),
+    'java': (
+        {'class_declaration', 'interface_declaration', 'enum_declaration', 'record_declaration',
+         'method_declaration', 'constructor_declaration'},
+        {'class_body', 'interface_body', 'enum_body'},
+        set(),
+    ),
+    'go': ({'function_declaration', 'method_declaration', 'type_declaration'}, set(), set()),
+    'rust': (
+        {'function_item', 'struct_item', 'enum_item', 'impl_item', 'trait_item', 'mod_item'},
+        {'declaration_list'},
+        set(),
+    ),
+    'c': ({'function_definition', 'struct_specifier', 'type_definition'}, set(), set()),
+    'cpp': (
+        {'function_definition', 'class_specifier', 'struct_specifier', 'namespace_definition',
+         'template_declaration'},
+        {'declaration_list', 'field_declaration_list'},
+        {'template_declaration'},
+    ),
+    'ruby': ({'method', 'singleton_method', 'class', 'module'}, {'body_statement'}, set()),
+    'php': (
+        {'function_definition', 'class_declaration', 'interface_declaration', 'trait_declaration',
+         'method_declaration'},
+        {'declaration_list'},
+        set(),
+    ),
+    'kotlin': ({'function_declaration', 'class_declaration', 'object_declaration'}, {'class_body'}, set()),
+    'scala': ({'function_definition', 'class_definition', 'object_definition', 'trait_definition'}, {'template_body'}, set()),
+    'lua': ({'function_definition_statement', 'local_function_definition_statement'}, set(), set()),
+    'bash': ({'function_definition'}, set(), set()),
+}
+_TS_NODE_TYPES['tsx'] = _TS_NODE_TYPES['typescript']
+
+
+@lru_cache(maxsize=None)
+def _ts_parser(grammar: str):
+    """Tree-sitter parser for a grammar (parsers are reusable, so build each once)."""
+    return _get_ts_parser(grammar)
+
+
+def _syntax_boundaries(content: str, language: str) -> Optional[List[int]]:
+    """
+    Start offsets (in characters, ascending) of the definitions in a code file, from its syntax tree.
+    
+    Returns:
+        Boundary offsets, or None if tree-sitter is unavailable or doesn't handle the language
+    """
+    grammar = _TS_LANGUAGES.get(language)
+    if not TREE_SITTER_AVAILABLE or grammar is None:
+        return None
+    definitions, bodies, wrappers = _TS_NODE_TYPES[grammar]
+    
+    source = content.encode('utf-8')
+    try:
+        tree = _ts_parser(grammar).parse(source)
+    except Exception as e:
+        logger.debug(f"Tree-sitter could not parse {language} source: {e}")
+        return None
+    
+    # Depth-first over top-level nodes, descending only into definitions (e.g. class bodies for methods)
+    byte_offsets = []
+    stack = [(node, True) for node in reversed(tree.root_node.named_children)]
+    while stack:
+        node, is_boundary = stack.pop()
+        if node.type not in definitions:
+            continue
+        if is_boundary:
+            byte_offsets.append(node.start_byte)
+        nested = []
+        for child in node.named_children:
+            if child.type in bodies:
+                nested.extend((grandchild, True) for grandchild in child.named_children)
+            elif child.type in definitions:
+                nested.append((child, node.type not in wrappers))
+        stack.extend(reversed(nested))
+    
+    if content.isascii():
+        return byte_offsets
+    # Map UTF-8 byte offsets back to character offsets, decoding each gap once
+    char_offsets = []
+    prev_byte = 0
+    prev_char = 0
+    for byte_offset in byte_offsets:
+        prev_char += len(source[prev_byte:byte_offset].decode('utf-8', errors='ignore'))
+        prev_byte = byte_offset
+        char_offsets.append(prev_char)
+    return char_offsets
+
+
+def chunk_code_with_context(
+    content: str,
+    file_path: str,
+    language: str,
+    out_contents: List[str],
+    out_metadatas: List[Dict[str, Any]],
+    chunk_size: int = 5000
+) -> int:
     """
     Chunk code files with context (file path, language).
     
@@ -207,69 +687,65 @@ def chunk_code_with_context(content: str, file_path: str, language: str, chunk_s
         content: File content
         file_path: Relative file path in repository
         language: Programming language
+        out_contents: List the chunk texts are appended to
+        out_metadatas: List the chunk metadata dicts are appended to (same positions as out_contents)
         chunk_size: Target chunk size in characters
     
     Returns:
-        List of dictionaries with 'content', 'chunk_index', 'metadata'
+        Number of chunks appended
     """
-    chunks = []
+    chunk_index = 0
     
-    # For code files, try to chunk at function/class boundaries
-    if language == 'py':  # Python
+    # For code files, try to chunk at function/class boundaries: from the syntax tree when
+    # tree-sitter is installed, otherwise by regex. A plain substring check skips the regex
+    # for files that can't contain a boundary
+    syntax_boundaries = _syntax_boundaries(content, language)
+    if syntax_boundaries:
+        boundaries = iter(syntax_boundaries)
+    elif language == 'py' and any(kw in content for kw in _PY_SPLIT_KEYWORDS):  # Python
         # Try to split at class/function definitions
-        pattern = r'(?=^(?:class|def|async def)\s+\w+)'
-        parts = re.split(pattern, content, flags=re.MULTILINE)
-    elif language in ['js', 'ts', 'jsx', 'tsx']:  # JavaScript/TypeScript
+        boundaries = (m.start() for m in _PY_SPLIT_RE.finditer(content))
+    elif language in _JS_LANGUAGES and any(kw in content for kw in _JS_SPLIT_KEYWORDS):  # JavaScript/TypeScript
         # Try to split at function/class definitions
-        pattern = r'(?=^(?:class|function|const\s+\w+\s*=\s*(?:async\s+)?\(|export\s+(?:class|function|const)))'
-        parts = re.split(pattern, content, flags=re.MULTILINE)
+        boundaries = (m.start() for m in _JS_SPLIT_RE.finditer(content))
     else:
         # For other languages, just split by lines
-        parts = content.split('\n')
+        boundaries = (m.end() for m in _LINE_END_RE.finditer(content))
     
-    current_chunk = []
-    current_size = 0
+    # Walk the split positions and slice each chunk out of content once: a chunk is
+    # closed at the last boundary before it would grow past chunk_size
+    chunk_starts = [0]
+    last_boundary = 0
+    for pos in boundaries:
+        if pos - chunk_starts[-1] > chunk_size and last_boundary > chunk_starts[-1]:
+            chunk_starts.append(last_boundary)
+        last_boundary = pos
+    if len(content) - chunk_starts[-1] > chunk_size and last_boundary > chunk_starts[-1]:
+        chunk_starts.append(last_boundary)
+    chunk_starts.append(len(content))
     
-    for part in parts:
-        part_size = len(part)
-        
-        # If adding this part would exceed chunk_size, finalize current chunk
-        if current_size + part_size > chunk_size and current_chunk:
-            chunk_content = '\n'.join(current_chunk)
-            if chunk_content.strip():
-                chunks.append({
-                    'content': chunk_content,
-                    'chunk_index': len(chunks),
-                    'metadata': {
-                        'file_path': file_path,
-                        'language': language,
-                        'type': 'code'
-                    }
-                })
-            current_chunk = [part]
-            current_size = part_size
-        else:
-            current_chunk.append(part)
-            current_size += part_size
-    
-    # Add remaining content
-    if current_chunk:
-        chunk_content = '\n'.join(current_chunk)
+    for start, end in zip(chunk_starts, chunk_starts[1:]):
+        chunk_content = content[start:end]
         if chunk_content.strip():
-            chunks.append({
-                'content': chunk_content,
-                'chunk_index': len(chunks),
-                'metadata': {
-                    'file_path': file_path,
-                    'language': language,
-                    'type': 'code'
-                }
+            out_contents.append(chunk_content)
+            out_metadatas.append({
+                'file_path': file_path,
+                'language': language,
+                'type': 'code',
+                'chunk_index': chunk_index
             })
+            chunk_index += 1
     
-    return chunks
+    return chunk_index
 
 
-def chunk_doc_with_context(content: str, file_path: str, chunk_size: int = 5000) -> List[Dict[str, str]]:
+def chunk_doc_with_context(
+    content: str,
+    file_path: str,
+    out_contents: List[str],
+    out_metadatas: List[Dict[str, Any]],
+    chunk_size: int = 5000
+) -> int:
     """
     Chunk documentation files with context (file path).
     Uses similar logic to web_scraper's smart_chunk_markdown.
@@ -277,28 +753,243 @@ def chunk_doc_with_context(content: str, file_path: str, chunk_size: int = 5000)
     Args:
         content: File content
         file_path: Relative file path in repository
+        out_contents: List the chunk texts are appended to
+        out_metadatas: List the chunk metadata dicts are appended to (same positions as out_contents)
         chunk_size: Target chunk size in characters
     
     Returns:
-        List of dictionaries with 'content', 'chunk_index', 'metadata'
+        Number of chunks appended
     """
     from web_scraper import smart_chunk_markdown
     
     # Use the same chunking logic as web scraper
     text_chunks = smart_chunk_markdown(content, chunk_size=chunk_size)
     
-    chunks = []
-    for i, chunk_text in enumerate(text_chunks):
-        chunks.append({
-            'content': chunk_text,
-            'chunk_index': i,
-            'metadata': {
-                'file_path': file_path,
-                'type': 'doc'
-            }
-        })
+    out_contents.extend(text_chunks)
+    out_metadatas.extend(
+        {'file_path': file_path, 'type': 'doc', 'chunk_index': i}
+        for i in range(len(text_chunks))
+    )
+    
+    return len(text_chunks)
+
+
+def _scan_and_chunk(
+    files_iter: Iterator[Dict[str, Any]],
+    include_readme: bool,
+    include_code: bool,
+    chunk_size: int
+) -> Tuple[List[Dict[str, Any]], List[str], List[Dict[str, Any]], int, int]:
+    """
+    Chunk files as they arrive from iter_repo_files, dropping each file's content once chunked.
+    
+    Returns:
+        (processed files without their content, chunk texts, chunk metadatas, code file count, doc file count)
+    """
+    files = []
+    contents = []
+    metadatas = []
+    code_count = 0
+    doc_count = 0
+    for file_data in files_iter:
+        # Filter based on include_readme and include_code
+        if not include_readme and file_data['type'] == 'doc' and 'readme' in file_data['path'].lower():
+            continue
+        if not include_code and file_data['type'] == 'code':
+            continue
+        
+        content = file_data.pop('content')
+        files.append(file_data)
+        if len(files) % 10 == 0 or len(files) == 1:
+            logger.info(f"   Processing file {len(files)}: {file_data['path']} ({file_data['type']}, {file_data.get('size_kb', 0):.1f}KB)")
+        if file_data['type'] == 'code':
+            code_count += 1
+            created = chunk_code_with_context(
+                content,
+                file_data['path'],
+                file_data['language'],
+                contents,
+                metadatas,
+                chunk_size=chunk_size
+            )
+        else:  # doc
+            doc_count += 1
+            created = chunk_doc_with_context(
+                content,
+                file_data['path'],
+                contents,
+                metadatas,
+                chunk_size=chunk_size
+            )
+        if created:
+            logger.info(f"      → Created {created} chunks from {file_data['path']}")
+    return files, contents, metadatas, code_count, doc_count
+
+
+def _pack_embedding_batches(texts: List[str]) -> List[Tuple[int, int]]:
+    """Split texts into consecutive (start, end) ranges within the embedding batch limits."""
+    batches = []
+    start = 0
+    batch_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = len(text) // 4
+        if i > start and (batch_tokens + tokens > EMBED_BATCH_MAX_TOKENS or i - start >= EMBED_BATCH_MAX_ITEMS):
+            batches.append((start, i))
+            start = i
+            batch_tokens = 0
+        batch_tokens += tokens
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def _dedupe_chunks(contents: List[str]) -> Tuple[List[str], List[List[int]]]:
+    """
+    Group chunks with identical (whitespace-trimmed) content so each distinct text is embedded once.
+    
+    Returns:
+        (distinct texts, positions in contents of the chunks sharing each text)
+    """
+    texts = []
+    groups = []
+    seen: Dict[bytes, int] = {}
+    for i, content in enumerate(contents):
+        digest = hashlib.blake2b(content.strip().encode('utf-8'), digest_size=16).digest()
+        unique = seen.get(digest)
+        if unique is None:
+            seen[digest] = len(texts)
+            texts.append(content)
+            groups.append([i])
+        else:
+            groups[unique].append(i)
+    return texts, groups
+
+
+def _chunk_id(repo_url: str, file_path: str, chunk_index: int) -> str:
+    """
+    Deterministic 32-character chunk ID (128-bit blake2b of repo URL, file path and chunk index).
+    Fixed-width keys keep Chroma's id index small; the readable path lives in the metadata.
+    """
+    key = f"{repo_url}|{file_path}|{chunk_index}".encode('utf-8')
+    return hashlib.blake2b(key, digest_size=16).hexdigest()
+
+
+def _chunk_records(
+    contents: List[str],
+    metadatas: List[Dict[str, Any]],
+    positions: List[int],
+    repo_url: str,
+    repo_name: str,
+    uploaded_at: str
+) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+    """
+    Build ChromaDB ids, documents and metadatas for the chunks at the given positions.
+    The chunker's metadata dicts are completed in place rather than copied.
+    """
+    ids = []
+    documents = []
+    records = []
+    
+    for i in positions:
+        metadata = metadatas[i]
+        ids.append(_chunk_id(repo_url, metadata['file_path'], metadata['chunk_index']))
+        documents.append(contents[i])
+        
+        # Add filename field for file tracking (required by collection management interface)
+        metadata['filename'] = metadata['file_path']
+        metadata['repo_url'] = repo_url
+        metadata['repo_name'] = repo_name
+        # Add file_type if not already present
+        if 'file_type' not in metadata:
+            metadata['file_type'] = metadata.get('type', 'unknown')
+        # Add uploaded_at timestamp for consistency with web scraper
+        metadata['uploaded_at'] = uploaded_at
+        records.append(metadata)
+    
+    return ids, documents, records
+
+
+async def _embed_and_store(
+    contents: List[str],
+    metadatas: List[Dict[str, Any]],
+    collection,
+    repo_url: str,
+    repo_name: str
+) -> int:
+    """
+    Embed chunks in concurrent sub-batches and upsert each batch into ChromaDB as soon as it is ready.
+    
+    Duplicate chunks (vendored code, license headers, ...) are embedded once and stored with
+    the shared vector. Embedding (OpenAI) and upserts (ChromaDB) overlap through a small queue,
+    so only a few batches of embeddings are held in memory at any time.
+    
+    Returns:
+        Number of chunks stored
+    """
+    from web_scraper import create_embeddings_batch_with_retry
+    
+    texts, groups = _dedupe_chunks(contents)
+    batches = _pack_embedding_batches(texts)
+    logger.info(f"   Embedding {len(texts)} distinct chunks ({len(contents) - len(texts)} duplicates) in {len(batches)} batches ({EMBED_CONCURRENCY} concurrent)")
+    uploaded_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    queue: "asyncio.Queue[Optional[Tuple[int, int, List[List[float]]]]]" = asyncio.Queue(maxsize=2)
+    semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+    
+    async def embed(start: int, end: int) -> None:
+        async with semaphore:
+            embeddings = await asyncio.to_thread(create_embeddings_batch_with_retry, texts[start:end])
+        if len(embeddings) != end - start:
+            logger.warning(f"Embedding count mismatch: {len(embeddings)} vs {end - start}")
+            # Pad with zero vectors if needed
+            embeddings = list(embeddings)
+            while len(embeddings) < end - start:
+                embeddings.append([0.0] * 1536)
+        await queue.put((start, end, embeddings))
+    
+    async def store() -> int:
+        stored = 0
+        while True:
+            item = await queue.get()
+            if item is None:
+                return stored
+            start, end, embeddings = item
+            # Every chunk sharing a distinct text gets that text's embedding
+            positions = []
+            position_embeddings = []
+            for group, embedding in zip(groups[start:end], embeddings):
+                positions.extend(group)
+                position_embeddings.extend([embedding] * len(group))
+            for offset in range(0, len(positions), UPSERT_BATCH_SIZE):
+                ids, documents, records = _chunk_records(
+                    contents, metadatas, positions[offset:offset + UPSERT_BATCH_SIZE], repo_url, repo_name, uploaded_at
+                )
+                await asyncio.to_thread(
+                    collection.upsert,
+                    ids=ids,
+                    documents=documents,
+                    embeddings=position_embeddings[offset:offset + UPSERT_BATCH_SIZE],
+                    metadatas=records
+                )
+                stored += len(ids)
+            logger.debug("Stored %d/%d chunks", stored, len(contents))
     
-    return chunks
+    async def produce() -> None:
+        await asyncio.gather(*[embed(start, end) for start, end in batches])
+    
+    producer = asyncio.create_task(produce())
+    consumer = asyncio.create_task(store())
+    try:
+        # If either side fails, stop the other instead of waiting on the queue forever
+        await asyncio.wait({producer, consumer}, return_when=asyncio.FIRST_COMPLETED)
+        if consumer.done():
+            consumer.result()
+        await producer
+        await queue.put(None)
+        return await consumer
+    finally:
+        for task in (producer, consumer):
+            if not task.done():
+                task.cancel()
 
 
 async def scrape_github_repo(
@@ -328,7 +1019,6 @@ async def scrape_github_repo(
         Dictionary with success status, statistics, and any errors
     """
     from chroma_client import get_chroma_client
-    from web_scraper import create_embeddings_batch_with_retry
     
     logger.info("=" * 80)
     logger.info(f"🚀 Starting GitHub repository scrape")
@@ -340,35 +1030,19 @@ async def scrape_github_repo(
     logger.info(f"   Include code: {include_code}")
     logger.info("=" * 80)
     
-    temp_dir = None
     try:
-        # Create temporary directory for cloning
-        temp_dir = tempfile.mkdtemp(prefix='github_repo_')
-        repo_name = repo_url.split('/')[-1].replace('.git', '')
-        clone_path = os.path.join(temp_dir, repo_name)
+        repo_name = repo_url.rstrip('/').split('/')[-1].replace('.git', '')
         
-        logger.info(f"📦 Step 1/5: Cloning repository '{repo_name}'...")
-        # Clone repository
-        clone_repo(repo_url, clone_path)
-        logger.info(f"✅ Repository cloned successfully to {clone_path}")
-        
-        # Get files from repository
-        logger.info(f"📂 Step 2/5: Scanning repository for files...")
-        files = get_repo_files(
-            clone_path,
-            include_patterns=include_patterns,
-            exclude_patterns=exclude_patterns,
-            max_file_size_kb=max_file_size_kb
+        # Download, scan and chunk in one streaming pass (in a worker thread: this is blocking I/O)
+        logger.info(f"📦 Step 1/2: Fetching, scanning and chunking repository '{repo_name}'...")
+        files, contents, metadatas, code_count, doc_count = await asyncio.to_thread(
+            _scan_and_chunk,
+            iter_repo_files(repo_url, include_patterns, exclude_patterns, max_file_size_kb),
+            include_readme,
+            include_code,
+            chunk_size
         )
         
-        logger.info(f"   Found {len(files)} files to process")
-        
-        # Filter based on include_readme and include_code
-        if not include_readme:
-            files = [f for f in files if not (f['type'] == 'doc' and 'readme' in f['path'].lower())]
-        if not include_code:
-            files = [f for f in files if f['type'] != 'code']
-        
         if not files:
             logger.error("❌ No files found to process after filtering")
             return {
@@ -376,107 +1050,29 @@ async def scrape_github_repo(
                 "error": "No files found to process"
             }
         
-        code_count = sum(1 for f in files if f['type'] == 'code')
-        doc_count = sum(1 for f in files if f['type'] == 'doc')
         logger.info(f"✅ File scan complete: {code_count} code files, {doc_count} doc files")
+        logger.info(f"✅ Chunking complete: {len(contents)} total chunks created")
         
-        # Process files into chunks
-        logger.info(f"✂️  Step 3/5: Processing files into chunks...")
-        all_chunks = []
-        processed_count = 0
-        for file_data in files:
-            processed_count += 1
-            if processed_count % 10 == 0 or processed_count == 1:
-                logger.info(f"   Processing file {processed_count}/{len(files)}: {file_data['path']} ({file_data['type']}, {file_data.get('size_kb', 0):.1f}KB)")
-            if file_data['type'] == 'code':
-                chunks = chunk_code_with_context(
-                    file_data['content'],
-                    file_data['path'],
-                    file_data['language'],
-                    chunk_size=chunk_size
-                )
-            else:  # doc
-                chunks = chunk_doc_with_context(
-                    file_data['content'],
-                    file_data['path'],
-                    chunk_size=chunk_size
-                )
-            all_chunks.extend(chunks)
-            if chunks:
-                logger.info(f"      → Created {len(chunks)} chunks from {file_data['path']}")
-        
-        logger.info(f"✅ Chunking complete: {len(all_chunks)} total chunks created")
-        
-        if not all_chunks:
+        if not contents:
             logger.error("❌ No chunks created from files")
             return {
                 "success": False,
                 "error": "No chunks created from files"
             }
         
-        # Generate embeddings
-        logger.info(f"🧠 Step 4/5: Generating embeddings for {len(all_chunks)} chunks...")
-        texts = [chunk['content'] for chunk in all_chunks]
-        logger.info(f"   Calling OpenAI API to generate embeddings...")
-        embeddings = create_embeddings_batch_with_retry(texts)
-        logger.info(f"✅ Generated {len(embeddings)} embeddings")
-        
-        if len(embeddings) != len(all_chunks):
-            logger.warning(f"Embedding count mismatch: {len(embeddings)} vs {len(all_chunks)}")
-            # Pad with zero vectors if needed
-            while len(embeddings) < len(all_chunks):
-                embeddings.append([0.0] * 1536)
-        
-        # Prepare data for ChromaDB
-        ids = []
-        documents = []
-        metadatas = []
-        
-        for i, chunk in enumerate(all_chunks):
-            # Create unique ID: repo_name_filepath_chunkindex
-            repo_name_safe = repo_name.replace('/', '_').replace('.', '_')
-            file_path_safe = chunk['metadata']['file_path'].replace('/', '_').replace('.', '_')
-            chunk_id = f"{repo_name_safe}_{file_path_safe}_{chunk['chunk_index']}_{i}"
-            ids.append(chunk_id)
-            documents.append(chunk['content'])
-            
-            # Add metadata
-            metadata = chunk['metadata'].copy()
-            # Add filename field for file tracking (required by collection management interface)
-            metadata['filename'] = chunk['metadata']['file_path']
-            metadata['repo_url'] = repo_url
-            metadata['repo_name'] = repo_name
-            metadata['chunk_index'] = chunk['chunk_index']
-            # Add file_type if not already present
-            if 'file_type' not in metadata:
-                metadata['file_type'] = metadata.get('type', 'unknown')
-            # Add uploaded_at timestamp for consistency with web scraper
-            metadata['uploaded_at'] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-            metadatas.append(metadata)
-        
-        # Store in ChromaDB
-        logger.info(f"💾 Step 5/5: Storing {len(ids)} chunks in ChromaDB collection: {collection_name}")
+        # Embed and store, upserting each embedding batch as soon as it completes
+        logger.info(f"🧠 Step 2/2: Generating embeddings and storing {len(contents)} chunks in ChromaDB collection: {collection_name}")
         chroma_client = get_chroma_client()
-        collection = chroma_client.get_or_create_collection(name=collection_name)
-        logger.info(f"   Upserting chunks to ChromaDB...")
-        collection.upsert(
-            ids=ids,
-            documents=documents,
-            embeddings=embeddings,
-            metadatas=metadatas
-        )
+        collection = await asyncio.to_thread(chroma_client.get_or_create_collection, name=collection_name)
+        chunks_stored = await _embed_and_store(contents, metadatas, collection, repo_url, repo_name)
         logger.info(f"✅ Successfully stored all chunks in ChromaDB")
         
-        # Statistics
-        code_files = sum(1 for f in files if f['type'] == 'code')
-        doc_files = sum(1 for f in files if f['type'] == 'doc')
-        
         logger.info("=" * 80)
         logger.info(f"🎉 Scraping completed successfully!")
         logger.info(f"   Repository: {repo_name}")
-        logger.info(f"   Files scraped: {len(files)} ({code_files} code, {doc_files} docs)")
-        logger.info(f"   Chunks created: {len(all_chunks)}")
-        logger.info(f"   Chunks stored: {len(ids)}")
+        logger.info(f"   Files scraped: {len(files)} ({code_count} code, {doc_count} docs)")
+        logger.info(f"   Chunks created: {len(contents)}")
+        logger.info(f"   Chunks stored: {chunks_stored}")
         logger.info(f"   Collection: {collection_name}")
         logger.info("=" * 80)
         
@@ -485,10 +1081,10 @@ async def scrape_github_repo(
             "repo_url": repo_url,
             "repo_name": repo_name,
             "files_scraped": len(files),
-            "code_files": code_files,
-            "doc_files": doc_files,
-            "chunks_created": len(all_chunks),
-            "chunks_stored": len(ids),
+            "code_files": code_count,
+            "doc_files": doc_count,
+            "chunks_created": len(contents),
+            "chunks_stored": chunks_stored,
             "collection_name": collection_name
         }
         
@@ -500,19 +1096,3 @@ async def scrape_github_repo(
             "success": False,
             "error": str(e)
         }
-    finally:
-        # Cleanup temporary directory
-        if temp_dir and os.path.exists(temp_dir):
-            logger.info(f"Cleaning up temporary directory: {temp_dir}")
-            try:
-                def handle_remove_readonly(func, path, exc):
-                    try:
-                        if os.path.exists(path):
-                            os.chmod(path, 0o777)
-                            func(path)
-                    except PermissionError:
-                        pass
-                shutil.rmtree(temp_dir, onerror=handle_remove_readonly)
-            except Exception as e:
-                logger.warning(f"Cleanup failed: {e}. Directory may remain at {temp_dir}")
-
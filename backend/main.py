@@ -1,23 +1,57 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from chroma_client import get_chroma_client, MissingEnvironmentVariableError
-from rag_config import get_rag_config, upsert_rag_config
+from chroma_client import chroma_env, get_async_chroma_client, get_async_collection, async_query_batcher, MissingEnvironmentVariableError
+from rag_config import get_rag_config, upsert_rag_config, invalidate_rag_config_cache
 import os
+import asyncio
+import json
 import traceback
 import logging
-from typing import List, Optional, Any
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+import numpy as np
 from pydantic import BaseModel
-from embeddings import embed_texts, clean_text_for_utf8
-from chat_service import ChatService
+from embeddings import embed_texts_async, clean_text_for_utf8
+from chat_service import ChatService, invalidate_collection, close_openai_client
+from retrieval_cache import retrieval_cache, answer_cache
+import openai_fast
+import collection_index
+from etag import ETagMiddleware
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-app = FastAPI(title="Lola Backend", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # ChatService instances are stateless after construction (encoder, system prompt),
+    # so keep one per chat model for the app's lifetime instead of building one per request
+    app.state.chat_services = {}
+    # Build the shared async Chroma client up front (tenant/database checks, connection pool)
+    # so the first request doesn't pay for it; if Chroma isn't up yet, the first request retries
+    try:
+        await get_async_chroma_client()
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"⚠️  Chroma not reachable at startup, will connect on first request: {e}")
+    yield
+    app.state.chat_services.clear()
+    # OpenAI clients/sessions are shared across requests; close their connection pools once on shutdown
+    await close_openai_client()
+    await openai_fast.close_session()
+
+
+# orjson serializes responses several times faster than the stdlib encoder (and handles
+# NumPy arrays, e.g. embeddings in Chroma query results, without tolist())
+app = FastAPI(title="Lola Backend", version="0.1.0", lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# ETag / 304 for read-only endpoints the frontend polls (added before CORS so 304s get CORS headers too)
+app.add_middleware(ETagMiddleware, path_pattern=r"/rag/config|/collections(/[^/]+)?|/health/chroma/env")
 
 # CORS middleware to allow frontend to connect
 app.add_middleware(
@@ -32,45 +66,43 @@ app.add_middleware(
 
 
 @app.get("/health/chroma")
-def health_chroma():
+async def health_chroma():
     try:
-        client = get_chroma_client()
-        collections = client.list_collections()
-        return JSONResponse({
+        client = await get_async_chroma_client()
+        collections = await client.list_collections()
+        return {
             "status": "ok",
             "collections_count": len(collections)
-        })
+        }
     except MissingEnvironmentVariableError as e:
-        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
+        return ORJSONResponse({"status": "error", "message": str(e)}, status_code=500)
     except Exception as e:  # noqa: BLE001
-        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
+        return ORJSONResponse({"status": "error", "message": str(e)}, status_code=500)
 
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 
+@lru_cache(maxsize=1)
+def _chroma_env_report() -> Dict[str, Any]:
+    env = chroma_env()
+    return {
+        "mode": "cloud" if env.cloud else "self-hosted",
+        "host": env.host,
+        "port": env.port,
+        "database": env.database,
+        "cloud_api_key_present": bool(env.api_key),
+        "cloud_tenant_present": bool(env.tenant),
+    }
+
+
 @app.get("/health/chroma/env")
-def health_chroma_env():
+async def health_chroma_env():
     """Diagnostics endpoint to verify ChromaDB connection configuration."""
-    chroma_host = (os.getenv("CHROMA_HOST") or "localhost").strip()
-    chroma_port = (os.getenv("CHROMA_PORT") or "8001").strip()
-    database = (os.getenv("CHROMA_DATABASE") or "Lola").strip()
-    
-    api_key = (os.getenv("CHROMA_API_KEY") or "").strip()
-    tenant = (os.getenv("CHROMA_TENANT") or "").strip()
-    
-    mode = "cloud" if (api_key and tenant) else "self-hosted"
-    
-    return JSONResponse({
-        "mode": mode,
-        "host": chroma_host,
-        "port": chroma_port,
-        "database": database,
-        "cloud_api_key_present": bool(api_key),
-        "cloud_tenant_present": bool(tenant),
-    })
+    # Built once: the environment doesn't change after startup, and this is polled as a probe
+    return _chroma_env_report()
 
 
 # ===== Chroma endpoints =====
@@ -81,38 +113,34 @@ class CreateCollectionBody(BaseModel):
 
 
 @app.post("/collections")
-def create_collection(body: CreateCollectionBody):
+async def create_collection(body: CreateCollectionBody):
     try:
-        client = get_chroma_client()
-        col = client.get_or_create_collection(name=body.name, metadata=body.metadata)
+        client = await get_async_chroma_client()
+        col = await client.get_or_create_collection(name=body.name, metadata=body.metadata)
+        # Metadata may have been (re)set; don't serve a stale cached handle or embedding model
+        # (invalidate_collection covers the handle and the chat service's model cache)
+        invalidate_collection(body.name)
+        _collection_embedding_models.pop(body.name, None)
         return {"name": col.name, "metadata": col.metadata}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/collections")
-def list_collections():
+async def list_collections():
     """List all collections in ChromaDB"""
     try:
-        client = get_chroma_client()
-        collections = client.list_collections()
+        client = await get_async_chroma_client()
+        collections = await client.list_collections()
+        # Count all collections concurrently; if a count fails, just return name and metadata
+        counts = await asyncio.gather(*(col.count() for col in collections), return_exceptions=True)
         result = []
-        for col in collections:
-            try:
-                # Get collection count if possible
-                count = col.count() if hasattr(col, 'count') else None
-                result.append({
-                    "name": col.name,
-                    "metadata": col.metadata,
-                    "count": count
-                })
-            except Exception:
-                # If count fails, just return name and metadata
-                result.append({
-                    "name": col.name,
-                    "metadata": col.metadata,
-                    "count": None
-                })
+        for col, count in zip(collections, counts):
+            result.append({
+                "name": col.name,
+                "metadata": col.metadata,
+                "count": None if isinstance(count, BaseException) else count
+            })
         return {"collections": result, "total": len(result)}
     except Exception as e:
         logger.error(f"Error listing collections: {str(e)}")
@@ -121,90 +149,110 @@ def list_collections():
 
 
 @app.get("/collections/{name}")
-def get_collection(name: str):
+async def get_collection(name: str):
     try:
-        client = get_chroma_client()
-        col = client.get_collection(name=name)
-        count = col.count() if hasattr(col, 'count') else None
+        col = await get_async_collection(name)
+        count = await col.count()
         return {"name": col.name, "metadata": col.metadata, "count": count}
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
+# Page size for scanning a collection's metadata when listing its files
+COLLECTION_SCAN_PAGE_SIZE = int(os.getenv("COLLECTION_SCAN_PAGE_SIZE", "10000"))
+
+
 @app.get("/collections/{name}/files")
-def get_collection_files(name: str):
+async def get_collection_files(name: str, background_tasks: BackgroundTasks):
     """
     Get file statistics for a collection.
     Returns count of unique files and records per file based on metadata.
+    
+    Served from the collection_records index when it covers every record in the
+    collection; otherwise the collection is scanned and the index rebuilt in the background.
     """
     try:
-        client = get_chroma_client()
-        col = client.get_collection(name=name)
+        col = await get_async_collection(name)
+        
+        indexed, count = await asyncio.gather(
+            asyncio.to_thread(collection_index.file_stats, name),
+            col.count()
+        )
+        if indexed is not None and indexed[0] == count:
+            total_records, files_list = indexed
+            return {
+                "collection_name": name,
+                "total_files": len(files_list),
+                "total_records": total_records,
+                "files": files_list
+            }
         
-        # Get all records with metadata
-        # ChromaDB's get() method can fetch all records when called without filters
-        # We'll fetch in batches to handle large collections
-        all_ids = []
-        all_metadatas = []
+        # Scan the collection a page at a time, folding each page into file_stats, so memory
+        # stays bounded by the page size and the event loop gets a turn between pages
+        file_stats = {}
+        total_records = 0
+        rows_to_index = []
+        offset = 0
         
-        # ChromaDB doesn't have a direct "get all" - we need to query or use peek
-        # Let's use peek with a large limit, or we can use get() with no where clause
-        try:
-            # Try to get all records - ChromaDB's get() without where should return all
-            result = col.get(include=["metadatas"])
-            all_metadatas = result.get("metadatas", []) or []
-            all_ids = result.get("ids", []) or []
-        except Exception as e:
-            logger.warning(f"Error fetching all records: {str(e)}, trying alternative method")
-            # Fallback: use peek with large limit
+        while True:
             try:
-                result = col.peek(limit=100000)  # Large limit
-                all_metadatas = result.get("metadatas", []) or []
-                all_ids = result.get("ids", []) or []
-            except Exception as peek_error:
-                logger.error(f"Error with peek: {str(peek_error)}")
+                # ids are always returned; only metadatas are needed on top
+                page = await col.get(limit=COLLECTION_SCAN_PAGE_SIZE, offset=offset, include=["metadatas"])
+            except Exception as e:
+                logger.error(f"Error fetching records at offset {offset}: {str(e)}")
                 raise HTTPException(
                     status_code=500,
-                    detail=f"Failed to fetch collection data: {str(peek_error)}"
+                    detail=f"Failed to fetch collection data: {str(e)}"
                 )
-        
-        # Group by filename from metadata
-        file_stats = {}
-        total_records = len(all_ids)
-        
-        for i, metadata in enumerate(all_metadatas):
-            if not metadata:
-                continue
-            
-            filename = metadata.get("filename")
-            if not filename:
-                # Skip records without filename metadata
-                continue
-            
-            if filename not in file_stats:
-                file_stats[filename] = {
-                    "filename": filename,
-                    "file_type": metadata.get("file_type"),
-                    "record_count": 0,
-                    "uploaded_at": metadata.get("uploaded_at"),
-                    "first_chunk_index": metadata.get("chunk_index"),
-                    "last_chunk_index": metadata.get("chunk_index"),
-                }
+            page_ids = page.get("ids", []) or []
+            if not page_ids:
+                break
+            page_metadatas = page.get("metadatas", []) or []
+            offset += len(page_ids)
+            total_records += len(page_ids)
+            if collection_index.COLLECTION_INDEX_ENABLED:
+                rows_to_index.extend(collection_index.index_rows(name, page_ids, page_metadatas))
             
-            file_stats[filename]["record_count"] += 1
+            # Group by filename from metadata
+            for metadata in page_metadatas:
+                if not metadata:
+                    continue
+                
+                filename = metadata.get("filename")
+                if not filename:
+                    # Skip records without filename metadata
+                    continue
+                
+                if filename not in file_stats:
+                    file_stats[filename] = {
+                        "filename": filename,
+                        "file_type": metadata.get("file_type"),
+                        "record_count": 0,
+                        "uploaded_at": metadata.get("uploaded_at"),
+                        "first_chunk_index": metadata.get("chunk_index"),
+                        "last_chunk_index": metadata.get("chunk_index"),
+                    }
+                
+                file_stats[filename]["record_count"] += 1
+                
+                # Track chunk index range
+                chunk_idx = metadata.get("chunk_index")
+                if chunk_idx is not None:
+                    if file_stats[filename]["first_chunk_index"] is None or chunk_idx < file_stats[filename]["first_chunk_index"]:
+                        file_stats[filename]["first_chunk_index"] = chunk_idx
+                    if file_stats[filename]["last_chunk_index"] is None or chunk_idx > file_stats[filename]["last_chunk_index"]:
+                        file_stats[filename]["last_chunk_index"] = chunk_idx
             
-            # Track chunk index range
-            chunk_idx = metadata.get("chunk_index")
-            if chunk_idx is not None:
-                if file_stats[filename]["first_chunk_index"] is None or chunk_idx < file_stats[filename]["first_chunk_index"]:
-                    file_stats[filename]["first_chunk_index"] = chunk_idx
-                if file_stats[filename]["last_chunk_index"] is None or chunk_idx > file_stats[filename]["last_chunk_index"]:
-                    file_stats[filename]["last_chunk_index"] = chunk_idx
+            if len(page_ids) < COLLECTION_SCAN_PAGE_SIZE:
+                break
         
         # Convert to list and sort by filename
         files_list = list(file_stats.values())
         files_list.sort(key=lambda x: x["filename"])
         
+        if collection_index.COLLECTION_INDEX_ENABLED:
+            background_tasks.add_task(collection_index.rebuild, name, rows_to_index)
+        
         return {
             "collection_name": name,
             "total_files": len(files_list),
@@ -219,10 +267,26 @@ def get_collection_files(name: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ChromaDB has a maximum batch size of 1000, so larger upserts are split into batches
+# (embedded batch by batch when the request has documents but no embeddings)
+CHROMADB_BATCH_SIZE = 1000
+# Upsert batches in flight at once per request
+CHROMADB_UPSERT_CONCURRENCY = int(os.getenv("CHROMADB_UPSERT_CONCURRENCY", "4"))
+# Upserts at least this large are prepared (cleaning, metadata coercion) off the event loop
+UPSERT_PREPARE_IN_THREAD_MIN = int(os.getenv("UPSERT_PREPARE_IN_THREAD_MIN", "1000"))
+# Last embedding_model known to be stored in each collection's metadata (by this process)
+_collection_embedding_models: Dict[str, str] = {}
+# Metadata value types ChromaDB accepts as-is. JSON-decoded values are exactly these types, so the
+# set membership check (cheaper than isinstance) settles almost every value; isinstance only runs
+# for the rest, to keep accepting subclasses
+_CHROMA_METADATA_TYPES = (str, int, float, bool, type(None))
+_CHROMA_METADATA_TYPE_SET = frozenset(_CHROMA_METADATA_TYPES)
+
+
 class UpsertBody(BaseModel):
     ids: List[str]
     documents: Optional[List[str]] = None  # if provided and no embeddings, we embed
-    embeddings: Optional[List[List[float]]] = None
+    embeddings: Optional[List[Any]] = None  # vectors; parsed by _embeddings_matrix
     metadatas: Optional[List[dict]] = None
     model: Optional[str] = None  # optional override
 
@@ -282,142 +346,255 @@ def trigger_auto_summarization(collection_name: str, metadatas: List[dict]):
         logger.warning(f"Could not start auto-summarization: {e}")
 
 
-@app.post("/collections/{name}/upsert")
-def upsert(name: str, body: UpsertBody):
+def _embeddings_matrix(embeddings: List[Any], field: str = "embeddings", rows: Optional[int] = None) -> np.ndarray:
+    """
+    Convert JSON-decoded vectors to a float32 matrix in one C-level pass. Vector fields are
+    typed List[Any] so Pydantic doesn't validate and copy every float first; this is the check.
+    If rows is given (the number of ids), the matrix must have exactly that many vectors.
+    """
+    if rows is not None and len(embeddings) != rows:
+        raise HTTPException(status_code=400, detail=f"Length mismatch: {rows} ids but {len(embeddings)} {field}")
     try:
-        logger.info(f"Upsert request for collection: {name}, {len(body.ids)} items")
-        
-        # Validate input lengths
-        ids_count = len(body.ids)
-        if body.documents:
-            docs_count = len(body.documents)
-            if ids_count != docs_count:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Length mismatch: {ids_count} ids but {docs_count} documents"
-                )
-        
-        if body.metadatas:
-            meta_count = len(body.metadatas)
-            if ids_count != meta_count:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Length mismatch: {ids_count} ids but {meta_count} metadatas"
-                )
-        
-        if body.embeddings:
-            emb_count = len(body.embeddings)
-            if ids_count != emb_count:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Length mismatch: {ids_count} ids but {emb_count} embeddings"
-                )
-        
-        client = get_chroma_client()
-        col = client.get_or_create_collection(name=name)
-        logger.info(f"Collection '{name}' retrieved/created successfully")
+        matrix = np.asarray(embeddings, dtype=np.float32)
+    except ValueError as e:
+        if "inhomogeneous" in str(e):
+            raise HTTPException(status_code=400, detail=f"All {field} must have the same dimension")
+        raise HTTPException(status_code=400, detail=f"{field} must be lists of numbers")
+    except TypeError:
+        raise HTTPException(status_code=400, detail=f"{field} must be lists of numbers")
+    if not len(embeddings):
+        return matrix.reshape(0, 0)
+    # null entries come through as NaN
+    if matrix.ndim != 2 or matrix.shape[1] == 0 or np.isnan(matrix).any():
+        raise HTTPException(status_code=400, detail=f"{field} must be lists of numbers")
+    return matrix
+
+
+def _chroma_upsert_error(error: Exception) -> HTTPException:
+    logger.error(f"ChromaDB upsert error: {str(error)}")
+    logger.error(traceback.format_exc())
+    return HTTPException(
+        status_code=500, 
+        detail=f"ChromaDB upsert failed: {str(error)}"
+    )
+
+
+async def _finish_upsert(
+    name: str,
+    col: Any,
+    ids: List[str],
+    metadatas: Optional[List[dict]],
+    embedding_model_used: Optional[str]
+) -> None:
+    """Record the embedding model on the collection (if needed), index the records' files and drop its cached query results."""
+    # Store embedding model in collection metadata if we generated embeddings
+    # (skipped outright once this process has recorded the collection's model)
+    if embedding_model_used and _collection_embedding_models.get(name) != embedding_model_used:
+        current_metadata = col.metadata or {}
+        # Only update if not already set or if it's different
+        if current_metadata.get("embedding_model") != embedding_model_used:
+            updated_metadata = {**current_metadata, "embedding_model": embedding_model_used}
+            await col.modify(metadata=updated_metadata)
+            logger.info(f"Updated collection metadata with embedding_model: {embedding_model_used}")
+            invalidate_collection(name)
+        _collection_embedding_models[name] = embedding_model_used
+    
+    logger.info(f"Upsert successful: {len(ids)} items stored")
+    await asyncio.to_thread(collection_index.record_upsert, name, ids, metadatas)
+    retrieval_cache.invalidate(name)
+    answer_cache.invalidate(name)
 
-        vectors: Optional[List[List[float]]] = body.embeddings
-        embedding_model_used = None
-        
-        # Clean documents to ensure valid UTF-8 (always clean if documents are provided)
-        cleaned_documents = None
-        if body.documents:
-            cleaned_documents = [clean_text_for_utf8(doc) for doc in body.documents]
-        
-        if vectors is None:
-            if not body.documents:
-                raise HTTPException(status_code=400, detail="Provide embeddings or documents to embed")
-            
-            # Determine which embedding model to use
-            embedding_model_used = body.model or os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
-            
-            logger.info(f"Generating embeddings for {len(cleaned_documents)} documents using model: {embedding_model_used}")
-            try:
-                vectors = embed_texts(cleaned_documents, model=embedding_model_used)
-                logger.info(f"Generated {len(vectors)} embeddings")
-            except Exception as embed_error:
-                logger.error(f"Embedding error: {str(embed_error)}")
-                logger.error(traceback.format_exc())
-                raise HTTPException(status_code=500, detail=f"Embedding generation failed: {str(embed_error)}")
-        elif body.model:
-            # If embeddings provided but model specified, store it for consistency
-            embedding_model_used = body.model
-        
-        if len(vectors) != ids_count:
+
+def _prepare_upsert(
+    body: UpsertBody,
+    dedupe: bool
+) -> Tuple[Optional[List[str]], Optional[List[dict]], Optional[np.ndarray], Dict[str, int]]:
+    """
+    CPU-bound upsert preparation: clean documents to valid UTF-8 (always, if documents are
+    provided), coerce metadatas to ChromaDB-compatible types and pack caller-supplied
+    embeddings into one float32 matrix.
+    
+    Returns:
+        (cleaned documents, formatted metadatas, embeddings matrix or None, index of each
+        distinct document's first occurrence - only filled in when dedupe is set)
+    """
+    cleaned_documents = None
+    if body.documents:
+        cleaned_documents = [clean_text_for_utf8(doc) for doc in body.documents]
+    
+    # Ensure metadatas are properly formatted (ChromaDB requires specific types;
+    # values of any other type are converted to strings)
+    formatted_metadatas = None
+    if body.metadatas:
+        formatted_metadatas = [
+            {
+                key: value if type(value) in _CHROMA_METADATA_TYPE_SET or isinstance(value, _CHROMA_METADATA_TYPES) else str(value)
+                for key, value in meta.items()
+            }
+            for meta in body.metadatas
+        ]
+    
+    # Chroma sends float32 vectors base64-encoded; a contiguous float32 matrix converts in one
+    # C-level pass (batch slices are views) instead of one array per row inside the client
+    vectors = _embeddings_matrix(body.embeddings, rows=len(body.ids)) if body.embeddings is not None else None
+    
+    first_seen: Dict[str, int] = {}
+    if dedupe and cleaned_documents:
+        for j, doc in enumerate(cleaned_documents):
+            first_seen.setdefault(doc, j)
+    return cleaned_documents, formatted_metadatas, vectors, first_seen
+
+
+async def _upsert_records(name: str, body: UpsertBody) -> Optional[List[dict]]:
+    """
+    Validate, embed (if needed) and upsert an UpsertBody into a collection.
+    
+    Returns:
+        The ChromaDB-formatted metadatas that were stored (None if none were given)
+    """
+    # Validate input lengths
+    ids_count = len(body.ids)
+    for field, values in (("documents", body.documents), ("metadatas", body.metadatas)):
+        if values and len(values) != ids_count:
             raise HTTPException(
                 status_code=400,
-                detail=f"Length mismatch: {ids_count} ids but {len(vectors)} embeddings"
+                detail=f"Length mismatch: {ids_count} ids but {len(values)} {field}"
             )
-
-        logger.info(f"Calling ChromaDB upsert with {ids_count} items")
+    # Supplied embeddings are used as-is, so even an empty list must match the ids
+    if body.embeddings is not None and len(body.embeddings) != ids_count:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Length mismatch: {ids_count} ids but {len(body.embeddings)} embeddings"
+        )
+    
+    embedding_model_used = None
+    
+    if body.embeddings is None:
+        if not body.documents:
+            raise HTTPException(status_code=400, detail="Provide embeddings or documents to embed")
+        
+        # Determine which embedding model to use
+        embedding_model_used = body.model or os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+        logger.info(f"Generating embeddings for {len(body.documents)} documents using model: {embedding_model_used}")
+    elif body.model:
+        # If embeddings provided but model specified, store it for consistency
+        embedding_model_used = body.model
+    
+    if body.embeddings is not None and not body.metadatas and ids_count <= CHROMADB_BATCH_SIZE:
+        # Fast path for the common programmatic upsert: vectors supplied and no metadatas,
+        # small enough for one Chroma call, so there is nothing to embed, dedupe, coerce or batch
+        vectors = _embeddings_matrix(body.embeddings, rows=len(body.ids))
+        documents = [clean_text_for_utf8(doc) for doc in body.documents] if body.documents else None
+        col = await get_async_collection(name, create=True)
         try:
-            # Ensure metadatas are properly formatted (ChromaDB requires specific types)
-            formatted_metadatas = None
-            if body.metadatas:
-                formatted_metadatas = []
-                for meta in body.metadatas:
-                    # Convert metadata values to ChromaDB-compatible types
-                    formatted_meta = {}
-                    for key, value in meta.items():
-                        # ChromaDB accepts str, int, float, bool, or None
-                        if isinstance(value, (str, int, float, bool)) or value is None:
-                            formatted_meta[key] = value
-                        else:
-                            # Convert other types to string
-                            formatted_meta[key] = str(value)
-                    formatted_metadatas.append(formatted_meta)
+            await col.upsert(ids=body.ids, embeddings=vectors, documents=documents)
+            await _finish_upsert(name, col, body.ids, None, embedding_model_used)
+        except Exception as chroma_error:
+            raise _chroma_upsert_error(chroma_error)
+        return None
+    
+    if ids_count >= UPSERT_PREPARE_IN_THREAD_MIN:
+        # Prepare large requests in a worker thread (overlapping the collection fetch),
+        # so one big ingest doesn't stall the event loop for other requests
+        col, prepared = await asyncio.gather(
+            get_async_collection(name, create=True),
+            asyncio.to_thread(_prepare_upsert, body, body.embeddings is None)
+        )
+    else:
+        prepared = _prepare_upsert(body, body.embeddings is None)
+        col = await get_async_collection(name, create=True)
+    cleaned_documents, formatted_metadatas, vectors, first_seen = prepared
+    logger.info(f"Collection '{name}' retrieved/created successfully")
+
+    logger.info(f"Calling ChromaDB upsert with {ids_count} items")
+    try:
+        # Split into Chroma-sized batches. When we embed, each batch is embedded on its own,
+        # so batches embed concurrently and each is upserted as soon as its vectors arrive
+        total_batches = (ids_count + CHROMADB_BATCH_SIZE - 1) // CHROMADB_BATCH_SIZE
+        if total_batches > 1:
+            logger.info(f"Splitting into {total_batches} batches for ChromaDB upsert")
+        semaphore = asyncio.Semaphore(CHROMADB_UPSERT_CONCURRENCY)
+        
+        if vectors is None:
+            # Each distinct text is embedded once per request, by the batch holding its first
+            # occurrence; batches with repeats wait on that batch's vectors (always an earlier
+            # batch, so this cannot deadlock on the semaphore)
+            if len(first_seen) < ids_count:
+                logger.info(f"Skipping {ids_count - len(first_seen)} duplicate documents (each distinct text is embedded once)")
+            loop = asyncio.get_running_loop()
+            embedded = {i: loop.create_future() for i in range(0, ids_count, CHROMADB_BATCH_SIZE)}
+        
+        async def embed_batch(i: int, batch_documents: List[str]) -> np.ndarray:
+            """Embed the texts first seen in this batch and fill in repeats from earlier batches."""
+            owned = list(dict.fromkeys(doc for j, doc in enumerate(batch_documents, i) if first_seen[doc] == j))
+            try:
+                new_vectors = await embed_texts_async(owned, model=embedding_model_used) if owned else []
+            except Exception as e:
+                # Fail later batches waiting on these vectors too (marked retrieved, so an
+                # unawaited failure isn't logged twice)
+                embedded[i].set_exception(RuntimeError(f"embedding a batch with shared documents failed: {e}"))
+                embedded[i].exception()
+                raise
+            except BaseException:
+                embedded[i].cancel()
+                raise
+            by_text = dict(zip(owned, new_vectors))
+            embedded[i].set_result(by_text)
             
-            # ChromaDB has a maximum batch size of 1000, so batch if needed
-            CHROMADB_BATCH_SIZE = 1000
+            for doc in batch_documents:
+                if doc not in by_text:
+                    source = first_seen[doc]
+                    by_text.update(await embedded[source - source % CHROMADB_BATCH_SIZE])
+            return np.stack([by_text[doc] for doc in batch_documents])
+        
+        async def upsert_batch(i: int) -> None:
+            batch_ids = body.ids[i:i + CHROMADB_BATCH_SIZE]
+            batch_documents = cleaned_documents[i:i + CHROMADB_BATCH_SIZE] if body.documents else None
+            batch_metadatas = formatted_metadatas[i:i + CHROMADB_BATCH_SIZE] if formatted_metadatas else None
+            batch_num = (i // CHROMADB_BATCH_SIZE) + 1
             
-            if ids_count <= CHROMADB_BATCH_SIZE:
-                # Single batch
-                # Use cleaned documents for storage (cleaned_documents is already None if no documents provided)
-                col.upsert(
-                    ids=body.ids, 
-                    embeddings=vectors, 
-                    documents=cleaned_documents,
-                    metadatas=formatted_metadatas
-                )
-            else:
-                # Multiple batches
-                total_batches = (ids_count + CHROMADB_BATCH_SIZE - 1) // CHROMADB_BATCH_SIZE
-                logger.info(f"Splitting into {total_batches} batches for ChromaDB upsert")
-                
-                for i in range(0, ids_count, CHROMADB_BATCH_SIZE):
-                    batch_ids = body.ids[i:i + CHROMADB_BATCH_SIZE]
+            async with semaphore:
+                if vectors is not None:
                     batch_vectors = vectors[i:i + CHROMADB_BATCH_SIZE]
-                    batch_documents = cleaned_documents[i:i + CHROMADB_BATCH_SIZE] if body.documents else None
-                    batch_metadatas = formatted_metadatas[i:i + CHROMADB_BATCH_SIZE] if formatted_metadatas else None
-                    batch_num = (i // CHROMADB_BATCH_SIZE) + 1
-                    
-                    col.upsert(
-                        ids=batch_ids,
-                        embeddings=batch_vectors,
-                        documents=batch_documents,
-                        metadatas=batch_metadatas
-                    )
-                    logger.info(f"Upserted batch {batch_num}/{total_batches} ({len(batch_ids)} items)")
-            
-            # Store embedding model in collection metadata if we generated embeddings
-            if embedding_model_used:
-                current_metadata = col.metadata or {}
-                # Only update if not already set or if it's different
-                if current_metadata.get("embedding_model") != embedding_model_used:
-                    updated_metadata = {**current_metadata, "embedding_model": embedding_model_used}
-                    col.modify(metadata=updated_metadata)
-                    logger.info(f"Updated collection metadata with embedding_model: {embedding_model_used}")
-            
-            logger.info(f"Upsert successful: {ids_count} items stored")
-        except Exception as chroma_error:
-            logger.error(f"ChromaDB upsert error: {str(chroma_error)}")
-            logger.error(traceback.format_exc())
-            raise HTTPException(
-                status_code=500, 
-                detail=f"ChromaDB upsert failed: {str(chroma_error)}"
-            )
+                else:
+                    try:
+                        batch_vectors = await embed_batch(i, batch_documents)
+                    except Exception as embed_error:
+                        logger.error(f"Embedding error: {str(embed_error)}")
+                        logger.error(traceback.format_exc())
+                        raise HTTPException(status_code=500, detail=f"Embedding generation failed: {str(embed_error)}")
+                    if len(batch_vectors) != len(batch_ids):
+                        raise HTTPException(
+                            status_code=400,
+                            detail=f"Length mismatch: {len(batch_ids)} ids but {len(batch_vectors)} embeddings"
+                        )
+                
+                # Use cleaned documents for storage (None if no documents provided)
+                await col.upsert(
+                    ids=batch_ids,
+                    embeddings=batch_vectors,
+                    documents=batch_documents,
+                    metadatas=batch_metadatas
+                )
+            if total_batches > 1:
+                logger.info(f"Upserted batch {batch_num}/{total_batches} ({len(batch_ids)} items)")
+        
+        await asyncio.gather(*(upsert_batch(i) for i in range(0, ids_count, CHROMADB_BATCH_SIZE)))
         
+        await _finish_upsert(name, col, body.ids, formatted_metadatas, embedding_model_used)
+    except HTTPException:
+        raise
+    except Exception as chroma_error:
+        raise _chroma_upsert_error(chroma_error)
+    
+    return formatted_metadatas
+
+
+@app.post("/collections/{name}/upsert")
+async def upsert(name: str, body: UpsertBody):
+    try:
+        logger.info(f"Upsert request for collection: {name}, {len(body.ids)} items")
+        await _upsert_records(name, body)
         return {"status": "ok", "upserted": len(body.ids)}
     except HTTPException:
         raise
@@ -430,148 +607,18 @@ def upsert(name: str, body: UpsertBody):
 
 
 @app.post("/collections/{name}/upsert-and-summarize")
-def upsert_and_summarize(name: str, body: UpsertBody):
+async def upsert_and_summarize(name: str, body: UpsertBody):
     """
     Upsert documents to ChromaDB and automatically trigger summarization.
     This endpoint combines upsert + auto-summarization in one call.
     """
-    # First, do the upsert (reuse the same logic)
     try:
         logger.info(f"Upsert-and-summarize request for collection: {name}, {len(body.ids)} items")
+        formatted_metadatas = await _upsert_records(name, body)
         
-        # Validate input lengths
-        ids_count = len(body.ids)
-        if body.documents:
-            docs_count = len(body.documents)
-            if ids_count != docs_count:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Length mismatch: {ids_count} ids but {docs_count} documents"
-                )
-        
-        if body.metadatas:
-            meta_count = len(body.metadatas)
-            if ids_count != meta_count:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Length mismatch: {ids_count} ids but {meta_count} metadatas"
-                )
-        
-        if body.embeddings:
-            emb_count = len(body.embeddings)
-            if ids_count != emb_count:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Length mismatch: {ids_count} ids but {emb_count} embeddings"
-                )
-        
-        client = get_chroma_client()
-        col = client.get_or_create_collection(name=name)
-        logger.info(f"Collection '{name}' retrieved/created successfully")
-
-        vectors: Optional[List[List[float]]] = body.embeddings
-        embedding_model_used = None
-        
-        # Clean documents to ensure valid UTF-8 (always clean if documents are provided)
-        cleaned_documents = None
-        if body.documents:
-            cleaned_documents = [clean_text_for_utf8(doc) for doc in body.documents]
-        
-        if vectors is None:
-            if not body.documents:
-                raise HTTPException(status_code=400, detail="Provide embeddings or documents to embed")
-            
-            # Determine which embedding model to use
-            embedding_model_used = body.model or os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
-            
-            logger.info(f"Generating embeddings for {len(cleaned_documents)} documents using model: {embedding_model_used}")
-            try:
-                vectors = embed_texts(cleaned_documents, model=embedding_model_used)
-                logger.info(f"Generated {len(vectors)} embeddings")
-            except Exception as embed_error:
-                logger.error(f"Embedding error: {str(embed_error)}")
-                logger.error(traceback.format_exc())
-                raise HTTPException(status_code=500, detail=f"Embedding generation failed: {str(embed_error)}")
-        elif body.model:
-            # If embeddings provided but model specified, store it for consistency
-            embedding_model_used = body.model
-        
-        if len(vectors) != ids_count:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Length mismatch: {ids_count} ids but {len(vectors)} embeddings"
-            )
-
-        logger.info(f"Calling ChromaDB upsert with {ids_count} items")
-        try:
-            # Ensure metadatas are properly formatted (ChromaDB requires specific types)
-            formatted_metadatas = None
-            if body.metadatas:
-                formatted_metadatas = []
-                for meta in body.metadatas:
-                    # Convert metadata values to ChromaDB-compatible types
-                    formatted_meta = {}
-                    for key, value in meta.items():
-                        # ChromaDB accepts str, int, float, bool, or None
-                        if isinstance(value, (str, int, float, bool)) or value is None:
-                            formatted_meta[key] = value
-                        else:
-                            # Convert other types to string
-                            formatted_meta[key] = str(value)
-                    formatted_metadatas.append(formatted_meta)
-            
-            # ChromaDB has a maximum batch size of 1000, so batch if needed
-            CHROMADB_BATCH_SIZE = 1000
-            
-            if ids_count <= CHROMADB_BATCH_SIZE:
-                # Single batch
-                col.upsert(
-                    ids=body.ids, 
-                    embeddings=vectors, 
-                    documents=cleaned_documents,
-                    metadatas=formatted_metadatas
-                )
-            else:
-                # Multiple batches
-                total_batches = (ids_count + CHROMADB_BATCH_SIZE - 1) // CHROMADB_BATCH_SIZE
-                logger.info(f"Splitting into {total_batches} batches for ChromaDB upsert")
-                
-                for i in range(0, ids_count, CHROMADB_BATCH_SIZE):
-                    batch_ids = body.ids[i:i + CHROMADB_BATCH_SIZE]
-                    batch_vectors = vectors[i:i + CHROMADB_BATCH_SIZE]
-                    batch_documents = cleaned_documents[i:i + CHROMADB_BATCH_SIZE] if body.documents else None
-                    batch_metadatas = formatted_metadatas[i:i + CHROMADB_BATCH_SIZE] if formatted_metadatas else None
-                    batch_num = (i // CHROMADB_BATCH_SIZE) + 1
-                    
-                    col.upsert(
-                        ids=batch_ids,
-                        embeddings=batch_vectors,
-                        documents=batch_documents,
-                        metadatas=batch_metadatas
-                    )
-                    logger.info(f"Upserted batch {batch_num}/{total_batches} ({len(batch_ids)} items)")
-            
-            # Store embedding model in collection metadata if we generated embeddings
-            if embedding_model_used:
-                current_metadata = col.metadata or {}
-                # Only update if not already set or if it's different
-                if current_metadata.get("embedding_model") != embedding_model_used:
-                    updated_metadata = {**current_metadata, "embedding_model": embedding_model_used}
-                    col.modify(metadata=updated_metadata)
-                    logger.info(f"Updated collection metadata with embedding_model: {embedding_model_used}")
-            
-            logger.info(f"Upsert successful: {ids_count} items stored")
-            
-            # Auto-trigger document summarization for uploaded files (non-blocking)
-            if formatted_metadatas:
-                trigger_auto_summarization(name, formatted_metadatas)
-        except Exception as chroma_error:
-            logger.error(f"ChromaDB upsert error: {str(chroma_error)}")
-            logger.error(traceback.format_exc())
-            raise HTTPException(
-                status_code=500, 
-                detail=f"ChromaDB upsert failed: {str(chroma_error)}"
-            )
+        # Auto-trigger document summarization for uploaded files (non-blocking)
+        if formatted_metadatas:
+            trigger_auto_summarization(name, formatted_metadatas)
         
         return {"status": "ok", "upserted": len(body.ids), "summarization_triggered": bool(formatted_metadatas)}
     except HTTPException:
@@ -586,32 +633,59 @@ def upsert_and_summarize(name: str, body: UpsertBody):
 
 class QueryBody(BaseModel):
     query_texts: Optional[List[str]] = None
-    query_embeddings: Optional[List[List[float]]] = None
+    query_embeddings: Optional[List[Any]] = None  # vectors; parsed by _embeddings_matrix
     n_results: int = 5
     model: Optional[str] = None
     where: Optional[dict] = None
     include: Optional[List[str]] = None  # ["metadatas","documents","distances","embeddings"]
+    allow_embeddings: bool = False  # "embeddings" in include is ignored unless this is set
+    semantic_cache: bool = False  # accept cached results of a near-identical (cosine >= threshold) query vector
+
+
+# Result fields /query returns by default and may return; embeddings are opt-in (allow_embeddings)
+# since they dwarf the rest of a typical RAG response
+_QUERY_DEFAULT_INCLUDE = ("metadatas", "documents", "distances")
 
 
 @app.post("/collections/{name}/query")
-def query(name: str, body: QueryBody):
+async def query(name: str, body: QueryBody):
     try:
-        client = get_chroma_client()
-        col = client.get_collection(name=name)
+        col = await get_async_collection(name)
 
-        q_embeddings = body.query_embeddings
-        if q_embeddings is None:
+        if body.query_embeddings is not None:
+            q_embeddings = _embeddings_matrix(body.query_embeddings, "query_embeddings")
+        else:
             if not body.query_texts:
                 raise HTTPException(status_code=400, detail="Provide query_embeddings or query_texts")
-            q_embeddings = embed_texts(body.query_texts, model=body.model)
+            q_embeddings = await embed_texts_async(body.query_texts, model=body.model)
 
-        res: Any = col.query(
+        allowed = _QUERY_DEFAULT_INCLUDE + ("embeddings",) if body.allow_embeddings else _QUERY_DEFAULT_INCLUDE
+        include = tuple(x for x in body.include if x in allowed) if body.include is not None else _QUERY_DEFAULT_INCLUDE
+        
+        if len(q_embeddings) == 1:
+            # Concurrent single-vector queries with the same parameters are coalesced into one
+            # Chroma query. Callers that set semantic_cache are also served from the retrieval
+            # cache when a near-identical vector was queried recently; it is opt-in because the
+            # ids/distances returned are then those of the cached vector, not exactly this one
+            where_key = json.dumps(body.where, sort_keys=True)
+            variant = ("query", include, where_key)
+            res = retrieval_cache.get(name, body.n_results, q_embeddings[0], variant) if body.semantic_cache else None
+            if res is None:
+                key = (name, body.n_results, include, where_key)
+                res = await async_query_batcher.submit(key, (col, q_embeddings[0], body.where))
+                if body.semantic_cache:
+                    retrieval_cache.put(name, body.n_results, q_embeddings[0], res, variant)
+            # Returned as a response directly: results can be MB-sized (and hold NumPy
+            # embeddings), so skip FastAPI's jsonable_encoder pass and let orjson serialize them
+            return ORJSONResponse(res)
+
+        res: Any = await col.query(
             query_embeddings=q_embeddings,
             n_results=body.n_results,
             where=body.where,
-            include=body.include,
+            include=list(include),
         )
-        return res
+        return ORJSONResponse(res)
     except HTTPException:
         raise
     except Exception as e:
@@ -625,7 +699,7 @@ class DeleteBody(BaseModel):
 
 
 @app.delete("/collections/{name}/delete")
-def delete_records(name: str, body: DeleteBody):
+async def delete_records(name: str, body: DeleteBody, return_count: bool = False):
     """
     Delete records from a collection filtered by filename or custom where clause.
     
@@ -635,45 +709,46 @@ def delete_records(name: str, body: DeleteBody):
     - where: Custom ChromaDB where clause for advanced filtering
     
     At least one of filename, filenames, or where must be provided.
+    
+    Pass ?return_count=true to have "deleted" report how many records matched; counting
+    costs an extra filtered read of the collection, so by default it is "unknown".
     """
     try:
-        client = get_chroma_client()
-        col = client.get_collection(name=name)
-        
-        # Build where clause
-        where_clause = None
+        col = await get_async_collection(name)
         
-        if body.where:
-            # Use custom where clause if provided
-            where_clause = body.where
-        elif body.filenames:
-            # Multiple filenames: use $in operator
-            if len(body.filenames) == 1:
-                where_clause = {"filename": body.filenames[0]}
-            else:
-                where_clause = {"filename": {"$in": body.filenames}}
-        elif body.filename:
-            # Single filename
-            where_clause = {"filename": body.filename}
-        else:
+        # Build where clause: custom where, else any of filenames ($in, whatever the count), else filename
+        where_clause = body.where or (
+            {"filename": {"$in": body.filenames}} if body.filenames
+            else {"filename": body.filename} if body.filename
+            else None
+        )
+        if where_clause is None:
             raise HTTPException(
                 status_code=400,
                 detail="Must provide filename, filenames, or where clause"
             )
         
-        # First, get count of records that will be deleted
-        try:
-            result = col.get(where=where_clause, include=["ids"])
-            records_to_delete = result.get("ids", []) or []
-            count_before = len(records_to_delete)
-        except Exception as e:
-            logger.warning(f"Could not get count before deletion: {str(e)}")
-            count_before = None
+        # If asked, count the records that will be deleted (ids are always returned, so include nothing else)
+        count_before = None
+        if return_count:
+            try:
+                result = await col.get(where=where_clause, include=[])
+                count_before = len(result.get("ids", []) or [])
+            except Exception as e:
+                logger.warning(f"Could not get count before deletion: {str(e)}")
         
         # Perform deletion
         try:
-            col.delete(where=where_clause)
+            await col.delete(where=where_clause)
+            retrieval_cache.invalidate(name)
+            answer_cache.invalidate(name)
             logger.info(f"Deleted records from collection '{name}' with filter: {where_clause}")
+            if body.where:
+                # Arbitrary filters can't be mirrored in the file index; drop it so the
+                # next file listing rescans the collection and rebuilds it
+                await asyncio.to_thread(collection_index.forget_collection, name)
+            else:
+                await asyncio.to_thread(collection_index.forget_files, name, body.filenames or [body.filename])
         except Exception as delete_error:
             logger.error(f"ChromaDB delete error: {str(delete_error)}")
             logger.error(traceback.format_exc())
@@ -718,8 +793,32 @@ class ChatResponse(BaseModel):
     model: Optional[str] = None
 
 
+async def _chat_event_stream(result: dict):
+    """
+    Server-Sent Events for a streamed chat: one `data: {"content": ...}` event per delta,
+    then a final `event: done` carrying tokens_used and model (or `event: error`).
+    """
+    try:
+        async for delta in result["stream"]:
+            yield f"data: {json.dumps({'content': delta})}\n\n"
+        done = {"tokens_used": result.get("tokens_used"), "model": result.get("model")}
+        yield f"event: done\ndata: {json.dumps(done)}\n\n"
+    except Exception as e:
+        logger.error(f"Chat stream error: {str(e)}")
+        yield f"event: error\ndata: {json.dumps({'detail': f'Chat error: {str(e)}'})}\n\n"
+
+
+def _get_chat_service(request: Request, model: Optional[str] = None) -> ChatService:
+    """Get the app-wide ChatService for a chat model (None = default model), creating it on first use."""
+    services = request.app.state.chat_services
+    service = services.get(model)
+    if service is None:
+        service = services[model] = ChatService(model=model)
+    return service
+
+
 @app.post("/chat", response_model=ChatResponse)
-def chat(body: ChatRequest):
+async def chat(body: ChatRequest, request: Request):
     """Chat endpoint that uses OpenAI API with optional RAG from ChromaDB."""
     try:
         if not body.messages:
@@ -731,7 +830,7 @@ def chat(body: ChatRequest):
         # Get RAG config from Supabase (or use defaults/request overrides)
         rag_config = None
         try:
-            rag_config = get_rag_config()
+            rag_config = await asyncio.to_thread(get_rag_config)
             if rag_config:
                 logger.info(f"Loaded RAG config: {rag_config}")
             else:
@@ -755,28 +854,32 @@ def chat(body: ChatRequest):
         
         logger.info(f"Using RAG config: n_results={rag_n_results}, threshold={rag_similarity_threshold}, max_tokens={rag_max_context_tokens}, model={chat_model}")
         
-        # Initialize chat service with model
-        chat_service = ChatService(model=chat_model)
+        # Shared chat service for this model
+        chat_service = _get_chat_service(request, chat_model)
         
-        try:
-            # Generate response
-            result = chat_service.chat(
-                messages=messages_dict,
-                collection_name=body.collection_name,
-                stream=body.stream,
-                rag_n_results=rag_n_results,
-                rag_similarity_threshold=rag_similarity_threshold,
-                rag_max_context_tokens=rag_max_context_tokens
-            )
-            
-            return ChatResponse(
-                content=result["content"],
-                tokens_used=result.get("tokens_used"),
-                model=result.get("model")
+        # Generate response
+        result = await chat_service.chat(
+            messages=messages_dict,
+            collection_name=body.collection_name,
+            stream=body.stream,
+            rag_n_results=rag_n_results,
+            rag_similarity_threshold=rag_similarity_threshold,
+            rag_max_context_tokens=rag_max_context_tokens
+        )
+        
+        if body.stream:
+            return StreamingResponse(
+                _chat_event_stream(result),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
             )
-        finally:
-            chat_service.close()
-            
+        
+        return ChatResponse(
+            content=result["content"],
+            tokens_used=result.get("tokens_used"),
+            model=result.get("model")
+        )
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -794,15 +897,12 @@ class TitleResponse(BaseModel):
 
 
 @app.post("/chat/generate-title", response_model=TitleResponse)
-def generate_title(body: TitleRequest):
+async def generate_title(body: TitleRequest, request: Request):
     """Generate a chat title based on the user's prompt."""
     try:
-        chat_service = ChatService()
-        try:
-            title = chat_service.generate_title(body.user_message)
-            return TitleResponse(title=title)
-        finally:
-            chat_service.close()
+        chat_service = _get_chat_service(request)
+        title = await chat_service.generate_title(body.user_message)
+        return TitleResponse(title=title)
     except Exception as e:
         logger.error(f"Title generation error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Title generation error: {str(e)}")
@@ -823,7 +923,7 @@ class RAGConfigResponse(BaseModel):
 
 
 @app.get("/rag/config", response_model=RAGConfigResponse)
-def get_rag_config_endpoint():
+async def get_rag_config_endpoint():
     """
     Get RAG configuration (single config for local app).
     Returns default values if settings don't exist.
@@ -835,7 +935,7 @@ def get_rag_config_endpoint():
     }
     
     # Fetch from Supabase
-    config = get_rag_config()
+    config = await asyncio.to_thread(get_rag_config)
     if config:
         return RAGConfigResponse(**config)
     
@@ -844,7 +944,7 @@ def get_rag_config_endpoint():
 
 
 @app.put("/rag/config", response_model=RAGConfigResponse)
-def update_rag_config_endpoint(body: RAGConfigRequest):
+async def update_rag_config_endpoint(body: RAGConfigRequest):
     """
     Update RAG configuration (single config for local app).
     
@@ -875,7 +975,7 @@ def update_rag_config_endpoint(body: RAGConfigRequest):
             )
     
     # Get current config to merge with updates
-    current_config = get_rag_config()
+    current_config = await asyncio.to_thread(get_rag_config)
     
     defaults = {
         "rag_n_results": 3,
@@ -891,6 +991,69 @@ def update_rag_config_endpoint(body: RAGConfigRequest):
         "rag_max_context_tokens": body.rag_max_context_tokens if body.rag_max_context_tokens is not None else base_config["rag_max_context_tokens"],
     }
     
+    # The frontend saves the config itself right after this; drop the cached copy so chat picks it up
+    invalidate_rag_config_cache()
+    
     # Return validated config (frontend will save to Supabase)
     return RAGConfigResponse(**updated_config)
 
+
+
+# ===== Batch endpoint =====
+
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "50"))
+
+
+class BatchItem(BaseModel):
+    id: str
+    method: str
+    url: str  # Path (and optional query string) of another endpoint, e.g. "/collections"
+    body: Optional[Any] = None
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem]
+
+
+async def _dispatch_batch_item(client: httpx.AsyncClient, item: BatchItem) -> dict:
+    """Run one sub-request through the app in-process and capture its status and body."""
+    if not item.url.startswith("/") or item.url.split("?", 1)[0].rstrip("/") == "/batch":
+        return {"id": item.id, "status": 400, "body": {"detail": "url must be a path to a non-batch endpoint"}}
+    
+    try:
+        resp = await client.request(
+            item.method.upper(),
+            item.url,
+            json=item.body
+        )
+    except Exception as e:  # noqa: BLE001
+        logger.error(f"Batch sub-request {item.id} ({item.method} {item.url}) failed: {e}")
+        return {"id": item.id, "status": 500, "body": {"detail": str(e)}}
+    
+    try:
+        body = resp.json()
+    except ValueError:
+        body = resp.text
+    return {"id": item.id, "status": resp.status_code, "body": body}
+
+
+@app.post("/batch")
+async def batch(body: BatchRequest):
+    """
+    Run several API calls in one HTTP round-trip.
+    
+    Each sub-request ({id, method, url, body}) is dispatched to the app in-process
+    (routing and validation run as usual, but there is no network hop) and all of
+    them run concurrently. Responses come back in request order as {id, status, body};
+    a failing sub-request does not fail the batch. Streaming responses are buffered.
+    """
+    if len(body.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BATCH_MAX_REQUESTS} requests per batch (got {len(body.requests)})"
+        )
+    
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://batch", timeout=None) as client:
+        responses = await asyncio.gather(*(_dispatch_batch_item(client, item) for item in body.requests))
+    return {"responses": responses}
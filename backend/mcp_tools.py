@@ -3,9 +3,11 @@ MCP Tools Implementation
 
 Defines and implements all MCP tools (actions AI can take).
 """
+import asyncio
 import logging
+import threading
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Dict, List, Optional
 
 from chroma_client import get_chroma_client, MissingEnvironmentVariableError
 from rag_config import get_rag_config, upsert_rag_config
@@ -13,6 +15,24 @@ from chat_service import ChatService
 
 logger = logging.getLogger(__name__)
 
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def _run_coroutine(coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """
+    Run a coroutine on a long-lived background event loop and wait for its result.
+    
+    ChatService's async OpenAI client binds its connection pool to the loop it first
+    runs on, so every MCP call is funnelled through the same loop instead of a fresh one.
+    """
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop).result(timeout=timeout)
+
 
 class MCPTools:
     """Manages all MCP tools."""
@@ -458,13 +478,13 @@ class MCPTools:
             max_context_tokens = rag_config.get("rag_max_context_tokens", 2000)
             
             # Get chat response with RAG
-            response = self.chat_service.chat(
+            response = _run_coroutine(self.chat_service.chat(
                 messages=messages,
                 collection_name=collection_name,
                 rag_n_results=rag_n_results,
                 rag_similarity_threshold=similarity_threshold,
                 rag_max_context_tokens=max_context_tokens
-            )
+            ))
             
             # Extract citations from filenames in RAG context (if available)
             # TODO: Enhance to extract actual citations from retrieved documents
@@ -0,0 +1,128 @@
+"""
+Async Micro-Batcher
+
+Coalesces concurrent single-item requests into batched calls. Items are queued and
+flushed every `max_wait` seconds or as soon as `max_batch` are pending; items that
+share a group key (e.g. embedding model, or collection + query params) are handed
+to the flush function together.
+"""
+import asyncio
+import inspect
+import logging
+import threading
+import weakref
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _LoopState:
+    """A batcher's queue, collector task and in-flight flushes on one event loop."""
+
+    def __init__(self, max_queue: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.worker: Optional[asyncio.Task] = None
+        # The loop only holds tasks weakly; keep in-flight flushes alive until they finish
+        self.tasks: Set[asyncio.Task] = set()
+
+
+class MicroBatcher:
+    """
+    Batches `submit(key, item)` calls into `flush_fn(key, items) -> results`.
+
+    `flush_fn` is either a blocking function (run via asyncio.to_thread) or a
+    coroutine function (awaited on the loop), and must return one result per item,
+    in order.
+
+    Batchers are module-level singletons shared by every event loop in the process
+    (the app loop, the MCP background loop, asyncio.run in worker threads), so queue
+    and collector state is kept per loop; items are only batched with others
+    submitted on the same loop.
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[Hashable, List[Any]], List[Any]],
+        max_batch: int = 32,
+        max_wait: float = 0.01,
+        max_queue: int = 1024,
+        name: str = "batch"
+    ):
+        self.flush_fn = flush_fn
+        self._flush_is_async = inspect.iscoroutinefunction(flush_fn) or inspect.iscoroutinefunction(
+            getattr(flush_fn, "__call__", None)
+        )
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.name = name
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+        # Loops on other threads may be creating their states at the same time
+        self._states_lock = threading.Lock()
+
+    def _ensure_worker(self, loop: asyncio.AbstractEventLoop) -> _LoopState:
+        """Get this loop's state, starting (or restarting) its collector task."""
+        with self._states_lock:
+            state = self._states.get(loop)
+            if state is None:
+                # A state's tasks reference its loop, so entries don't drop out of the weak mapping
+                # on their own; forget loops that have been closed (e.g. by asyncio.run)
+                for closed in [other for other in self._states if other.is_closed()]:
+                    del self._states[closed]
+                state = _LoopState(self.max_queue)
+                self._states[loop] = state
+        if state.worker is None or state.worker.done():
+            state.worker = loop.create_task(self._collect(state))
+        return state
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        """Queue one item and wait for its result from the shared batch call."""
+        loop = asyncio.get_running_loop()
+        state = self._ensure_worker(loop)
+        future = loop.create_future()
+        await state.queue.put((key, item, future))
+        return await future
+
+    async def _collect(self, state: _LoopState) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await state.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(state.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            groups: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+            for key, item, future in batch:
+                groups.setdefault(key, []).append((item, future))
+            for key, entries in groups.items():
+                task = loop.create_task(self._flush(key, entries))
+                state.tasks.add(task)
+                task.add_done_callback(state.tasks.discard)
+
+    async def _flush(self, key: Hashable, entries: List[Tuple[Any, asyncio.Future]]) -> None:
+        try:
+            items = [item for item, _ in entries]
+            if self._flush_is_async:
+                results = await self.flush_fn(key, items)
+            else:
+                results = await asyncio.to_thread(self.flush_fn, key, items)
+            results = list(results)
+            if len(results) != len(entries):
+                raise RuntimeError(f"{self.name} flush returned {len(results)} results for {len(entries)} items")
+        except Exception as e:
+            for _, future in entries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if len(entries) > 1:
+            logger.debug("Coalesced %d %s requests into one call", len(entries), self.name)
+        for (_, future), result in zip(entries, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,92 @@
+"""
+Direct aiohttp calls to the OpenAI REST API
+
+A thin aiohttp client for the high-volume, non-streaming endpoints (embeddings),
+which avoids the OpenAI SDK's httpx transport overhead at high concurrency.
+Everything else (chat, streaming, files/batches) still goes through the SDK.
+"""
+import os
+import asyncio
+import base64
+import logging
+import weakref
+from typing import List, NamedTuple, Optional
+
+import aiohttp
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+OPENAI_FAST_MAX_CONNECTIONS = int(os.getenv("OPENAI_FAST_MAX_CONNECTIONS", "64"))
+
+# aiohttp sessions are bound to the event loop they were created on, so keep one per loop
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+
+
+class OpenAIHTTPError(RuntimeError):
+    """Raised when the OpenAI API returns a non-2xx response."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"OpenAI API error {status}: {message}")
+        self.status = status
+        # Rate limits and server errors are worth retrying; other 4xx are not
+        self.retryable = status == 429 or status >= 500
+
+
+# Errors retry_async should retry for calls made through this module
+RETRYABLE_ERRORS = (OpenAIHTTPError, aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class EmbeddingsResponse(NamedTuple):
+    """Embeddings as one float32 matrix (row i is input i), plus model and token usage."""
+    embeddings: np.ndarray
+    model: str
+    total_tokens: Optional[int]
+
+
+def _base_url() -> str:
+    return (os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/")
+
+
+def _get_session() -> aiohttp.ClientSession:
+    """Get (or create) the shared aiohttp session for the running event loop."""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        api_key = (os.getenv("OPENAI_API_KEY") or "").strip()
+        if not api_key:
+            raise RuntimeError("OPENAI_API_KEY must be set")
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=OPENAI_FAST_MAX_CONNECTIONS),
+            timeout=aiohttp.ClientTimeout(total=60.0),
+            headers={"Authorization": f"Bearer {api_key}"},
+        )
+        _sessions[loop] = session
+    return session
+
+
+async def close_session() -> None:
+    """Close the running loop's shared session (call once on shutdown)."""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+async def embeddings_create(model: str, input: List[str]) -> EmbeddingsResponse:
+    """
+    POST /v1/embeddings and return the embeddings in input order.
+    
+    Requests base64 encoding, so vectors are decoded straight into float32 arrays
+    instead of being parsed from JSON into Python float lists.
+    """
+    session = _get_session()
+    body = {"model": model, "input": input, "encoding_format": "base64"}
+    async with session.post(f"{_base_url()}/embeddings", json=body) as resp:
+        if resp.status >= 400:
+            raise OpenAIHTTPError(resp.status, await resp.text())
+        payload = await resp.json()
+
+    items = sorted(payload["data"], key=lambda item: item["index"])
+    embeddings = np.stack([np.frombuffer(base64.b64decode(item["embedding"]), dtype=np.float32) for item in items])
+    usage = payload.get("usage") or {}
+    return EmbeddingsResponse(embeddings=embeddings, model=payload.get("model", model), total_tokens=usage.get("total_tokens"))
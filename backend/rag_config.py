@@ -1,11 +1,13 @@
 import os
+import threading
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 import logging
-import psycopg2
 from psycopg2.extras import RealDictCursor
 
 from dotenv import load_dotenv
+from db import get_db_connection, release_db_connection
 
 # Load .env from the backend directory (alongside this file) if present
 # Also try parent directory .env (for project-wide env vars)
@@ -17,29 +19,41 @@ load_dotenv(dotenv_path=_PARENT_ENV_PATH if _PARENT_ENV_PATH.exists() else None,
 
 logger = logging.getLogger(__name__)
 
+# The config is read on every chat message but rarely changes, so reads are cached for this many
+# seconds. The frontend saves settings straight to PostgreSQL, so a change made there is picked
+# up once the cached value expires; upsert_rag_config drops the cache immediately.
+RAG_CONFIG_CACHE_TTL = float(os.getenv("RAG_CONFIG_CACHE_TTL", "10"))
+_cached_config: Optional[Tuple[Optional[dict], float]] = None
+_cache_lock = threading.Lock()
 
-def _get_db_connection():
-    """Get PostgreSQL database connection."""
-    try:
-        conn = psycopg2.connect(
-            host=os.getenv("POSTGRES_HOST", "localhost"),
-            port=int(os.getenv("POSTGRES_PORT", "5433")),
-            database=os.getenv("POSTGRES_DB", "lola_db"),
-            user=os.getenv("POSTGRES_USER", "lola"),
-            password=os.getenv("POSTGRES_PASSWORD", "lola_dev_password"),
-        )
-        return conn
-    except Exception as e:
-        logger.error(f"Failed to connect to PostgreSQL: {str(e)}")
-        return None
+
+def invalidate_rag_config_cache() -> None:
+    """Forget the cached RAG config so the next read goes to PostgreSQL."""
+    global _cached_config
+    with _cache_lock:
+        _cached_config = None
 
 
 def get_rag_config() -> Optional[dict]:
     """
-    Get RAG configuration from PostgreSQL (single config for local app).
+    Get RAG configuration (single config for local app), cached for RAG_CONFIG_CACHE_TTL seconds.
     Returns None if settings don't exist or database is not configured.
     """
-    conn = _get_db_connection()
+    global _cached_config
+    with _cache_lock:
+        if _cached_config is not None and _cached_config[1] > time.monotonic():
+            config = _cached_config[0]
+            return dict(config) if config is not None else None
+    
+    config = _fetch_rag_config()
+    with _cache_lock:
+        _cached_config = (config, time.monotonic() + RAG_CONFIG_CACHE_TTL)
+    return dict(config) if config is not None else None
+
+
+def _fetch_rag_config() -> Optional[dict]:
+    """Read the RAG configuration from PostgreSQL."""
+    conn = get_db_connection()
     if not conn:
         return None
     
@@ -67,7 +81,7 @@ def get_rag_config() -> Optional[dict]:
         logger.warning(f"Error fetching RAG config from PostgreSQL: {str(e)}")
         return None
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 
 def upsert_rag_config(config: dict) -> bool:
@@ -75,7 +89,7 @@ def upsert_rag_config(config: dict) -> bool:
     Create or update RAG configuration in PostgreSQL (single config for local app).
     Returns True if successful, False otherwise.
     """
-    conn = _get_db_connection()
+    conn = get_db_connection()
     if not conn:
         logger.warning("PostgreSQL connection not available")
         return False
@@ -111,6 +125,7 @@ def upsert_rag_config(config: dict) -> bool:
                 )
             
             conn.commit()
+            invalidate_rag_config_cache()
             return True
     except Exception as e:
         logger.error(f"Error upserting RAG config to PostgreSQL: {str(e)}")
@@ -119,5 +134,5 @@ def upsert_rag_config(config: dict) -> bool:
         conn.rollback()
         return False
     finally:
-        conn.close()
+        release_db_connection(conn)
 
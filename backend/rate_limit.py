@@ -0,0 +1,120 @@
+"""
+OpenAI request throttling and retries
+
+A process-wide token-bucket limiter for requests per minute (OPENAI_RPM) and tokens
+per minute (OPENAI_TPM), plus retry with exponential backoff and jitter. Both limits
+default to 0 (unlimited); set them to the account's limits so concurrent summarization
+and embedding sustain throughput instead of bursting into 429s.
+"""
+import os
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Tuple
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "0"))
+OPENAI_TPM = float(os.getenv("OPENAI_TPM", "0"))
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "5"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "20"))
+
+OPENAI_RETRYABLE = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate_per_min`, holding at most `capacity` tokens.
+    
+    acquire() reserves tokens immediately (the balance may go negative) and sleeps
+    until the reservation is covered, so waiters are served in arrival order. State is
+    guarded by a threading.Lock rather than an asyncio.Lock, so one bucket can be shared
+    by every event loop and thread in the process (limits are per account, not per loop).
+    A rate of 0 disables the bucket.
+    """
+    
+    def __init__(self, rate_per_min: float, capacity: float = 0):
+        self.rate = rate_per_min / 60.0
+        self.capacity = capacity or rate_per_min
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _reserve(self, amount: float) -> float:
+        """Take `amount` tokens and return how long to wait until they are actually available."""
+        if self.rate <= 0:
+            return 0.0
+        # A request larger than the bucket could never be satisfied; let it through at full capacity
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+    
+    async def acquire(self, amount: float = 1.0) -> None:
+        delay = self._reserve(amount)
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    def acquire_sync(self, amount: float = 1.0) -> None:
+        delay = self._reserve(amount)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class OpenAIRateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets for one OpenAI account."""
+    
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+    
+    async def acquire(self, estimated_tokens: int) -> None:
+        """Wait until one request of about `estimated_tokens` tokens fits in both limits."""
+        await self.requests.acquire(1)
+        await self.tokens.acquire(estimated_tokens)
+    
+    def acquire_sync(self, estimated_tokens: int) -> None:
+        self.requests.acquire_sync(1)
+        self.tokens.acquire_sync(estimated_tokens)
+
+
+# Shared by chat, summarization and embeddings
+openai_limiter = OpenAIRateLimiter(OPENAI_RPM, OPENAI_TPM)
+
+
+def estimate_tokens(texts: Any) -> int:
+    """Cheap token estimate (~4 characters per token) for rate limiting."""
+    if isinstance(texts, str):
+        return len(texts) // 4 + 1
+    return sum(len(text) for text in texts) // 4 + 1
+
+
+async def retry_async(
+    coro_fn: Callable[[], Awaitable[Any]],
+    retry_on: Tuple[type, ...] = OPENAI_RETRYABLE,
+    max_attempts: int = RETRY_MAX_ATTEMPTS
+) -> Any:
+    """
+    Await coro_fn(), retrying on the given exceptions with exponential backoff and jitter.
+    
+    Delay for attempt n is min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**n) scaled by a
+    random factor in [0.5, 1.5], so a burst of failed requests doesn't retry in lockstep.
+    Exceptions carrying `retryable = False` (e.g. a 400 from openai_fast) are not retried.
+    """
+    for attempt in range(max_attempts):
+        try:
+            return await coro_fn()
+        except retry_on as e:
+            if attempt == max_attempts - 1 or not getattr(e, "retryable", True):
+                raise
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.5)
+            logger.warning(f"⚠️  {type(e).__name__}, retrying in {delay:.2f}s (attempt {attempt + 1}/{max_attempts})")
+            await asyncio.sleep(delay)
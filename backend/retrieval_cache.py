@@ -0,0 +1,317 @@
+"""
+Semantic Retrieval Cache
+
+Caches ChromaDB query results for RAG lookups. A new query whose embedding is
+cosine-near a recent query against the same collection reuses that query's
+results instead of making another round-trip to Chroma.
+
+An optional disk-backed tier (diskcache) keeps exact-match results across process
+restarts; enable it by setting RETRIEVAL_DISK_CACHE_DIR.
+
+Also holds the evidence-validated answer cache used by ChatService: a cached
+answer is only reused when both the query and the retrieved evidence match.
+"""
+import os
+import hashlib
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Hashable, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# diskcache is only needed for the optional persistent retrieval tier
+try:
+    import diskcache
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    DISKCACHE_AVAILABLE = False
+
+
+def _normalize(embedding: Sequence[float]) -> np.ndarray:
+    """Return the embedding as a unit-length float32 vector."""
+    vec = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    if norm > 0:
+        vec = vec / norm
+    return vec
+
+
+class DiskRetrievalCache:
+    """
+    Exact-match retrieval cache on disk, so results survive restarts and redeploys.
+    
+    Keys are blake2b(collection, query embedding bytes, n_results, variant, collection version).
+    Invalidating a collection bumps its version, which orphans its old entries; those
+    age out through the TTL and diskcache's size-limited eviction.
+    """
+
+    def __init__(self, directory: str, size_limit: int = 2_000_000_000, ttl_seconds: float = 86400.0):
+        self._cache = diskcache.Cache(directory, size_limit=size_limit)
+        self.ttl_seconds = ttl_seconds
+
+    def _key(self, collection_name: str, n_results: int, embedding: Sequence[float], variant: Hashable = None) -> str:
+        version = self._cache.get(("version", collection_name), 0)
+        h = hashlib.blake2b(digest_size=16)
+        h.update(collection_name.encode("utf-8"))
+        h.update(b"\0")
+        h.update(np.asarray(embedding, dtype=np.float32).tobytes())
+        h.update(n_results.to_bytes(4, "big"))
+        if variant is not None:
+            h.update(repr(variant).encode("utf-8"))
+        h.update(int(version).to_bytes(8, "big"))
+        return h.hexdigest()
+
+    def get(self, collection_name: str, n_results: int, embedding: Sequence[float], variant: Hashable = None) -> Optional[Dict[str, Any]]:
+        try:
+            return self._cache.get(self._key(collection_name, n_results, embedding, variant))
+        except Exception as e:
+            logger.warning(f"⚠️  Disk retrieval cache read failed: {e}")
+            return None
+
+    def put(
+        self,
+        collection_name: str,
+        n_results: int,
+        embedding: Sequence[float],
+        results: Dict[str, Any],
+        variant: Hashable = None
+    ) -> None:
+        try:
+            self._cache.set(self._key(collection_name, n_results, embedding, variant), results, expire=self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"⚠️  Disk retrieval cache write failed: {e}")
+
+    def invalidate(self, collection_name: Optional[str] = None) -> None:
+        try:
+            if collection_name is None:
+                self._cache.clear()
+            else:
+                self._cache.incr(("version", collection_name), default=0)
+        except Exception as e:
+            logger.warning(f"⚠️  Disk retrieval cache invalidation failed: {e}")
+
+
+class SemanticRetrievalCache:
+    """
+    Cosine-threshold cache for ChromaDB query results.
+
+    Entries are bucketed by (collection_name, n_results, variant), where `variant` holds
+    any other query parameters that change the results (include fields and where filter
+    for the /query endpoint; None for chat retrieval). Each bucket is a ring buffer whose
+    normalized embeddings are stacked in one float32 matrix, so a lookup is a single
+    matrix-vector product rather than a Python loop over cached queries.
+    
+    If a DiskRetrievalCache is given, in-memory misses fall back to it and every put
+    is written through, so a restarted process starts with a warm cache.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        similarity_threshold: float = 0.97,
+        ttl_seconds: float = 300.0,
+        disk: Optional[DiskRetrievalCache] = None
+    ):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.disk = disk
+        self._buckets: Dict[Tuple[str, int, Hashable], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _new_bucket(self, dim: int) -> Dict[str, Any]:
+        return {
+            "matrix": np.zeros((self.max_entries, dim), dtype=np.float32),
+            "timestamps": np.zeros(self.max_entries, dtype=np.float64),
+            "results": [None] * self.max_entries,
+            "size": 0,
+            "next": 0,
+        }
+
+    def get(
+        self,
+        collection_name: str,
+        n_results: int,
+        embedding: Sequence[float],
+        variant: Hashable = None
+    ) -> Optional[Dict[str, Any]]:
+        """Return cached results for a semantically equivalent query, or None."""
+        results = self._get_memory((collection_name, n_results, variant), _normalize(embedding))
+        if results is None and self.disk is not None:
+            results = self.disk.get(collection_name, n_results, embedding, variant)
+            if results is not None:
+                logger.debug(f"Disk retrieval cache hit for '{collection_name}'")
+                self._put_memory((collection_name, n_results, variant), _normalize(embedding), results)
+        return results
+
+    def _get_memory(self, key: Tuple[str, int, Hashable], emb: np.ndarray) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or bucket["size"] == 0 or bucket["matrix"].shape[1] != emb.shape[0]:
+                return None
+
+            size = bucket["size"]
+            scores = bucket["matrix"][:size] @ emb
+            expired = (time.monotonic() - bucket["timestamps"][:size]) > self.ttl_seconds
+            scores[expired] = -1.0
+
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity_threshold:
+                logger.debug(f"Retrieval cache hit for '{key[0]}' (similarity {scores[best]:.3f})")
+                return bucket["results"][best]
+
+        return None
+
+    def put(
+        self,
+        collection_name: str,
+        n_results: int,
+        embedding: Sequence[float],
+        results: Dict[str, Any],
+        variant: Hashable = None
+    ) -> None:
+        """Store query results for later semantically equivalent queries."""
+        self._put_memory((collection_name, n_results, variant), _normalize(embedding), results)
+        if self.disk is not None:
+            self.disk.put(collection_name, n_results, embedding, results, variant)
+
+    def _put_memory(self, key: Tuple[str, int, Hashable], emb: np.ndarray, results: Dict[str, Any]) -> None:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or bucket["matrix"].shape[1] != emb.shape[0]:
+                bucket = self._new_bucket(emb.shape[0])
+                self._buckets[key] = bucket
+
+            i = bucket["next"]
+            bucket["matrix"][i] = emb
+            bucket["timestamps"][i] = time.monotonic()
+            bucket["results"][i] = results
+            bucket["next"] = (i + 1) % self.max_entries
+            bucket["size"] = min(bucket["size"] + 1, self.max_entries)
+
+    def invalidate(self, collection_name: Optional[str] = None) -> None:
+        """Drop cached results for a collection (or everything if no name given)."""
+        if self.disk is not None:
+            self.disk.invalidate(collection_name)
+        with self._lock:
+            if collection_name is None:
+                self._buckets.clear()
+                return
+            for key in [k for k in self._buckets if k[0] == collection_name]:
+                del self._buckets[key]
+
+
+class GroundedAnswerCache:
+    """
+    Answer cache gated on retrieved evidence (GroundedCache-style).
+
+    A cached answer is served only when (G1) the query embedding is within
+    `query_similarity_threshold` cosine of the cached query and (G2) the Jaccard
+    overlap of the retrieved chunk IDs is at least `evidence_overlap_threshold`.
+    The evidence gate keeps paraphrases that retrieve different documents from
+    hijacking each other's answers.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        query_similarity_threshold: float = 0.95,
+        evidence_overlap_threshold: float = 0.7,
+        ttl_seconds: float = 3600.0
+    ):
+        self.query_similarity_threshold = query_similarity_threshold
+        self.evidence_overlap_threshold = evidence_overlap_threshold
+        self.ttl_seconds = ttl_seconds
+        self._entries: deque = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def get(self, scope: Hashable, embedding: Sequence[float], chunk_ids: Iterable[str]) -> Optional[str]:
+        """Return a cached answer that passes both gates, or None."""
+        ids = set(chunk_ids)
+        if not ids:
+            return None
+        emb = _normalize(embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            candidates = [
+                entry for entry in self._entries
+                if entry["scope"] == scope
+                and now - entry["ts"] <= self.ttl_seconds
+                and entry["embedding"].shape == emb.shape
+            ]
+            if not candidates:
+                return None
+
+            scores = np.stack([entry["embedding"] for entry in candidates]) @ emb
+            for i in np.argsort(-scores):
+                if scores[i] < self.query_similarity_threshold:
+                    break
+                cached_ids = candidates[i]["chunk_ids"]
+                overlap = len(ids & cached_ids) / len(ids | cached_ids)
+                if overlap >= self.evidence_overlap_threshold:
+                    logger.debug(f"Answer cache hit (similarity {scores[i]:.3f}, evidence overlap {overlap:.2f})")
+                    return candidates[i]["answer"]
+
+        return None
+
+    def put(self, scope: Hashable, embedding: Sequence[float], chunk_ids: Iterable[str], answer: str) -> None:
+        """Store an answer together with the evidence it was grounded on."""
+        ids = set(chunk_ids)
+        if not ids or not answer:
+            return
+        with self._lock:
+            self._entries.append({
+                "scope": scope,
+                "embedding": _normalize(embedding),
+                "chunk_ids": ids,
+                "answer": answer,
+                "ts": time.monotonic(),
+            })
+
+    def invalidate(self, collection_name: Optional[str] = None) -> None:
+        """Drop cached answers for a collection (scope[0]) or everything."""
+        with self._lock:
+            if collection_name is None:
+                self._entries.clear()
+                return
+            kept = [e for e in self._entries if e["scope"][0] != collection_name]
+            self._entries.clear()
+            self._entries.extend(kept)
+
+
+def _build_disk_cache() -> Optional[DiskRetrievalCache]:
+    directory = (os.getenv("RETRIEVAL_DISK_CACHE_DIR") or "").strip()
+    if not directory:
+        return None
+    if not DISKCACHE_AVAILABLE:
+        logger.warning("RETRIEVAL_DISK_CACHE_DIR is set but diskcache is not installed; disk tier disabled")
+        return None
+    try:
+        return DiskRetrievalCache(
+            directory,
+            size_limit=int(os.getenv("RETRIEVAL_DISK_CACHE_SIZE_LIMIT", "2000000000")),
+            ttl_seconds=float(os.getenv("RETRIEVAL_DISK_CACHE_TTL", "86400")),
+        )
+    except Exception as e:
+        logger.warning(f"⚠️  Could not open disk retrieval cache at {directory}: {e}")
+        return None
+
+
+retrieval_cache = SemanticRetrievalCache(
+    max_entries=int(os.getenv("RETRIEVAL_CACHE_SIZE", "512")),
+    similarity_threshold=float(os.getenv("RETRIEVAL_CACHE_THRESHOLD", "0.97")),
+    ttl_seconds=float(os.getenv("RETRIEVAL_CACHE_TTL", "300")),
+    disk=_build_disk_cache(),
+)
+
+answer_cache = GroundedAnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "256")),
+    query_similarity_threshold=float(os.getenv("ANSWER_CACHE_QUERY_THRESHOLD", "0.95")),
+    evidence_overlap_threshold=float(os.getenv("ANSWER_CACHE_EVIDENCE_THRESHOLD", "0.7")),
+    ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+)
@@ -0,0 +1,109 @@
+"""
+Test script for the collection file index
+
+Checks the rows the index stores for each record, and - when PostgreSQL is reachable
+and the collection_records table exists - that upserts, file deletes, rebuilds and
+collection deletes are reflected in file_stats(). Uses its own collection name and
+removes its rows afterwards.
+"""
+import sys
+import uuid
+
+import collection_index
+from collection_index import file_stats, forget_collection, forget_files, index_rows, rebuild, record_upsert
+
+
+def check(condition: bool, message: str) -> bool:
+    print(f"{'✅' if condition else '❌'} {message}")
+    return condition
+
+
+def test_index_rows():
+    """Only the listing fields are kept, coerced to the column types."""
+    print("Testing index_rows...")
+    rows = index_rows(
+        "docs",
+        ["a", "b", "c", "d"],
+        [
+            {"filename": "f.txt", "file_type": "txt", "uploaded_at": "2024-01-01", "chunk_index": 3, "extra": "x"},
+            {"filename": "", "chunk_index": True},
+            None,
+            {"filename": "g.md", "file_type": 5, "chunk_index": 1.5},
+        ]
+    )
+    ok = check(rows[0] == ("docs", "a", "f.txt", "txt", "2024-01-01", 3), "full metadata row")
+    ok &= check(rows[1] == ("docs", "b", None, None, None, None), "empty filename and bool chunk_index become NULL")
+    ok &= check(rows[2] == ("docs", "c", None, None, None, None), "missing metadata becomes an all-NULL row")
+    ok &= check(rows[3] == ("docs", "d", "g.md", "5", None, None), "non-string types stringified, non-int chunk_index dropped")
+    ok &= check(len(index_rows("docs", ["a", "b"], None)) == 2, "upserts without metadatas still count their records")
+    return ok
+
+
+def test_round_trip():
+    """Upserts, deletes and rebuilds against PostgreSQL show up in file_stats()."""
+    print("\nTesting against PostgreSQL...")
+    if not collection_index.COLLECTION_INDEX_ENABLED:
+        print("⚠️  COLLECTION_INDEX_ENABLED is off, skipping")
+        return True
+    name = f"test-index-{uuid.uuid4().hex[:8]}"
+    if file_stats(name) is None:
+        print("⚠️  PostgreSQL or the collection_records table is unavailable, skipping")
+        return True
+
+    try:
+        record_upsert(
+            name,
+            ["a1", "a2", "b1", "n1"],
+            [
+                {"filename": "a.txt", "chunk_index": 0},
+                {"filename": "a.txt", "chunk_index": 4},
+                {"filename": "b.txt", "chunk_index": 2},
+                {},
+            ]
+        )
+        total, files = file_stats(name)
+        ok = check(total == 4, f"every record counted, with or without a filename ({total})")
+        ok &= check([f["filename"] for f in files] == ["a.txt", "b.txt"], "files grouped and sorted by filename")
+        ok &= check(
+            (files[0]["record_count"], files[0]["first_chunk_index"], files[0]["last_chunk_index"]) == (2, 0, 4),
+            "per-file record count and chunk range"
+        )
+
+        record_upsert(name, ["a2"], [{"filename": "b.txt", "chunk_index": 9}])
+        total, files = file_stats(name)
+        ok &= check(total == 4 and [f["record_count"] for f in files] == [1, 2], "re-upserting an id replaces its row")
+
+        forget_files(name, ["b.txt"])
+        total, files = file_stats(name)
+        ok &= check(total == 2 and [f["filename"] for f in files] == ["a.txt"], "deleting a file drops its rows")
+
+        rebuild(name, index_rows(name, ["z1"], [{"filename": "z.txt"}]))
+        total, files = file_stats(name)
+        ok &= check(total == 1 and files[0]["filename"] == "z.txt", "rebuild replaces the collection's rows")
+
+        forget_collection(name)
+        ok &= check(file_stats(name) == (0, []), "forget_collection empties the index for that collection")
+    finally:
+        forget_collection(name)
+    return ok
+
+
+def main():
+    print("=" * 60)
+    print("Collection index tests")
+    print("=" * 60)
+    results = [
+        test_index_rows(),
+        test_round_trip(),
+    ]
+    print("\n" + "=" * 60)
+    if all(results):
+        print("✅ All tests passed!")
+    else:
+        print("❌ Some tests failed")
+    print("=" * 60)
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
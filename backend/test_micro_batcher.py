@@ -0,0 +1,158 @@
+"""
+Test script for MicroBatcher
+
+Checks that concurrent submits are coalesced per key, split at max_batch, answered in
+order, that flush errors reach every waiter, that blocking flush functions work, and
+that several event loops can share one batcher.
+"""
+import asyncio
+import sys
+import threading
+import time
+from typing import Any, Hashable, List
+
+from micro_batcher import MicroBatcher
+
+
+def check(condition: bool, message: str) -> bool:
+    print(f"{'✅' if condition else '❌'} {message}")
+    return condition
+
+
+class Recorder:
+    """Async flush function that records each call's key and batch size."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, key: Hashable, items: List[Any]) -> List[Any]:
+        self.calls.append((key, len(items)))
+        await asyncio.sleep(0.001)
+        return [(key, item) for item in items]
+
+
+def test_coalescing_and_order():
+    """Concurrent submits share one call per key, and each caller gets its own result."""
+    print("Testing coalescing...")
+    flush = Recorder()
+    batcher = MicroBatcher(flush, max_batch=32, max_wait=0.02)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit("a" if i % 2 else "b", i) for i in range(10)))
+
+    results = asyncio.run(run())
+    ok = check(results == [("a" if i % 2 else "b", i) for i in range(10)], "results match their submits, in order")
+    ok &= check(sorted(flush.calls) == [("a", 5), ("b", 5)], f"one call per key (calls: {flush.calls})")
+    return ok
+
+
+def test_max_batch():
+    """More pending items than max_batch are split across calls."""
+    print("\nTesting max_batch splitting...")
+    flush = Recorder()
+    batcher = MicroBatcher(flush, max_batch=4, max_wait=0.02)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit("k", i) for i in range(10)))
+
+    results = asyncio.run(run())
+    sizes = [size for _, size in flush.calls]
+    ok = check(results == [("k", i) for i in range(10)], "all 10 items answered")
+    ok &= check(max(sizes) <= 4 and sum(sizes) == 10, f"no call exceeds max_batch (sizes: {sizes})")
+    return ok
+
+
+def test_errors():
+    """A failing flush raises in every caller of that batch, and the batcher keeps working."""
+    print("\nTesting flush errors...")
+    fail = {"on": True}
+
+    async def flush(key, items):
+        if fail["on"]:
+            raise RuntimeError("boom")
+        return items
+
+    batcher = MicroBatcher(flush, max_wait=0.01)
+
+    async def run():
+        failed = await asyncio.gather(*(batcher.submit("k", i) for i in range(3)), return_exceptions=True)
+        fail["on"] = False
+        recovered = await batcher.submit("k", 7)
+        return failed, recovered
+
+    failed, recovered = asyncio.run(run())
+    ok = check(all(isinstance(e, RuntimeError) for e in failed), "every waiter receives the error")
+    ok &= check(recovered == 7, "later submits still succeed")
+    return ok
+
+
+def test_blocking_flush():
+    """A plain (blocking) flush function runs in a worker thread."""
+    print("\nTesting blocking flush function...")
+    threads = []
+
+    def flush(key, items):
+        threads.append(threading.current_thread() is threading.main_thread())
+        time.sleep(0.001)
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(flush, max_wait=0.01)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit("k", i) for i in range(5)))
+
+    ok = check(asyncio.run(run()) == [0, 2, 4, 6, 8], "results returned")
+    ok &= check(threads and not any(threads), "flush ran off the event loop thread")
+    return ok
+
+
+def test_multiple_loops():
+    """Loops in different threads (and successive asyncio.run calls) don't steal each other's items."""
+    print("\nTesting multiple event loops...")
+    flush = Recorder()
+    batcher = MicroBatcher(flush, max_wait=0.02)
+    results = {}
+
+    async def run(offset):
+        return await asyncio.gather(*(batcher.submit("k", offset + i) for i in range(20)))
+
+    def worker(offset):
+        results[offset] = asyncio.run(run(offset))
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in (0, 100, 200, 300)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    ok = check(
+        all(results.get(o) == [("k", o + i) for i in range(20)] for o in (0, 100, 200, 300)),
+        "each loop gets all of its own results"
+    )
+    asyncio.run(run(400))
+    ok &= check(len(batcher._states) == 1, "states of closed loops are dropped")
+    return ok
+
+
+def main():
+    print("=" * 60)
+    print("MicroBatcher tests")
+    print("=" * 60)
+    results = [
+        test_coalescing_and_order(),
+        test_max_batch(),
+        test_errors(),
+        test_blocking_flush(),
+        test_multiple_loops(),
+    ]
+    print("\n" + "=" * 60)
+    if all(results):
+        print("✅ All tests passed!")
+    else:
+        print("❌ Some tests failed")
+    print("=" * 60)
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,149 @@
+"""
+Test script for the OpenAI rate limiter and retry helper
+
+Checks token-bucket burst capacity and refill timing, the disabled (rate 0) bucket,
+and retry_async's retry/give-up behaviour. Runs without network access.
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("RETRY_BASE_DELAY", "0.01")
+
+from rate_limit import TokenBucket, retry_async
+
+
+def check(condition: bool, message: str) -> bool:
+    print(f"{'✅' if condition else '❌'} {message}")
+    return condition
+
+
+def test_burst_and_refill():
+    """A full bucket allows a burst of `capacity`, then refills at rate_per_min."""
+    print("Testing token bucket refill...")
+    bucket = TokenBucket(rate_per_min=600, capacity=5)  # 10 tokens/second
+
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire_sync(1)
+    burst = time.monotonic() - start
+    ok = check(burst < 0.05, f"burst of 5 within capacity is immediate ({burst:.3f}s)")
+
+    start = time.monotonic()
+    for _ in range(3):
+        bucket.acquire_sync(1)
+    waited = time.monotonic() - start
+    ok &= check(0.25 <= waited < 0.6, f"3 more tokens wait for refill at 10/s ({waited:.3f}s, ~0.3s expected)")
+
+    time.sleep(0.5)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire_sync(1)
+    ok &= check(time.monotonic() - start < 0.05, "idle time refills the bucket (capped at capacity)")
+    return ok
+
+
+def test_async_acquire_order():
+    """Concurrent async waiters are served in arrival order at the refill rate."""
+    print("\nTesting async acquire...")
+    bucket = TokenBucket(rate_per_min=1200, capacity=1)  # 20 tokens/second
+    finished = []
+
+    async def take(i):
+        await bucket.acquire(1)
+        finished.append(i)
+
+    async def run():
+        await asyncio.gather(*(take(i) for i in range(5)))
+
+    start = time.monotonic()
+    asyncio.run(run())
+    elapsed = time.monotonic() - start
+    ok = check(finished == [0, 1, 2, 3, 4], "waiters finish in arrival order")
+    ok &= check(0.15 <= elapsed < 0.5, f"5 tokens from a 1-token bucket take ~0.2s ({elapsed:.3f}s)")
+    return ok
+
+
+def test_disabled_and_oversized():
+    """Rate 0 never waits; a request bigger than the bucket is capped rather than blocked forever."""
+    print("\nTesting disabled and oversized requests...")
+    start = time.monotonic()
+    for _ in range(1000):
+        TokenBucket(rate_per_min=0).acquire_sync(10)
+    ok = check(time.monotonic() - start < 0.1, "rate 0 disables the bucket")
+
+    bucket = TokenBucket(rate_per_min=60000, capacity=100)
+    start = time.monotonic()
+    bucket.acquire_sync(10_000)
+    ok &= check(time.monotonic() - start < 0.05, "request larger than capacity goes through at full capacity")
+    return ok
+
+
+def test_retry_async():
+    """Retryable errors are retried up to max_attempts; non-retryable ones are raised at once."""
+    print("\nTesting retry_async...")
+
+    class Flaky(Exception):
+        pass
+
+    attempts = {"n": 0}
+
+    async def flaky():
+        attempts["n"] += 1
+        if attempts["n"] < 3:
+            raise Flaky()
+        return "ok"
+
+    ok = check(asyncio.run(retry_async(flaky, retry_on=(Flaky,), max_attempts=5)) == "ok", "succeeds after transient failures")
+    ok &= check(attempts["n"] == 3, f"took 3 attempts ({attempts['n']})")
+
+    attempts["n"] = 0
+
+    async def always():
+        attempts["n"] += 1
+        raise Flaky()
+
+    try:
+        asyncio.run(retry_async(always, retry_on=(Flaky,), max_attempts=3))
+        ok &= check(False, "gives up after max_attempts")
+    except Flaky:
+        ok &= check(attempts["n"] == 3, "gives up after max_attempts")
+
+    attempts["n"] = 0
+
+    async def fatal():
+        attempts["n"] += 1
+        error = Flaky()
+        error.retryable = False
+        raise error
+
+    try:
+        asyncio.run(retry_async(fatal, retry_on=(Flaky,), max_attempts=3))
+    except Flaky:
+        pass
+    ok &= check(attempts["n"] == 1, "retryable=False is not retried")
+    return ok
+
+
+def main():
+    print("=" * 60)
+    print("Rate limiter tests")
+    print("=" * 60)
+    results = [
+        test_burst_and_refill(),
+        test_async_acquire_order(),
+        test_disabled_and_oversized(),
+        test_retry_async(),
+    ]
+    print("\n" + "=" * 60)
+    if all(results):
+        print("✅ All tests passed!")
+    else:
+        print("❌ Some tests failed")
+    print("=" * 60)
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
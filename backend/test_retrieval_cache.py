@@ -0,0 +1,194 @@
+"""
+Test script for the retrieval and answer caches
+
+Checks the similarity threshold, TTL expiry, variant separation and invalidation of
+SemanticRetrievalCache (including the disk tier), the evidence gate of
+GroundedAnswerCache, and that upserts/deletes through the API drop a collection's
+cached results. Runs without ChromaDB, OpenAI or PostgreSQL.
+"""
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from retrieval_cache import (
+    DISKCACHE_AVAILABLE,
+    DiskRetrievalCache,
+    GroundedAnswerCache,
+    SemanticRetrievalCache,
+)
+
+
+def check(condition: bool, message: str) -> bool:
+    print(f"{'✅' if condition else '❌'} {message}")
+    return condition
+
+
+def test_similarity_threshold():
+    """Near-identical queries hit, dissimilar ones miss."""
+    print("Testing similarity threshold...")
+    cache = SemanticRetrievalCache(max_entries=8, similarity_threshold=0.97, ttl_seconds=60)
+    cache.put("docs", 3, [1.0, 0.0, 0.0], {"ids": [["a"]]})
+
+    ok = check(cache.get("docs", 3, [1.0, 0.01, 0.0]) == {"ids": [["a"]]}, "near-identical vector hits")
+    ok &= check(cache.get("docs", 3, [2.0, 0.0, 0.0]) == {"ids": [["a"]]}, "scaled vector hits (cosine, not distance)")
+    ok &= check(cache.get("docs", 3, [0.7, 0.7, 0.0]) is None, "vector below the threshold misses")
+    ok &= check(cache.get("docs", 5, [1.0, 0.0, 0.0]) is None, "different n_results misses")
+    ok &= check(cache.get("other", 3, [1.0, 0.0, 0.0]) is None, "different collection misses")
+    ok &= check(cache.get("docs", 3, [1.0, 0.0]) is None, "different dimension misses")
+    return ok
+
+
+def test_variants():
+    """Entries with different variants (include / where) never answer each other."""
+    print("\nTesting variants...")
+    cache = SemanticRetrievalCache(max_entries=8)
+    cache.put("docs", 3, [1.0, 0.0], {"v": "plain"})
+    cache.put("docs", 3, [1.0, 0.0], {"v": "filtered"}, variant=("query", ("documents",), '{"a": 1}'))
+
+    ok = check(cache.get("docs", 3, [1.0, 0.0]) == {"v": "plain"}, "no variant returns the plain entry")
+    ok &= check(
+        cache.get("docs", 3, [1.0, 0.0], variant=("query", ("documents",), '{"a": 1}')) == {"v": "filtered"},
+        "matching variant returns its own entry"
+    )
+    ok &= check(cache.get("docs", 3, [1.0, 0.0], variant=("query", ("documents",), "null")) is None, "other variant misses")
+    return ok
+
+
+def test_ttl_and_ring_buffer():
+    """Expired entries are ignored and the oldest entry is overwritten when full."""
+    print("\nTesting TTL and eviction...")
+    cache = SemanticRetrievalCache(max_entries=2, ttl_seconds=0.05)
+    cache.put("docs", 3, [1.0, 0.0], {"v": 1})
+    ok = check(cache.get("docs", 3, [1.0, 0.0]) == {"v": 1}, "fresh entry hits")
+    time.sleep(0.1)
+    ok &= check(cache.get("docs", 3, [1.0, 0.0]) is None, "expired entry misses")
+
+    cache = SemanticRetrievalCache(max_entries=2, ttl_seconds=60)
+    cache.put("docs", 3, [1.0, 0.0], {"v": "x"})
+    cache.put("docs", 3, [0.0, 1.0], {"v": "y"})
+    cache.put("docs", 3, [-1.0, 0.0], {"v": "z"})
+    ok &= check(cache.get("docs", 3, [1.0, 0.0]) is None, "oldest entry evicted when the bucket is full")
+    ok &= check(cache.get("docs", 3, [0.0, 1.0]) == {"v": "y"}, "newer entries kept")
+    return ok
+
+
+def test_invalidation():
+    """Invalidating a collection drops only that collection's entries (all variants)."""
+    print("\nTesting invalidation...")
+    cache = SemanticRetrievalCache(max_entries=8)
+    cache.put("docs", 3, [1.0, 0.0], {"v": 1})
+    cache.put("docs", 3, [1.0, 0.0], {"v": 2}, variant="x")
+    cache.put("other", 3, [1.0, 0.0], {"v": 3})
+    cache.invalidate("docs")
+
+    ok = check(cache.get("docs", 3, [1.0, 0.0]) is None, "invalidated collection misses")
+    ok &= check(cache.get("docs", 3, [1.0, 0.0], variant="x") is None, "its variants miss too")
+    ok &= check(cache.get("other", 3, [1.0, 0.0]) == {"v": 3}, "other collections are kept")
+    cache.invalidate()
+    ok &= check(cache.get("other", 3, [1.0, 0.0]) is None, "invalidate() with no name clears everything")
+    return ok
+
+
+def test_disk_tier():
+    """The disk tier serves exact matches to a fresh in-memory cache and honours invalidation."""
+    print("\nTesting disk tier...")
+    if not DISKCACHE_AVAILABLE:
+        print("⚠️  diskcache not installed, skipping")
+        return True
+
+    with tempfile.TemporaryDirectory() as directory:
+        first = SemanticRetrievalCache(disk=DiskRetrievalCache(directory))
+        first.put("docs", 3, [1.0, 0.0], {"v": 1}, variant="x")
+
+        restarted = SemanticRetrievalCache(disk=DiskRetrievalCache(directory))
+        ok = check(restarted.get("docs", 3, [1.0, 0.0], variant="x") == {"v": 1}, "entry survives a restart")
+        ok &= check(restarted.get("docs", 3, [1.0, 0.0]) is None, "disk key includes the variant")
+        restarted.invalidate("docs")
+        ok &= check(
+            SemanticRetrievalCache(disk=DiskRetrievalCache(directory)).get("docs", 3, [1.0, 0.0], variant="x") is None,
+            "invalidation orphans the disk entries"
+        )
+    return ok
+
+
+def test_answer_cache():
+    """Answers need both a similar query and overlapping evidence."""
+    print("\nTesting grounded answer cache...")
+    cache = GroundedAnswerCache(query_similarity_threshold=0.95, evidence_overlap_threshold=0.7)
+    scope = ("docs", "gpt-4o-mini")
+    cache.put(scope, [1.0, 0.0], ["a", "b", "c"], "answer")
+
+    ok = check(cache.get(scope, [1.0, 0.01], ["a", "b", "c"]) == "answer", "same evidence hits")
+    ok &= check(cache.get(scope, [1.0, 0.01], ["a", "x", "y"]) is None, "different evidence misses")
+    ok &= check(cache.get(scope, [0.0, 1.0], ["a", "b", "c"]) is None, "dissimilar query misses")
+    ok &= check(cache.get(("docs", "gpt-4o"), [1.0, 0.0], ["a", "b", "c"]) is None, "other scope misses")
+    cache.invalidate("docs")
+    ok &= check(cache.get(scope, [1.0, 0.0], ["a", "b", "c"]) is None, "invalidated collection misses")
+    return ok
+
+
+def test_endpoint_invalidation():
+    """Upserting into or deleting from a collection through the API drops its cached results."""
+    print("\nTesting invalidation from /upsert and /delete...")
+    from fastapi.testclient import TestClient
+    import collection_index
+    import main
+    from retrieval_cache import retrieval_cache
+
+    class FakeCollection:
+        name = "docs"
+        metadata = {"embedding_model": "test"}
+
+        async def upsert(self, **kwargs):
+            pass
+
+        async def delete(self, **kwargs):
+            pass
+
+    async def get_async_collection(name, create=False):
+        return FakeCollection()
+
+    originals = (main.get_async_collection, collection_index.COLLECTION_INDEX_ENABLED)
+    main.get_async_collection = get_async_collection
+    collection_index.COLLECTION_INDEX_ENABLED = False
+    try:
+        client = TestClient(main.app)
+        retrieval_cache.put("docs", 3, [1.0, 0.0], {"v": 1})
+        client.post("/collections/docs/upsert", json={"ids": ["a"], "embeddings": [[1.0, 0.0]]})
+        ok = check(retrieval_cache.get("docs", 3, [1.0, 0.0]) is None, "upsert drops the collection's cached results")
+
+        retrieval_cache.put("docs", 3, [1.0, 0.0], {"v": 1})
+        client.request("DELETE", "/collections/docs/delete", json={"filename": "f.txt"})
+        ok &= check(retrieval_cache.get("docs", 3, [1.0, 0.0]) is None, "delete drops the collection's cached results")
+    finally:
+        main.get_async_collection, collection_index.COLLECTION_INDEX_ENABLED = originals
+    return ok
+
+
+def main():
+    print("=" * 60)
+    print("Retrieval cache tests")
+    print("=" * 60)
+    results = [
+        test_similarity_threshold(),
+        test_variants(),
+        test_ttl_and_ring_buffer(),
+        test_invalidation(),
+        test_disk_tier(),
+        test_answer_cache(),
+        test_endpoint_invalidation(),
+    ]
+    print("\n" + "=" * 60)
+    if all(results):
+        print("✅ All tests passed!")
+    else:
+        print("❌ Some tests failed")
+    print("=" * 60)
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
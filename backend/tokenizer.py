@@ -0,0 +1,36 @@
+"""
+Token counting helpers
+
+Shared by chat_service (RAG context budget) and document_summarizer (batch sizing).
+Falls back to a ~4 characters per token estimate when no tiktoken encoding is available.
+"""
+import logging
+from functools import lru_cache
+from typing import List, Optional
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=16)
+def get_encoding(model: str) -> Optional[tiktoken.Encoding]:
+    """
+    Tokenizer for a chat model, falling back to cl100k_base for unknown models.
+    Returns None if the encoding can't be loaded (e.g. no network to fetch BPE files).
+    """
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"⚠️  Could not load tiktoken encoding for {model}, using length estimate: {e}")
+        return None
+
+
+def count_tokens(texts: List[str], enc: Optional[tiktoken.Encoding]) -> List[int]:
+    """Token count per text, in one batched tokenizer call (length estimate if enc is None)."""
+    if enc is not None:
+        return [len(tokens) for tokens in enc.encode_batch(texts, disallowed_special=())]
+    return [len(text) // 4 for text in texts]  # Rough estimate
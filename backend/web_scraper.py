@@ -16,6 +16,7 @@ from typing import List, Dict, Any, Optional
 from urllib.parse import urlparse, urldefrag
 from xml.etree import ElementTree
 import requests
+import numpy as np
 
 from dotenv import load_dotenv
 from pathlib import Path
@@ -169,12 +170,16 @@ def create_embeddings_batch_with_retry(texts: List[str], max_retries: int = 3, b
     4. If token limit error, split batch by token count instead of text count
     5. If batch fails after retries, fall back to smaller batches
     6. If individual batch fails, return zero vector (1536 zeros) as fallback
+    
+    Texts embedded before (same model and content) come from the embeddings_cache table,
+    so re-scraping unchanged pages or repos only embeds new or edited chunks.
     """
     if not texts:
         return []
     
     from openai import OpenAI
     import httpx
+    from embeddings import lookup_cached_embeddings, store_embeddings
     
     api_key = (os.getenv("OPENAI_API_KEY") or "").strip()
     if not api_key:
@@ -187,11 +192,16 @@ def create_embeddings_batch_with_retry(texts: List[str], max_retries: int = 3, b
     # Using 7000 as a safe limit to account for overhead
     MAX_TOKENS_PER_BATCH = 7000
     
+    keys, cached, misses = lookup_cached_embeddings(model, texts)
+    if not misses:
+        return [cached[key].tolist() for key in keys]
+    uncached_texts = [texts[i] for i in misses]
+    
     http_client = httpx.Client(timeout=httpx.Timeout(120.0))
     client = OpenAI(api_key=api_key, http_client=http_client)
     
     all_embeddings = []
-    total_texts = len(texts)
+    total_texts = len(uncached_texts)
     
     try:
         # First pass: split by batch_size (number of texts)
@@ -199,7 +209,7 @@ def create_embeddings_batch_with_retry(texts: List[str], max_retries: int = 3, b
         current_batch_tokens = 0
         batch_num = 0
         
-        for i, text in enumerate(texts):
+        for i, text in enumerate(uncached_texts):
             text_tokens = _estimate_tokens(text, model)
             
             # Check if adding this text would exceed limits
@@ -243,7 +253,13 @@ def create_embeddings_batch_with_retry(texts: List[str], max_retries: int = 3, b
             all_embeddings.extend(batch_embeddings)
         
         logger.info(f"✅ Successfully generated {len(all_embeddings)} embeddings from {total_texts} texts")
-        return all_embeddings
+        
+        # Cache real vectors only; zero vectors are failures and should be retried next time
+        new_by_key = {keys[i]: embedding for i, embedding in zip(misses, all_embeddings)}
+        stored = [(keys[i], embedding) for i, embedding in zip(misses, all_embeddings) if any(embedding)]
+        if stored:
+            store_embeddings(model, [key for key, _ in stored], np.asarray([vec for _, vec in stored], dtype=np.float32))
+        return [new_by_key[key] if key in new_by_key else cached[key].tolist() for key in keys]
         
     finally:
         http_client.close()